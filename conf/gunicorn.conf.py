@@ -27,6 +27,13 @@ def _post_fork_handler(server, worker):
     worker.log.info("Made Psycopg2 Green")
 
 
+def post_worker_init(worker):
+    # build the autocomplete index before the first request needs it
+    from mygpo.search.autocomplete import warm_index
+
+    warm_index()
+
+
 # check if we want to use gevent
 _USE_GEVENT = get_bool("USE_GEVENT", False)
 
@@ -7,3 +7,9 @@ def enable_db_access_for_all_tests(db):
 
     http://pytest-django.readthedocs.io/en/latest/faq.html#how-can-i-give-database-access-to-all-my-tests-without-the-django-db-marker"""
     pass
+
+
+@pytest.fixture(autouse=True)
+def temporary_media_root(settings, tmp_path):
+    """Store the media files (eg podcast logos) of a test in a temporary directory"""
+    settings.MEDIA_ROOT = str(tmp_path / "media")
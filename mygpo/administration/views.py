@@ -31,6 +31,7 @@ from mygpo.users.views.registration import send_activation_email
 from mygpo.administration.tasks import merge_podcasts
 from mygpo.utils import get_git_head
 from mygpo.data.models import PodcastUpdateResult
+from mygpo.search.tasks import get_index_backlog, get_index_stats
 from mygpo.users.models import UserProxy
 from mygpo.publisher.models import PublishedPodcast
 from mygpo.api.httpresponse import JsonResponse
@@ -63,7 +64,8 @@ class HostInfo(AdminView):
         django_version = django.VERSION
 
         feed_queue_status = self._get_feed_queue_status()
-        num_index_outdated = self._get_num_outdated_search_index()
+        num_index_outdated = get_index_backlog()
+        index_stats = get_index_stats()
         avg_podcast_update_duration = self._get_avg_podcast_update_duration()
 
         return self.render_to_response(
@@ -77,6 +79,7 @@ class HostInfo(AdminView):
                 "avg_podcast_update_duration": avg_podcast_update_duration,
                 "feed_queue_status": feed_queue_status,
                 "num_index_outdated": num_index_outdated,
+                "index_stats": index_stats,
             }
         )
 
@@ -102,9 +105,6 @@ class HostInfo(AdminView):
         delta_mins = delta.total_seconds() / 60
         return delta_mins
 
-    def _get_num_outdated_search_index(self):
-        return Podcast.objects.filter(search_index_uptodate=False).count()
-
 
 class MergeSelect(AdminView):
     template_name = "admin/merge-select.html"
@@ -1,5 +1,7 @@
 from functools import partial
 
+import base64
+import binascii
 from collections import defaultdict
 from datetime import datetime
 from importlib import import_module
@@ -22,8 +24,8 @@ from django.shortcuts import get_object_or_404
 from mygpo.podcasts.models import Podcast, Episode
 from mygpo.subscriptions.models import Subscription
 from mygpo.api.constants import EPISODE_ACTION_TYPES
-from mygpo.api.httpresponse import JsonResponse
-from mygpo.api.advanced.directory import episode_data
+from mygpo.api.httpresponse import JsonResponse, StreamingJsonResponse
+from mygpo.api.advanced.directory import episodes_data
 from mygpo.api.backend import get_device
 from mygpo.utils import (
     format_time,
@@ -131,6 +133,7 @@ def episodes(request, username, version=1):
         podcast_url = request.GET.get("podcast", None)
         device_uid = request.GET.get("device", None)
         since_ = request.GET.get("since", None)
+        cursor_ = request.GET.get("cursor", None)
         aggregated = parse_bool(request.GET.get("aggregated", False))
 
         try:
@@ -140,6 +143,11 @@ def episodes(request, username, version=1):
         except ValueError:
             return HttpResponseBadRequest("since-value is not a valid timestamp")
 
+        try:
+            cursor = decode_cursor(cursor_) if cursor_ else None
+        except ValueError:
+            return HttpResponseBadRequest("cursor-value is not valid")
+
         if podcast_url:
             podcast = get_object_or_404(Podcast, urls__url=podcast_url)
         else:
@@ -157,10 +165,10 @@ def episodes(request, username, version=1):
             device = None
 
         changes = get_episode_changes(
-            request.user, podcast, device, since, now, aggregated, version
+            request.user, podcast, device, since, now, aggregated, version, cursor
         )
 
-        return JsonResponse(changes)
+        return StreamingJsonResponse(changes)
 
 
 def convert_position(action):
@@ -171,43 +179,109 @@ def convert_position(action):
     return action
 
 
-def get_episode_changes(user, podcast, device, since, until, aggregated, version):
+def encode_cursor(timestamp, id):
+    """Returns an opaque continuation cursor for an episode action
+
+    >>> cursor = encode_cursor(datetime(2020, 1, 2, 3, 4, 5, 6), 42)
+    >>> decode_cursor(cursor)
+    (datetime.datetime(2020, 1, 2, 3, 4, 5, 6), 42)
+    """
+    value = "%s|%d" % (timestamp.isoformat(), id)
+    return base64.urlsafe_b64encode(value.encode("ascii")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """Returns the (timestamp, id) pair of a cursor
+
+    Raises a ValueError if the cursor is not valid
+
+    >>> decode_cursor("invalid")
+    Traceback (most recent call last):
+    ...
+    ValueError: invalid cursor
+    """
+    try:
+        value = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("ascii")
+        timestamp, id = value.split("|")
+        return dateutil.parser.parse(timestamp), int(id)
+    except (binascii.Error, UnicodeError, ValueError, OverflowError):
+        raise ValueError("invalid cursor")
+
+
+def get_episode_changes(
+    user, podcast, device, since, until, aggregated, version, cursor=None
+):
+    """Returns the user's episode actions for the API response
+
+    Unless the actions are aggregated, they are returned as a generator that
+    reads the actions from a server-side cursor; the timestamp is then only
+    available (as a callable) once the actions have been consumed. The
+    result can be sent with StreamingJsonResponse.
+
+    At most MAX_EPISODE_ACTIONS actions are returned. If there are more, the
+    response contains a cursor (a (timestamp, id) pair as returned by
+    decode_cursor) from which the next page can be requested."""
 
     history = EpisodeHistoryEntry.objects.filter(user=user, timestamp__lt=until)
 
-    # return the earlier entries first
-    history = history.order_by("timestamp")
+    # return the earlier entries first; the id breaks ties between actions
+    # with the same timestamp so that pages neither overlap nor skip actions
+    history = history.order_by("timestamp", "id")
 
     if since:
         history = history.filter(timestamp__gte=since)
 
+    if cursor is not None:
+        table = EpisodeHistoryEntry._meta.db_table
+        history = history.extra(
+            where=['("{0}"."timestamp", "{0}"."id") > (%s, %s)'.format(table)],
+            params=list(cursor),
+        )
+
     if podcast is not None:
         history = history.filter(episode__podcast=podcast)
 
     if device is not None:
         history = history.filter(client=device)
 
-    if version == 1:
-        history = map(convert_position, history)
+    history = history.select_related("episode", "episode__podcast", "client")
 
-    # Limit number of returned episode actions
+    # Limit number of returned episode actions; one additional action is
+    # fetched to find out if another page follows
     max_actions = dsettings.MAX_EPISODE_ACTIONS
-    history = history[:max_actions]
+    history = history[: max_actions + 1]
+
+    # timestamp of the last returned action
+    last_timestamp = [until]
+    next_cursor = [None]
+
+    def _actions():
+        last = None
+        for n, action in enumerate(history.iterator()):
+            if n == max_actions:
+                next_cursor[0] = encode_cursor(last.timestamp, last.id)
+                break
 
-    # evaluate query and turn into list, for negative indexing
-    history = list(history)
+            last = action
+            last_timestamp[0] = action.timestamp
 
-    actions = [episode_action_json(a, user) for a in history]
+            if version == 1:
+                action = convert_position(action)
+
+            yield episode_action_json(action, user)
+
+    def _timestamp():
+        return get_timestamp(last_timestamp[0])
+
+    def _cursor():
+        return next_cursor[0]
+
+    actions = _actions()
 
     if aggregated:
         actions = list(dict((a["episode"], a) for a in actions).values())
 
-    if history:
-        ts = get_timestamp(history[-1].timestamp)
-    else:
-        ts = get_timestamp(until)
-
-    return {"actions": actions, "timestamp": ts}
+    return {"actions": actions, "timestamp": _timestamp, "cursor": _cursor}
 
 
 def episode_action_json(history, user):
@@ -234,42 +308,49 @@ def episode_action_json(history, user):
 def update_episodes(user, actions, now, ua_string):
     update_urls = []
 
-    # group all actions by their episode
+    # normalized URLs and devices are looked up only once per batch
+    sanitized = {}
+    devices = {}
+
+    def _sanitize(url):
+        if url not in sanitized:
+            sanitized[url] = sanitize_append(url, update_urls)
+        return sanitized[url]
+
+    parsed = []
     for action in actions:
 
-        podcast_url = action.get("podcast", "")
-        podcast_url = sanitize_append(podcast_url, update_urls)
+        podcast_url = _sanitize(action.get("podcast", ""))
         if not podcast_url:
             continue
 
-        episode_url = action.get("episode", "")
-        episode_url = sanitize_append(episode_url, update_urls)
+        episode_url = _sanitize(action.get("episode", ""))
         if not episode_url:
             continue
 
-        podcast = Podcast.objects.get_or_create_for_url(podcast_url).object
-        episode = Episode.objects.get_or_create_for_url(podcast, episode_url).object
-
         # parse_episode_action returns a EpisodeHistoryEntry obj
-        history = parse_episode_action(action, user, update_urls, now, ua_string)
-
-        EpisodeHistoryEntry.create_entry(
-            user,
-            episode,
-            history.action,
-            history.client,
-            history.timestamp,
-            history.started,
-            history.stopped,
-            history.total,
-            podcast_url,
-            episode_url,
+        history = parse_episode_action(
+            action, user, update_urls, now, ua_string, devices
         )
+        history.podcast_ref_url = podcast_url
+        history.episode_ref_url = episode_url
+        parsed.append(history)
+
+    podcasts = Podcast.objects.get_or_create_for_urls(h.podcast_ref_url for h in parsed)
+    episodes = Episode.objects.get_or_create_for_urls(
+        (podcasts[h.podcast_ref_url], h.episode_ref_url) for h in parsed
+    )
+
+    for history in parsed:
+        podcast = podcasts[history.podcast_ref_url]
+        history.episode = episodes[(podcast, history.episode_ref_url)]
+
+    EpisodeHistoryEntry.create_entries(user, parsed)
 
     return update_urls
 
 
-def parse_episode_action(action, user, update_urls, now, ua_string):
+def parse_episode_action(action, user, update_urls, now, ua_string, devices=None):
     action_str = action.get("action", None)
     if not valid_episodeaction(action_str):
         raise Exception("invalid action %s" % action_str)
@@ -279,8 +360,15 @@ def parse_episode_action(action, user, update_urls, now, ua_string):
     history.action = action["action"]
 
     if action.get("device", False):
-        client = get_device(user, action["device"], ua_string)
-        history.client = client
+        uid = action["device"]
+
+        if devices is None:
+            devices = {}
+
+        if uid not in devices:
+            devices[uid] = get_device(user, uid, ua_string)
+
+        history.client = devices[uid]
 
     if action.get("timestamp", False):
         history.timestamp = dateutil.parser.parse(action["timestamp"])
@@ -372,8 +460,7 @@ def get_client_data(user, client):
 def favorites(request, username):
     favorites = FavoriteEpisode.episodes_for_user(request.user)
     domain = RequestSite(request).domain
-    e_data = lambda e: episode_data(e, domain)
-    ret = list(map(e_data, favorites))
+    ret = episodes_data(favorites, domain)
     return JsonResponse(ret)
 
 
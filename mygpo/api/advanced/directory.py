@@ -7,11 +7,16 @@ from django.contrib.sites.requests import RequestSite
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.cache import cache_page
 from django.shortcuts import get_object_or_404
+from django.db.models import prefetch_related_objects
 
 from mygpo.podcasts.models import Podcast, Episode
 from mygpo.utils import parse_range, normalize_feed_url
 from mygpo.directory.tags import Topics
-from mygpo.web.utils import get_episode_link_target, get_podcast_link_target
+from mygpo.web.utils import (
+    get_episode_link_target,
+    get_podcast_link_target,
+    CachedReverse,
+)
 from mygpo.web.logo import get_logo_url
 from mygpo.subscriptions.models import SubscribedPodcast
 from mygpo.decorators import cors_origin
@@ -19,6 +24,7 @@ from mygpo.categories.models import Category
 from mygpo.api.httpresponse import JsonResponse
 from mygpo.data.tasks import update_podcasts
 from mygpo.decorators import allowed_methods
+from mygpo.search.autocomplete import autocomplete as autocomplete_podcasts
 
 
 @csrf_exempt
@@ -43,10 +49,35 @@ def tag_podcasts(request, tag, count):
         return JsonResponse([])
 
     domain = RequestSite(request).domain
-    entries = category.entries.all().prefetch_related(
-        "podcast", "podcast__slugs", "podcast__urls"
-    )[:count]
-    resp = [podcast_data(entry.podcast, domain) for entry in entries]
+    entries = category.entries.all().select_related("podcast")[:count]
+    resp = podcasts_data([entry.podcast for entry in entries], domain)
+    return JsonResponse(resp)
+
+
+@allowed_methods(["GET"])
+@cors_origin()
+def autocomplete(request):
+    """Podcasts with titles that start with the query, for typeahead search"""
+    query = request.GET.get("q", "")
+    count = parse_range(request.GET.get("count", 10), 1, 20, 10)
+
+    podcast_ids = autocomplete_podcasts(query, count)
+    podcasts = Podcast.objects.filter(id__in=podcast_ids).prefetch_related(
+        "urls", "slugs"
+    )
+    podcasts = {podcast.id: podcast for podcast in podcasts}
+
+    domain = RequestSite(request).domain
+    resp = [
+        {
+            "title": podcast.title,
+            "url": podcast.url,
+            "subscribers": podcast.subscribers,
+            "mygpo_link": "http://%s%s" % (domain, get_podcast_link_target(podcast)),
+        }
+        for podcast in (podcasts.get(pid) for pid in podcast_ids)
+        if podcast is not None
+    ]
     return JsonResponse(resp)
 
 
@@ -140,7 +171,7 @@ def add_podcast_status(request, job_id):
     return JsonResponse(resp)
 
 
-def podcast_data(obj, domain, scaled_logo_size=64):
+def podcast_data(obj, domain, scaled_logo_size=64, reverse=reverse):
     if obj is None:
         raise ValueError("podcast should not be None")
 
@@ -153,7 +184,7 @@ def podcast_data(obj, domain, scaled_logo_size=64):
 
     subscribers = podcast.subscribers
 
-    scaled_logo_url = get_logo_url(podcast, scaled_logo_size)
+    scaled_logo_url = get_logo_url(podcast, scaled_logo_size, reverse)
 
     return {
         "url": url,
@@ -164,11 +195,31 @@ def podcast_data(obj, domain, scaled_logo_size=64):
         "logo_url": podcast.logo_url,
         "scaled_logo_url": "http://%s%s" % (domain, scaled_logo_url),
         "website": podcast.link,
-        "mygpo_link": "http://%s%s" % (domain, get_podcast_link_target(podcast)),
+        "mygpo_link": "http://%s%s"
+        % (domain, get_podcast_link_target(podcast, reverse=reverse)),
     }
 
 
-def episode_data(episode, domain, podcast=None):
+def podcasts_data(objs, domain, scaled_logo_size=64):
+    """Returns the podcast_data of many podcasts (or SubscribedPodcasts)
+
+    The URLs and slugs that are needed are prefetched with a fixed number of
+    queries, and the URLs of the views are reversed only once."""
+
+    objs = list(objs)
+    if None in objs:
+        raise ValueError("podcast should not be None")
+
+    podcasts = [
+        obj.podcast if isinstance(obj, SubscribedPodcast) else obj for obj in objs
+    ]
+    prefetch_urls_slugs(podcasts)
+
+    reverse = CachedReverse()
+    return [podcast_data(obj, domain, scaled_logo_size, reverse) for obj in objs]
+
+
+def episode_data(episode, domain, podcast=None, reverse=reverse):
 
     podcast = podcast or episode.podcast
 
@@ -180,7 +231,10 @@ def episode_data(episode, domain, podcast=None):
         "description": episode.description,
         "website": episode.link,
         "mygpo_link": "http://%(domain)s%(res)s"
-        % dict(domain=domain, res=get_episode_link_target(episode, podcast))
+        % dict(
+            domain=domain,
+            res=get_episode_link_target(episode, podcast, reverse=reverse),
+        )
         if podcast
         else "",
     }
@@ -193,6 +247,44 @@ def episode_data(episode, domain, podcast=None):
     return data
 
 
+def episodes_data(episodes, domain, podcasts={}):
+    """Returns the episode_data of many episodes
+
+    podcasts can map podcast ids to podcasts that have already been loaded;
+    the remaining podcasts, as well as the URLs and slugs of all episodes and
+    podcasts, are prefetched with a fixed number of queries."""
+
+    episodes = list(episodes)
+
+    missing = [
+        episode
+        for episode in episodes
+        if episode.podcast_id not in podcasts and not Episode.podcast.is_cached(episode)
+    ]
+    prefetch_related_objects(missing, "podcast")
+
+    episode_podcasts = [
+        podcasts.get(episode.podcast_id) or episode.podcast for episode in episodes
+    ]
+    prefetch_urls_slugs(episodes)
+    prefetch_urls_slugs(episode_podcasts)
+
+    reverse = CachedReverse()
+    return [
+        episode_data(episode, domain, podcast, reverse)
+        for episode, podcast in zip(episodes, episode_podcasts)
+    ]
+
+
+def prefetch_urls_slugs(objs):
+    """Prefetches the URLs and slugs of objects that have no canonical ones
+
+    The objects (all of the same model) fall back to their URL and Slug
+    objects if their canonical URL or slug has not been stored yet."""
+    prefetch_related_objects([o for o in objs if o.canonical_url is None], "urls")
+    prefetch_related_objects([o for o in objs if o.canonical_slug is None], "slugs")
+
+
 def category_data(category):
     return dict(
         title=category.clean_title, tag=category.tag, usage=category.num_entries
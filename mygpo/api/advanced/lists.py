@@ -14,7 +14,7 @@ from django.shortcuts import get_object_or_404
 
 from mygpo.podcasts.models import Podcast
 from mygpo.utils import get_timestamp
-from mygpo.api.advanced.directory import podcast_data
+from mygpo.api.advanced.directory import podcasts_data
 from mygpo.api.httpresponse import JsonResponse
 from mygpo.podcastlists.models import PodcastList
 from mygpo.api.basic_auth import require_valid_user, check_username
@@ -123,16 +123,17 @@ def get_list(request, plist, owner, format):
         return HttpResponseBadRequest("scale_logo has to be a numeric value")
 
     domain = RequestSite(request).domain
-    p_data = lambda p: podcast_data(p, domain, scale)
+    p_data = lambda ps: podcasts_data(ps, domain, scale)
     title = "{title} by {username}".format(title=plist.title, username=owner.username)
 
-    objs = [entry.content_object for entry in plist.entries.all()]
+    entries = plist.entries.all().prefetch_related("content_object")
+    objs = [entry.content_object for entry in entries]
 
     return format_podcast_list(
         objs,
         format,
         title,
-        json_map=p_data,
+        json_list=p_data,
         jsonp_padding=request.GET.get("jsonp", ""),
         xml_template="podcasts.xml",
         request=request,
@@ -11,9 +11,9 @@ from django.views import View
 from mygpo.podcasts.models import Episode
 from mygpo.api.httpresponse import JsonResponse
 from mygpo.api.advanced import episode_action_json
-from mygpo.api.advanced.directory import episode_data, podcast_data
+from mygpo.api.advanced.directory import episodes_data, podcasts_data
 from mygpo.utils import parse_bool, get_timestamp
-from mygpo.subscriptions import get_subscription_history, subscription_diff
+from mygpo.subscriptions import get_subscription_changes
 from mygpo.users.models import Client
 from mygpo.episodestates.models import EpisodeState
 from mygpo.users.subscriptions import subscription_changes, podcasts_for_states
@@ -79,12 +79,11 @@ class DeviceUpdates(View):
     def get_subscription_changes(self, user, device, since, now, domain):
         """gets new, removed and current subscriptions"""
 
-        history = get_subscription_history(user, device, since, now)
-        add, rem = subscription_diff(history)
+        add, rem = get_subscription_changes(user, device, since, now)
 
-        subscriptions = device.get_subscribed_podcasts()
+        subscriptions = list(device.get_subscribed_podcasts())
 
-        add = [podcast_data(p, domain) for p in add]
+        add = podcasts_data(add, domain)
         rem = [p.url for p in rem]
 
         return add, rem, subscriptions
@@ -95,47 +94,44 @@ class DeviceUpdates(View):
         # index subscribed podcasts by their Id for fast access
         podcasts = {p.get_id(): p for p in subscriptions}
 
-        episode_updates = self.get_episode_updates(user, subscriptions, since)
+        episode_updates = list(self.get_episode_updates(user, subscriptions, since))
+        episodes = episodes_data(
+            [status.episode for status in episode_updates], domain, podcasts
+        )
 
         return [
-            self.get_episode_data(
-                status, podcasts, domain, include_actions, user, devices
-            )
-            for status in episode_updates
+            self.get_episode_data(status, data, include_actions, user, devices)
+            for status, data in zip(episode_updates, episodes)
         ]
 
     def get_episode_updates(self, user, subscribed_podcasts, since, max_per_podcast=5):
         """Returns the episode updates since the timestamp"""
 
-        episodes = []
-        for podcast in subscribed_podcasts:
-            eps = Episode.objects.filter(podcast=podcast, released__gt=since).order_by(
-                "-order", "-released"
-            )
-            episodes.extend(eps[:max_per_podcast])
+        podcast_ids = [podcast.id for podcast in subscribed_podcasts]
+        episodes = Episode.objects.all().latest_per_podcast(
+            podcast_ids, since, max_per_podcast
+        )
+
+        # group the episodes in the order of the subscriptions
+        position = {podcast_id: n for n, podcast_id in enumerate(podcast_ids)}
+        episodes = sorted(episodes, key=lambda episode: position[episode.podcast_id])
 
         states = EpisodeState.dict_for_user(user, episodes)
 
         for episode in episodes:
             yield EpisodeStatus(episode, states.get(episode.id, "new"), None)
 
-    def get_episode_data(
-        self, episode_status, podcasts, domain, include_actions, user, devices
-    ):
+    def get_episode_data(self, episode_status, data, include_actions, user, devices):
         """Get episode data for an episode status object"""
 
-        # TODO: shouldn't the podcast_id be in the episode status?
-        podcast_id = episode_status.episode.podcast
-        podcast = podcasts.get(podcast_id, None)
-        t = episode_data(episode_status.episode, domain, podcast)
-        t["status"] = episode_status.status
+        data["status"] = episode_status.status
 
         # include latest action (bug 1419)
         # TODO
         if include_actions and episode_status.action:
-            t["action"] = episode_action_json(episode_status.action, user)
+            data["action"] = episode_action_json(episode_status.action, user)
 
-        return t
+        return data
 
     def get_since(self, request):
         """parses the "since" parameter"""
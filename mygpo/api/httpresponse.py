@@ -1,6 +1,6 @@
 import json
 
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 
 
 class JsonResponse(HttpResponse):
@@ -15,3 +15,86 @@ class JsonResponse(HttpResponse):
             content_type = "application/json"
 
         super(JsonResponse, self).__init__(content, content_type=content_type)
+
+
+class StreamingJsonResponse(StreamingHttpResponse):
+    """A JSON response that is encoded while it is being sent
+
+    Lists in the object can be replaced by any iterable (eg a generator over
+    a queryset's .iterator()); their items are encoded one by one as they are
+    produced. Callables are called when their value is encoded, so that a
+    value can depend on items that have been streamed before it.
+
+    The encoded content is the same as that of JsonResponse."""
+
+    # number of characters that are sent at once
+    CHUNK_SIZE = 8192
+
+    def __init__(self, object, jsonp_padding=None):
+        content = iter_json(object)
+
+        if jsonp_padding:
+            content = _wrap(jsonp_padding + "(", content, ")")
+            content_type = "application/json-p"
+
+        else:
+            content_type = "application/json"
+
+        super(StreamingJsonResponse, self).__init__(
+            _chunks(content, self.CHUNK_SIZE), content_type=content_type
+        )
+
+
+def iter_json(obj):
+    """Encodes obj as JSON piece by piece
+
+    >>> ''.join(iter_json({'a': (i for i in range(3)), 'b': lambda: 'x'}))
+    '{"a": [0, 1, 2], "b": "x"}'
+    """
+
+    if isinstance(obj, dict):
+        yield "{"
+        for n, (key, value) in enumerate(obj.items()):
+            if n:
+                yield ", "
+            yield json.dumps(str(key), ensure_ascii=True)
+            yield ": "
+            yield from iter_json(value)
+        yield "}"
+
+    elif isinstance(obj, (str, int, float, bool, type(None))):
+        yield json.dumps(obj, ensure_ascii=True)
+
+    elif callable(obj):
+        yield from iter_json(obj())
+
+    else:
+        yield "["
+        for n, item in enumerate(obj):
+            if n:
+                yield ", "
+            yield json.dumps(item, ensure_ascii=True)
+        yield "]"
+
+
+def _wrap(prefix, content, suffix):
+    yield prefix
+    yield from content
+    yield suffix
+
+
+def _chunks(content, chunk_size):
+    """Joins the pieces of content to chunks of (at least) chunk_size"""
+    buf = []
+    length = 0
+    for piece in content:
+        buf.append(piece)
+        length += len(piece)
+
+        if length >= chunk_size:
+            yield "".join(buf)
+            buf = []
+            length = 0
+
+    if buf:
+        yield "".join(buf)
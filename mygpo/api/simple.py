@@ -17,10 +17,11 @@ from mygpo.podcasts.models import Podcast
 from mygpo.api.opml import Exporter, Importer
 from mygpo.api.httpresponse import JsonResponse
 from mygpo.directory.models import ExamplePodcast
-from mygpo.api.advanced.directory import podcast_data
+from mygpo.api.advanced.directory import podcasts_data
 from mygpo.subscriptions import get_subscribed_podcasts
-from mygpo.subscriptions.tasks import subscribe, unsubscribe
+from mygpo.subscriptions.tasks import update_subscriptions
 from mygpo.directory.search import search_podcasts
+from mygpo.directory.toplist import podcast_toplist
 from mygpo.decorators import allowed_methods, cors_origin
 from mygpo.utils import parse_range, normalize_feed_url
 
@@ -92,12 +93,12 @@ def all_subscriptions(request, username, format):
     subscriptions = get_subscribed_podcasts(request.user)
     title = _("%(username)s's Subscription List") % {"username": username}
     domain = RequestSite(request).domain
-    p_data = lambda p: podcast_data(p, domain, scale)
+    p_data = lambda ps: podcasts_data(ps, domain, scale)
     return format_podcast_list(
         subscriptions,
         format,
         title,
-        json_map=p_data,
+        json_list=p_data,
         xml_template="podcasts.xml",
         request=request,
     )
@@ -109,6 +110,7 @@ def format_podcast_list(
     title,
     get_podcast=None,
     json_map=lambda x: x.url,
+    json_list=None,
     jsonp_padding=None,
     xml_template=None,
     request=None,
@@ -124,12 +126,18 @@ def format_podcast_list(
       function used to get the podcast out of the each of these objects
     json_map is a function returning the contents of an object (from obj_list)
       that should be contained in the result (only used for format='json')
+    json_list can be given instead of json_map, to convert all objects of
+      obj_list at once
     """
 
     def default_get_podcast(p):
         return p
 
+    def default_json_list(objs):
+        return map(json_map, objs)
+
     get_podcast = get_podcast or default_get_podcast
+    json_list = json_list or default_json_list
 
     if format == "txt":
         podcasts = map(get_podcast, obj_list)
@@ -143,7 +151,7 @@ def format_podcast_list(
         return HttpResponse(opml, content_type="text/xml")
 
     elif format == "json":
-        objs = list(map(json_map, obj_list))
+        objs = list(json_list(obj_list))
         return JsonResponse(objs)
 
     elif format == "jsonp":
@@ -160,14 +168,14 @@ def format_podcast_list(
                 % {"char": ALLOWED_FUNCNAME}
             )
 
-        objs = list(map(json_map, obj_list))
+        objs = list(json_list(obj_list))
         return JsonResponse(objs, jsonp_padding=jsonp_padding)
 
     elif format == "xml":
         if None in (xml_template, request):
             return HttpResponseBadRequest("XML is not a valid format for this request")
 
-        podcasts = map(json_map, obj_list)
+        podcasts = json_list(obj_list)
         template_args.update({"podcasts": podcasts})
 
         return render(
@@ -221,13 +229,12 @@ def set_subscriptions(urls, user, device_uid, user_agent):
     new = [p for p in urls if p not in subscriptions.keys()]
     rem = [p for p in subscriptions.keys() if p not in urls]
 
-    remove_podcasts = Podcast.objects.filter(urls__url__in=rem)
-    for podcast in remove_podcasts:
-        unsubscribe(podcast.pk, user.pk, device.uid)
+    remove_podcasts = Podcast.objects.filter(urls__url__in=rem).distinct()
+
+    podcasts = Podcast.objects.get_or_create_for_urls(new)
+    subscribe = {podcasts[url]: url for url in reversed(new)}
 
-    for url in new:
-        podcast = Podcast.objects.get_or_create_for_url(url).object
-        subscribe(podcast.pk, user.pk, device.uid, url)
+    update_subscriptions(user, device, subscribe, remove_podcasts)
 
     # Only an empty response is a successful response
     return HttpResponse("", content_type="text/plain")
@@ -240,7 +247,7 @@ def set_subscriptions(urls, user, device_uid, user_agent):
 def toplist(request, count, format):
     count = parse_range(count, 1, 100, 100)
 
-    entries = Podcast.objects.all().toplist()[:count]
+    entries = podcast_toplist()[:count]
     domain = RequestSite(request).domain
 
     try:
@@ -251,18 +258,14 @@ def toplist(request, count, format):
     if scale not in range(1, 257):
         return HttpResponseBadRequest("scale_logo has to be a number from 1 to 256")
 
-    def json_map(t):
-        podcast = t
-        p = podcast_data(podcast, domain, scale)
-        return p
-
+    p_data = lambda ps: podcasts_data(ps, domain, scale)
     title = _("gpodder.net - Top %(count)d") % {"count": len(entries)}
     return format_podcast_list(
         entries,
         format,
         title,
         get_podcast=lambda t: t,
-        json_map=json_map,
+        json_list=p_data,
         jsonp_padding=request.GET.get("jsonp", ""),
         xml_template="podcasts.xml",
         request=request,
@@ -294,12 +297,12 @@ def search(request, format):
 
     title = _("gpodder.net - Search")
     domain = RequestSite(request).domain
-    p_data = lambda p: podcast_data(p, domain, scale)
+    p_data = lambda ps: podcasts_data(ps, domain, scale)
     return format_podcast_list(
         results,
         format,
         title,
-        json_map=p_data,
+        json_list=p_data,
         jsonp_padding=request.GET.get("jsonp", ""),
         xml_template="podcasts.xml",
         request=request,
@@ -320,12 +323,12 @@ def suggestions(request, count, format):
     )
     title = _("gpodder.net - %(count)d Suggestions") % {"count": len(suggestions)}
     domain = RequestSite(request).domain
-    p_data = lambda p: podcast_data(p, domain)
+    p_data = lambda ps: podcasts_data(ps, domain)
     return format_podcast_list(
         suggestions,
         format,
         title,
-        json_map=p_data,
+        json_list=p_data,
         jsonp_padding=request.GET.get("jsonp"),
     )
 
@@ -356,12 +359,12 @@ def example_podcasts(request, format):
 
     title = "gPodder Podcast Directory"
     domain = RequestSite(request).domain
-    p_data = lambda p: podcast_data(p, domain, scale)
+    p_data = lambda ps: podcasts_data(ps, domain, scale)
     return format_podcast_list(
         podcasts,
         format,
         title,
-        json_map=p_data,
+        json_list=p_data,
         xml_template="podcasts.xml",
         request=request,
     )
@@ -8,8 +8,8 @@ from mygpo.api.httpresponse import JsonResponse
 from mygpo.api.backend import get_device
 from mygpo.utils import get_timestamp, normalize_feed_url, intersect
 from mygpo.users.models import Client
-from mygpo.subscriptions.tasks import subscribe, unsubscribe
-from mygpo.subscriptions import get_subscription_history, subscription_diff
+from mygpo.subscriptions.tasks import update_subscriptions
+from mygpo.subscriptions import get_subscription_changes
 from mygpo.api.basic_auth import require_valid_user, check_username
 
 import logging
@@ -76,29 +76,25 @@ class SubscriptionsAPI(APIView):
         pairs = zip(add + remove, add_s + rem_s)
         updated_urls = list(filter(lambda pair: pair[0] != pair[1], pairs))
 
-        add_s = filter(None, add_s)
-        rem_s = filter(None, rem_s)
+        add_s = list(filter(None, add_s))
+        rem_s = list(filter(None, rem_s))
 
         # If two different URLs (in add and remove) have
         # been sanitized to the same, we ignore the removal
-        rem_s = filter(lambda x: x not in add_s, rem_s)
+        rem_s = [url for url in rem_s if url not in add_s]
 
-        for add_url in add_s:
-            podcast = Podcast.objects.get_or_create_for_url(add_url).object
-            subscribe(podcast.pk, user.pk, device.uid, add_url)
+        podcasts = Podcast.objects.get_or_create_for_urls(add_s)
+        subscribe = {podcasts[url]: url for url in reversed(add_s)}
 
-        remove_podcasts = Podcast.objects.filter(urls__url__in=rem_s)
-        for podcast in remove_podcasts:
-            unsubscribe(podcast.pk, user.pk, device.uid)
+        remove_podcasts = Podcast.objects.filter(urls__url__in=rem_s).distinct()
+
+        update_subscriptions(user, device, subscribe, remove_podcasts)
 
         return updated_urls
 
     def get_changes(self, user, device, since, until):
         """Returns subscription changes for the given device"""
-        history = get_subscription_history(user, device, since, until)
-        logger.info("Subscription History: {num}".format(num=len(history)))
-
-        add, rem = subscription_diff(history)
+        add, rem = get_subscription_changes(user, device, since, until)
         logger.info(
             "Subscription Diff: +{num_add}/-{num_remove}".format(
                 num_add=len(add), num_remove=len(rem)
@@ -2,6 +2,7 @@ import copy
 from datetime import datetime, timedelta
 import json
 import unittest
+import uuid
 import os
 import unittest.mock
 from unittest.mock import patch, MagicMock
@@ -11,19 +12,36 @@ from django.test.client import Client
 from django.test import TestCase
 from django.urls import reverse
 from django.contrib.auth import get_user_model
-from django.test.utils import override_settings
+from django.test.utils import override_settings, CaptureQueriesContext
+from django.db import connection
 from django.test import RequestFactory
+from django.core.cache import cache
 
 from openapi_spec_validator import validate_spec_url
 from jsonschema import ValidationError
 
 from mygpo.api import RequestException
 from mygpo.api.advanced.episode import ChaptersAPI
+from mygpo.api.httpresponse import JsonResponse, StreamingJsonResponse
 from mygpo.podcasts.models import Podcast, Episode
 from mygpo.api.advanced import episodes
+from mygpo.api.advanced.directory import (
+    podcast_data,
+    podcasts_data,
+    episode_data,
+    episodes_data,
+)
 from mygpo.api.opml import Exporter, Importer
 from mygpo.api.simple import format_podcast_list
 from mygpo.history.models import EpisodeHistoryEntry
+from mygpo.categories.models import Category, CategoryEntry, CategoryTag
+from mygpo.directory.models import ExamplePodcast
+from mygpo.favorites.models import FavoriteEpisode
+from mygpo.podcastlists.models import PodcastList, PodcastListEntry
+from mygpo.subscriptions.tasks import _perform_subscribe
+from mygpo.suggestions.models import PodcastSuggestion
+from mygpo.users.models import Client as Device
+from mygpo.search.index import invalidate_search_results
 from mygpo.test import create_auth_string
 from mygpo.utils import get_timestamp
 
@@ -75,8 +93,8 @@ class AdvancedAPITests(unittest.TestCase):
 
         url = reverse(episodes, kwargs={"version": "2", "username": self.user.username})
         response = self.client.get(url, {"since": "0"}, **self.extra)
-        self.assertEqual(response.status_code, 200, response.content)
-        response_obj = json.loads(response.content.decode("utf-8"))
+        self.assertEqual(response.status_code, 200)
+        response_obj = json.loads(b"".join(response.streaming_content))
         actions = response_obj["actions"]
         self.assertTrue(self.compare_action_list(self.action_data, actions))
 
@@ -115,6 +133,28 @@ class AdvancedAPITests(unittest.TestCase):
         return True
 
 
+class StreamingJsonResponseTests(unittest.TestCase):
+    """Tests that streamed JSON is the same as non-streamed JSON"""
+
+    def test_same_content(self):
+        obj = {"actions": [{"a": n, "b": "\u00e4"} for n in range(3000)], "t": 5}
+        expected = JsonResponse(obj, jsonp_padding="cb").content
+
+        def streamed():
+            return dict(obj, actions=iter(obj["actions"]), t=lambda: 5)
+
+        response = StreamingJsonResponse(streamed(), jsonp_padding="cb")
+        self.assertTrue(response.streaming)
+        self.assertGreater(len(list(response.streaming_content)), 1)
+
+        response = StreamingJsonResponse(streamed(), jsonp_padding="cb")
+        self.assertEqual(b"".join(response.streaming_content), expected)
+
+        # the content can only be read as a stream
+        with self.assertRaises(AttributeError):
+            response.content
+
+
 class SubscriptionAPITests(unittest.TestCase):
     """Tests the Subscription API"""
 
@@ -290,6 +330,240 @@ class DirectoryTest(TestCase):
         self.assertEqual(resp.status_code, 200)
 
 
+class AutocompleteTest(TestCase):
+    """Test the autocomplete API"""
+
+    def test_autocomplete(self):
+        """Podcasts with matching titles are ordered by subscribers"""
+        for title, subscribers in (
+            ("Zebra Zoo Talk", 3),
+            ("Zebras Weekly", 7),
+            ("The Zebra Files", 5),
+            ("Zebra Nobody Listens To", 0),
+        ):
+            url = "http://example.com/%s.xml" % title.replace(" ", "-")
+            Podcast.objects.get_or_create_for_url(
+                url, defaults={"title": title, "subscribers": subscribers}
+            )
+
+        # the index is refreshed when the search index is updated
+        invalidate_search_results()
+
+        url = reverse("api-autocomplete")
+        resp = self.client.get(url, {"q": "zebr"})
+        self.assertEqual(resp.status_code, 200)
+        titles = [p["title"] for p in json.loads(resp.content.decode("utf-8"))]
+        self.assertEqual(titles, ["Zebras Weekly", "The Zebra Files", "Zebra Zoo Talk"])
+
+        resp = self.client.get(url, {"q": "Zebra Z", "count": "1"})
+        podcasts = json.loads(resp.content.decode("utf-8"))
+        self.assertEqual([p["title"] for p in podcasts], ["Zebra Zoo Talk"])
+        self.assertEqual(podcasts[0]["url"], "http://example.com/Zebra-Zoo-Talk.xml")
+
+    def test_subscribers_changed(self):
+        """Updated subscriber counts are picked up by the index"""
+        from mygpo.directory.tasks import update_subscriber_counts
+        from mygpo.subscriptions.models import Subscription
+
+        podcasts = [
+            Podcast.objects.get_or_create_for_url(
+                "http://example.com/quokka-%d.xml" % n,
+                defaults={"title": "Quokka %d" % n, "subscribers": 1},
+            ).object
+            for n in range(2)
+        ]
+        invalidate_search_results()
+
+        url = reverse("api-autocomplete")
+        resp = self.client.get(url, {"q": "quokka"})
+        self.assertEqual(len(json.loads(resp.content.decode("utf-8"))), 2)
+
+        # the second podcast gains subscribers, the first one loses its only one
+        User = get_user_model()
+        now = datetime.utcnow()
+        for n in range(2):
+            user = User.objects.create(
+                username="quokka-%d" % n, email="quokka-%d@example.com" % n
+            )
+            client = Device.objects.create(user=user, uid="dev", id=uuid.uuid1())
+            Subscription.objects.create(
+                user=user,
+                client=client,
+                podcast=podcasts[1],
+                ref_url=podcasts[1].url,
+                created=now,
+                modified=now,
+            )
+
+        update_subscriber_counts([p.pk for p in podcasts])
+
+        resp = self.client.get(url, {"q": "quokka"})
+        titles = [p["title"] for p in json.loads(resp.content.decode("utf-8"))]
+        self.assertEqual(titles, ["Quokka 1"])
+
+
+class ListSerializationTests(TestCase):
+    """Test that list endpoints don't issue queries per podcast / episode"""
+
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.password = "pwd"
+        self.user = User(
+            username="list-serialization", email="list@example.com", is_active=True
+        )
+        self.user.set_password(self.password)
+        self.user.save()
+        self.device = Device.objects.create(
+            user=self.user, uid="list-device", id=uuid.uuid1()
+        )
+        self.extra = {
+            "HTTP_AUTHORIZATION": create_auth_string(self.user.username, self.password)
+        }
+
+        self.category = Category.objects.create(title="Lists", num_entries=0)
+        CategoryTag.objects.create(tag="lists", category=self.category)
+        self.plist = PodcastList.objects.create(
+            id=uuid.uuid1(), user=self.user, title="My List", slug="my-list"
+        )
+
+        self.podcasts = []
+        self.add_podcasts(3)
+
+    def tearDown(self):
+        cache.clear()
+
+    def add_podcasts(self, num):
+        """Adds podcasts that appear in all lists, half without canonical
+        URLs and slugs"""
+        for _ in range(num):
+            n = len(self.podcasts)
+            podcast = Podcast.objects.get_or_create_for_url(
+                "http://example.com/lists/%d.xml" % n,
+                defaults={
+                    "title": "Podcast %d" % n,
+                    "subscribers": n,
+                    "logo_url": "http://example.com/lists/%d.png" % n,
+                },
+            ).object
+            podcast.add_slug("lists-podcast-%d" % n)
+
+            for m in range(2):
+                episode = Episode.objects.get_or_create_for_url(
+                    podcast,
+                    "http://example.com/lists/%d/%d.mp3" % (n, m),
+                    defaults={"title": "Episode %d" % m, "released": datetime.utcnow()},
+                ).object
+                episode.add_slug("episode-%d" % m)
+                FavoriteEpisode.objects.create(user=self.user, episode=episode)
+
+            if n % 2:
+                Podcast.objects.filter(pk=podcast.pk).update(
+                    canonical_url=None, canonical_slug=None
+                )
+                Episode.objects.filter(podcast=podcast).update(
+                    canonical_url=None, canonical_slug=None
+                )
+
+            list(
+                _perform_subscribe(
+                    podcast, self.user, [self.device], datetime.utcnow(), podcast.url
+                )
+            )
+            CategoryEntry.objects.create(category=self.category, podcast=podcast)
+            PodcastListEntry.objects.create(
+                podcastlist=self.plist, content_object=podcast, order=n
+            )
+            PodcastSuggestion.objects.create(suggested_to=self.user, podcast=podcast)
+            ExamplePodcast.objects.create(podcast=podcast, order=n)
+            self.podcasts.append(podcast)
+
+    def get(self, url):
+        """Returns the number of queries and the response to a request"""
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            resp = self.client.get(url, **self.extra)
+        self.assertEqual(resp.status_code, 200, resp.content)
+        return len(context), json.loads(resp.content.decode("utf-8"))
+
+    def assertConstantQueries(self, url, items=lambda resp: resp):
+        """Asserts that the number of queries doesn't depend on the items"""
+        # the first request also sets up the user's settings, etc
+        self.get(url)
+
+        num_queries, resp = self.get(url)
+        self.assertEqual(len(items(resp)), 3)
+
+        self.add_podcasts(3)
+
+        more_queries, resp = self.get(url)
+        self.assertEqual(len(items(resp)), 6)
+        self.assertEqual(num_queries, more_queries)
+
+    def test_all_subscriptions(self):
+        self.assertConstantQueries(
+            reverse(
+                "api-all-subscriptions",
+                kwargs={"format": "json", "username": self.user.username},
+            )
+        )
+
+    def test_toplist(self):
+        self.assertConstantQueries(
+            reverse("api-simple-toplist-50", kwargs={"format": "json"})
+        )
+
+    def test_suggestions(self):
+        self.assertConstantQueries(
+            reverse("suggestions-opml", kwargs={"count": 50, "format": "json"})
+        )
+
+    def test_example_podcasts(self):
+        self.assertConstantQueries(reverse("example-opml", kwargs={"format": "json"}))
+
+    def test_tag_podcasts(self):
+        self.assertConstantQueries("/api/2/tag/lists/50.json")
+
+    def test_podcast_list(self):
+        self.assertConstantQueries(
+            reverse(
+                "api-get-list",
+                kwargs={
+                    "format": "json",
+                    "username": self.user.username,
+                    "slug": self.plist.slug,
+                },
+            )
+        )
+
+    def test_favorites(self):
+        self.assertConstantQueries(
+            "/api/2/favorites/%s.json" % self.user.username,
+            items=lambda resp: resp[::2],
+        )
+
+    def test_device_updates(self):
+        self.assertConstantQueries(
+            "/api/2/updates/%s/%s.json?since=0" % (self.user.username, self.device.uid),
+            items=lambda resp: resp["updates"][::2],
+        )
+
+    def test_same_data(self):
+        """The bulk serializers return what the single ones return"""
+        self.add_podcasts(1)
+        podcasts = list(Podcast.objects.filter(pk__in=[p.pk for p in self.podcasts]))
+        self.assertEqual(
+            podcasts_data(podcasts, "example.com", 32),
+            [podcast_data(p, "example.com", 32) for p in podcasts],
+        )
+
+        episodes = list(Episode.objects.filter(podcast__in=podcasts))
+        self.assertEqual(
+            episodes_data(episodes, "example.com"),
+            [episode_data(e, "example.com") for e in episodes],
+        )
+
+
 class EpisodeActionTests(TestCase):
     def setUp(self):
         self.podcast = Podcast.objects.get_or_create_for_url(
@@ -335,8 +609,8 @@ class EpisodeActionTests(TestCase):
 
         url = reverse(episodes, kwargs={"version": "2", "username": self.user.username})
         response = self.client.get(url, {"since": "0"}, **self.extra)
-        self.assertEqual(response.status_code, 200, response.content)
-        response_obj = json.loads(response.content.decode("utf-8"))
+        self.assertEqual(response.status_code, 200)
+        response_obj = json.loads(b"".join(response.streaming_content))
         actions = response_obj["actions"]
 
         # 10 actions should be returned
@@ -352,6 +626,92 @@ class EpisodeActionTests(TestCase):
         # last returned action
         self.assertEqual(get_timestamp(timestamps[9]), response_obj["timestamp"])
 
+        # a cursor for the remaining actions is returned
+        self.assertIsNotNone(response_obj["cursor"])
+
+    @override_settings(MAX_EPISODE_ACTIONS=4)
+    def test_cursor_pagination(self):
+        """Test that all actions can be retrieved by following the cursor"""
+
+        # some actions share the same timestamp
+        t = datetime.utcnow().replace(microsecond=0)
+        entries = []
+        for n in range(10):
+            entry = EpisodeHistoryEntry.objects.create(
+                timestamp=t - timedelta(seconds=n // 3),
+                episode=self.episode,
+                user=self.user,
+                action=EpisodeHistoryEntry.DOWNLOAD,
+            )
+            entries.append(entry)
+
+        url = reverse(episodes, kwargs={"version": "2", "username": self.user.username})
+        params = {"since": "0"}
+        pages = []
+        while True:
+            response = self.client.get(url, params, **self.extra)
+            self.assertEqual(response.status_code, 200)
+            response_obj = json.loads(b"".join(response.streaming_content))
+            pages.append(response_obj["actions"])
+
+            if response_obj["cursor"] is None:
+                break
+            params["cursor"] = response_obj["cursor"]
+
+        self.assertEqual([len(page) for page in pages], [4, 4, 2])
+
+        expected = sorted(entries, key=lambda e: (e.timestamp, e.id))
+        timestamps = [a["timestamp"] for page in pages for a in page]
+        self.assertEqual(timestamps, [e.timestamp.isoformat() for e in expected])
+
+        response = self.client.get(url, {"cursor": "invalid"}, **self.extra)
+        self.assertEqual(response.status_code, 400)
+
+    def test_upload_batch(self):
+        """Test that uploaded actions are stored with a bounded number of queries"""
+
+        episode_urls = ["http://example.com/directory-podcast/1.mp3"] + [
+            "http://example.com/directory-podcast/batch-{}.mp3".format(n)
+            for n in range(9)
+        ]
+        other_episodes = [
+            Episode.objects.get_or_create_for_url(self.podcast, url).object
+            for url in episode_urls[1:]
+        ]
+
+        actions = [
+            {
+                "podcast": self.podcast.url,
+                "episode": episode_urls[n % 10],
+                "device": "device-{}".format(n % 3),
+                "action": "play",
+                "started": 0,
+                "position": n,
+                "total": 100,
+            }
+            for n in range(60)
+        ]
+
+        # the last action is a duplicate of the first one
+        actions.append(actions[0])
+
+        url = reverse(episodes, kwargs={"version": "2", "username": self.user.username})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                url, json.dumps(actions), content_type="application/json", **self.extra
+            )
+        self.assertEqual(response.status_code, 200, response.content)
+
+        entries = EpisodeHistoryEntry.objects.filter(user=self.user)
+        self.assertEqual(entries.count(), 60)
+        self.assertEqual(entries.filter(episode=self.episode).count(), 6)
+
+        # podcasts, episodes, duplicates and devices are looked up in bulk
+        self.assertLess(len(queries), 40)
+
+        for episode in other_episodes:
+            episode.delete()
+
     def test_no_actions(self):
         """Test when there are no actions to return"""
 
@@ -359,8 +719,8 @@ class EpisodeActionTests(TestCase):
 
         url = reverse(episodes, kwargs={"version": "2", "username": self.user.username})
         response = self.client.get(url, {"since": "0"}, **self.extra)
-        self.assertEqual(response.status_code, 200, response.content)
-        response_obj = json.loads(response.content.decode("utf-8"))
+        self.assertEqual(response.status_code, 200)
+        response_obj = json.loads(b"".join(response.streaming_content))
         actions = response_obj["actions"]
 
         # 10 actions should be returned
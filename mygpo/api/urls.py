@@ -63,6 +63,11 @@ urlpatterns = [
     path("api/2/auth/<username:username>/logout.json", auth.logout),
     path("api/2/tags/<int:count>.json", advanced.directory.top_tags),
     path("api/2/tag/<str:tag>/<int:count>.json", advanced.directory.tag_podcasts),
+    path(
+        "api/2/autocomplete.json",
+        advanced.directory.autocomplete,
+        name="api-autocomplete",
+    ),
     path(
         "api/2/data/podcast.json",
         advanced.directory.podcast_info,
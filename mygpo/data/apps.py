@@ -1,4 +1,7 @@
+import hashlib
+
 from django.apps import AppConfig
+from django.core.cache import cache
 from mygpo.pubsub.signals import subscription_updated
 
 import logging
@@ -6,12 +9,24 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+# notifications for a feed within this many seconds result in one update
+PUBSUB_UPDATE_DELAY = 30
+
+
 def update_podcast(sender, **kwargs):
-    """update podcast in background when receiving pubsub-notification"""
+    """update podcast in background when receiving pubsub-notification
+
+    The update is started after PUBSUB_UPDATE_DELAY, so that it covers all
+    notifications that hubs send in the meantime."""
     from mygpo.data.tasks import update_podcasts
 
+    key = "pubsub-update-{}".format(hashlib.sha1(sender.encode("utf-8")).hexdigest())
+    if not cache.add(key, True, PUBSUB_UPDATE_DELAY):
+        logger.info('update for "%s" is already pending', sender)
+        return
+
     logger.info('updating podcast for "%s" after pubsub notification', sender)
-    update_podcasts.delay([sender])
+    update_podcasts.apply_async([[sender]], countdown=PUBSUB_UPDATE_DELAY)
 
 
 class DataAppConfig(AppConfig):
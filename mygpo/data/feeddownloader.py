@@ -6,24 +6,28 @@ import urllib.request
 import urllib.error
 from urllib.parse import urljoin
 import hashlib
+import json
+import uuid
 from datetime import datetime, timedelta
 from itertools import chain, islice
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait, as_completed
+import threading
 import requests
 
-from django.db import transaction
+from django.db import transaction, connection, close_old_connections, IntegrityError
+from django.db.models import F, prefetch_related_objects
 from django.conf import settings
 
-from mygpo.podcasts.models import Podcast, Episode
+from mygpo.podcasts.models import Podcast, Episode, URL
 from mygpo.core.slugs import PodcastSlugs, EpisodeSlugs
 from mygpo.podcasts.models import (
     DEFAULT_UPDATE_INTERVAL,
     MIN_UPDATE_INTERVAL,
     MAX_UPDATE_INTERVAL,
 )
-from mygpo.utils import to_maxlength
+from mygpo.utils import to_maxlength, get_domain, get_http_session
 from mygpo.web.logo import CoverArt
 from mygpo.data.podcast import subscribe_at_hub
-from mygpo.data.tasks import update_related_podcasts
 from mygpo.pubsub.models import SubscriptionError
 from mygpo.directory.tags import update_category
 from mygpo.search import get_index_fields
@@ -49,32 +53,113 @@ class NoEpisodesException(Exception):
     """raised when parsing something that doesn't contain any episodes"""
 
 
-def update_podcasts(queue):
-    """Fetch data for the URLs supplied as the queue iterable"""
+class FeedNotModified(Exception):
+    """raised when the feed has not changed since it has last been fetched"""
 
-    for n, podcast_url in enumerate(queue, 1):
-        logger.info("Update %d - %s", n, podcast_url)
-        if not podcast_url:
-            logger.warning("Podcast URL empty, skipping")
-            continue
+    def __init__(self, podcast):
+        super().__init__(podcast)
+        self.podcast = podcast
 
-        try:
-            updater = PodcastUpdater(podcast_url)
-            yield updater.update_podcast()
 
-        except NoPodcastCreated as npc:
-            logger.info("No podcast created: %s", npc)
+def update_podcasts(queue, max_workers=1, per_host=None):
+    """Fetch data for the URLs supplied as the queue iterable
 
-        except NoEpisodesException as nee:
-            logger.info(f"No episodes found when parsing {podcast_url}")
-            continue
+    With max_workers > 1, up to max_workers feeds are updated concurrently,
+    and at most per_host of them point to the same host. The updated podcasts
+    are yielded in the order in which their updates finish."""
 
-        except GeneratorExit:
-            pass
+    if max_workers <= 1:
+        for n, podcast_url in enumerate(queue, 1):
+            yield _update_podcast(n, podcast_url)
+        return
 
-        except:
-            logger.exception('Error while updating podcast "%s"', podcast_url)
-            raise
+    if per_host is None:
+        per_host = settings.FEED_UPDATE_PER_HOST
+
+    limiter = HostLimiter(per_host)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    pending = set()
+
+    try:
+        for n, podcast_url in enumerate(queue, 1):
+            # don't read the (potentially infinite) queue further than required
+            while len(pending) >= max_workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+            future = executor.submit(_update_podcast_thread, n, podcast_url, limiter)
+            pending.add(future)
+
+        for future in as_completed(pending):
+            yield future.result()
+
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
+def _update_podcast(n, podcast_url):
+    """Updates a single podcast; returns None if it could not be updated"""
+
+    logger.info("Update %d - %s", n, podcast_url)
+    if not podcast_url:
+        logger.warning("Podcast URL empty, skipping")
+        return None
+
+    try:
+        updater = PodcastUpdater(podcast_url)
+        return updater.update_podcast()
+
+    except NoPodcastCreated as npc:
+        logger.info("No podcast created: %s", npc)
+
+    except NoEpisodesException as nee:
+        logger.info(f"No episodes found when parsing {podcast_url}")
+
+    except:
+        logger.exception('Error while updating podcast "%s"', podcast_url)
+        raise
+
+
+def _update_podcast_thread(n, podcast_url, limiter):
+    """Updates a single podcast in a worker thread of update_podcasts"""
+
+    close_old_connections()
+    try:
+        with limiter.limit(podcast_url or ""):
+            return _update_podcast(n, podcast_url)
+
+    finally:
+        # each thread has its own database connection
+        connection.close()
+
+
+class HostLimiter(object):
+    """Limits the number of concurrent operations per host
+
+    >>> limiter = HostLimiter(1)
+    >>> with limiter.limit('http://example.com/feed.xml'):
+    ...     limiter.limit('http://example.com/other.xml').acquire(False)
+    False
+    """
+
+    def __init__(self, per_host):
+        self.per_host = per_host
+        self._lock = threading.Lock()
+        self._semaphores = {}
+
+    def limit(self, url):
+        """Returns the semaphore for the host of url"""
+        host = get_domain(url)
+
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.per_host)
+
+            return self._semaphores[host]
 
 
 class PodcastUpdater(object):
@@ -85,12 +170,24 @@ class PodcastUpdater(object):
             (podcast_url[:2046] + "..") if len(podcast_url) > 2048 else podcast_url
         )
 
+        # HTTP validators of the current fetch, see _fetch_feed
+        self.http_etag = None
+        self.http_last_modified = None
+
     def update_podcast(self):
         """Update the podcast"""
 
         with models.PodcastUpdateResult(podcast_url=self.podcast_url) as res:
 
-            parsed, podcast, created = self.parse_feed()
+            try:
+                parsed, podcast, created = self.parse_feed()
+
+            except FeedNotModified as fnm:
+                res.podcast = fnm.podcast
+                res.podcast_created = False
+                res.episodes_added = 0
+                self._mark_not_modified(fnm.podcast)
+                return fnm.podcast
 
             if not podcast:
                 res.podcast_created = False
@@ -125,7 +222,12 @@ class PodcastUpdater(object):
 
     def parse_feed(self):
         try:
-            parsed = self._fetch_feed()
+            podcast = Podcast.objects.get(urls__url=self.podcast_url)
+        except Podcast.DoesNotExist:
+            podcast = None
+
+        try:
+            parsed = self._fetch_feed(podcast)
             self._validate_parsed(parsed)
 
         except (requests.exceptions.RequestException, NoEpisodesException) as ex:
@@ -133,23 +235,37 @@ class PodcastUpdater(object):
 
             # if we fail to parse the URL, we don't even create the
             # podcast object
-            try:
-                p = Podcast.objects.get(urls__url=self.podcast_url)
-                return (None, p, False)
+            if podcast is None:
+                raise NoPodcastCreated(ex)
+
+            return (None, podcast, False)
 
-            except Podcast.DoesNotExist as pdne:
-                raise NoPodcastCreated(ex) from pdne
+        if podcast is not None:
+            return (parsed, podcast, False)
 
         # Parsing went well, get podcast
         podcast, created = Podcast.objects.get_or_create_for_url(self.podcast_url)
 
         return (parsed, podcast, created)
 
-    def _fetch_feed(self):
+    def _fetch_feed(self, podcast=None):
         params = {"url": self.podcast_url, "process_text": "markdown"}
         headers = {"Accept": "application/json"}
+
+        # conditional request, based on the validators of the previous fetch
+        if podcast is not None and podcast.http_etag:
+            headers["If-None-Match"] = podcast.http_etag
+
+        if podcast is not None and podcast.http_last_modified:
+            headers["If-Modified-Since"] = podcast.http_last_modified
+
         url = urljoin(settings.FEEDSERVICE_URL, "parse")
-        r = requests.get(url, params=params, headers=headers, timeout=30)
+        session = get_http_session()
+        r = session.get(url, params=params, headers=headers, timeout=30)
+
+        if r.status_code == 304 and podcast is not None:
+            logger.info('Feed "%s" has not been modified', self.podcast_url)
+            raise FeedNotModified(podcast)
 
         if r.status_code != 200:
             logger.error(
@@ -157,6 +273,9 @@ class PodcastUpdater(object):
             )
             return None
 
+        self.http_etag = r.headers.get("ETag")
+        self.http_last_modified = r.headers.get("Last-Modified")
+
         try:
             return r.json()[0]
         except ValueError:
@@ -243,14 +362,7 @@ class PodcastUpdater(object):
         # Update interval is based on intervals between episodes
         podcast.update_interval = episode_updater.get_update_interval(episodes)
 
-        # factor is increased / decreased depending on whether the latest
-        # update has returned episodes
-        if update_result.episodes_added == 0:  # no episodes, incr factor
-            newfactor = podcast.update_interval_factor * 1.2
-            podcast.update_interval_factor = min(1000, newfactor)  # never above 1000
-        elif update_result.episodes_added > 1:  # new episodes, decr factor
-            newfactor = podcast.update_interval_factor / 1.2
-            podcast.update_interval_factor = max(1, newfactor)  # never below 1
+        self._update_interval_factor(podcast, update_result.episodes_added)
 
         latest_episode = episodes.last()
         if latest_episode:
@@ -272,6 +384,12 @@ class PodcastUpdater(object):
         if list(old_index_fields.items()) != list(new_index_fields.items()):
             podcast.search_index_uptodate = False
 
+        # validators to be sent with the next fetch
+        podcast.http_etag = to_maxlength(Podcast, "http_etag", self.http_etag)
+        podcast.http_last_modified = to_maxlength(
+            Podcast, "http_last_modified", self.http_last_modified
+        )
+
         # The podcast is always saved (not just when there are changes) because
         # we need to record the last update
         logger.info("Saving podcast.")
@@ -285,7 +403,6 @@ class PodcastUpdater(object):
 
         self.assign_slug(podcast)
         episode_updater.assign_missing_episode_slugs()
-        update_related_podcasts.delay(podcast.pk)
 
     def assign_slug(self, podcast):
         if podcast.slug:
@@ -323,6 +440,28 @@ class PodcastUpdater(object):
 
         update_category(podcast)
 
+    @staticmethod
+    def _update_interval_factor(podcast, episodes_added):
+        """updates the factor by which the update interval is multiplied"""
+
+        # factor is increased / decreased depending on whether the latest
+        # update has returned episodes
+        if episodes_added == 0:  # no episodes, incr factor
+            newfactor = podcast.update_interval_factor * 1.2
+            podcast.update_interval_factor = min(1000, newfactor)  # never above 1000
+        elif episodes_added > 1:  # new episodes, decr factor
+            newfactor = podcast.update_interval_factor / 1.2
+            podcast.update_interval_factor = max(1, newfactor)  # never below 1
+
+    def _mark_not_modified(self, podcast):
+        """records an update for which the feed has not changed"""
+        logger.info("Feed not modified, skipping episode processing")
+        self._update_interval_factor(podcast, 0)
+        podcast.last_update = datetime.utcnow()
+        podcast.save(
+            update_fields=["last_update", "update_interval_factor", "next_update_at"]
+        )
+
     def _mark_outdated(self, podcast, msg, episode_updater):
         logger.info("marking podcast outdated: %s", msg)
         podcast.outdated = True
@@ -338,45 +477,201 @@ class MultiEpisodeUpdater(object):
         self.updated_episodes = []
         self.max_episode_order = None
 
-    def update_episodes(self, parsed_episodes):
+        # indicates that the release date of an existing episode has changed
+        self.released_changed = False
 
-        pid = self.podcast.get_id()
+    def update_episodes(self, parsed_episodes):
 
         episodes_to_update = list(islice(parsed_episodes, 0, MAX_EPISODES_UPDATE))
         logger.info(
             "Parsed %d (%d) episodes", len(parsed_episodes), len(episodes_to_update)
         )
 
+        episodes_to_update = self._episodes_with_url(episodes_to_update)
+
         logger.info("Updating %d episodes", len(episodes_to_update))
-        for n, parsed in enumerate(episodes_to_update, 1):
+        try:
+            with transaction.atomic():
+                updated = self._bulk_update_episodes(episodes_to_update)
+
+        except IntegrityError:
+            # some of the episodes have been created concurrently
+            logger.warning("Bulk update failed, updating episodes one by one")
+            updated = self._update_episodes_individually(episodes_to_update)
 
+        self.updated_episodes.extend(updated)
+
+        # and mark the remaining ones outdated
+        current_episodes = Episode.objects.filter(podcast=self.podcast, outdated=False)[
+            :500
+        ]
+        outdated_episodes = set(current_episodes) - set(self.updated_episodes)
+
+        logger.info("Marking %d episodes as outdated", len(outdated_episodes))
+        for episode in outdated_episodes:
+            updater = EpisodeUpdater(episode, self.podcast)
+            updater.mark_outdated()
+
+    def _episodes_with_url(self, parsed_episodes):
+        """Returns (url, parsed_episode) pairs; episodes w/o URL are skipped"""
+        episodes = []
+        for n, parsed in enumerate(parsed_episodes, 1):
             url = self.get_episode_url(parsed)
             if not url:
                 logger.info("Skipping episode %d for missing URL", n)
                 continue
 
-            logger.info("Updating episode %d / %d", n, len(parsed_episodes))
+            url = to_maxlength(URL, "url", url)
+            episodes.append((url, parsed))
+
+        return episodes
+
+    def _update_episodes_individually(self, episodes):
+        """Updates the episodes one by one"""
+        updated = []
+        for n, (url, parsed) in enumerate(episodes, 1):
+            logger.info("Updating episode %d / %d", n, len(episodes))
 
             episode, created = Episode.objects.get_or_create_for_url(self.podcast, url)
 
             if created:
                 self.update_result.episodes_added += 1
 
+            released = episode.released
+
             updater = EpisodeUpdater(episode, self.podcast)
             updater.update_episode(parsed)
 
-            self.updated_episodes.append(episode)
+            if not created and episode.released != released:
+                self.released_changed = True
 
-        # and mark the remaining ones outdated
-        current_episodes = Episode.objects.filter(podcast=self.podcast, outdated=False)[
-            :500
-        ]
-        outdated_episodes = set(current_episodes) - set(self.updated_episodes)
+            updated.append(episode)
 
-        logger.info("Marking %d episodes as outdated", len(outdated_episodes))
-        for episode in outdated_episodes:
+        return updated
+
+    def _bulk_update_episodes(self, episodes):
+        """Updates the episodes with a fixed number of queries
+
+        Has the same effect as _update_episodes_individually, but resolves all
+        URLs at once, and creates / updates episodes and URLs in bulk."""
+
+        if not episodes:
+            return []
+
+        scope = self.podcast.as_scope
+
+        all_urls = set()
+        for url, parsed in episodes:
+            all_urls.add(url)
+            all_urls.update(EpisodeUpdater.get_file_urls(parsed))
+
+        # all known URLs of the parsed episodes, and the episodes they belong to
+        url_objs = {u.url: u for u in URL.objects.filter(scope=scope, url__in=all_urls)}
+        existing = Episode.objects.filter(
+            podcast=self.podcast, id__in={u.object_id for u in url_objs.values()}
+        )
+        existing = {e.id: e for e in existing}
+
+        # the episode for each parsed episode; episodes that don't exist yet
+        # are created with their primary URL
+        by_url = {}
+        new_episodes = []
+        new_urls = []
+        reassigned_urls = []
+
+        for url, parsed in episodes:
+            if url in by_url:
+                continue
+
+            url_obj = url_objs.get(url)
+            episode = existing.get(url_obj.object_id) if url_obj else None
+
+            if episode is None:
+                episode = Episode(
+                    id=uuid.uuid1(), podcast=self.podcast, canonical_url=url
+                )
+                new_episodes.append(episode)
+
+                if url_obj is None:
+                    new_urls.append(
+                        URL(url=url, order=0, scope=scope, content_object=episode)
+                    )
+                else:
+                    # the URL exists, but does not point to an episode
+                    url_obj.content_object = episode
+                    reassigned_urls.append(url_obj)
+
+            episode.podcast = self.podcast
+            by_url[url] = episode
+
+        Episode.objects.bulk_create(new_episodes)
+        URL.objects.bulk_create(new_urls)
+        URL.objects.bulk_update(reassigned_urls, ["content_type", "object_id"])
+
+        # Keep episode_count up to date (see EpisodeManager.get_or_create_for_url)
+        if new_urls:
+            Podcast.objects.filter(pk=self.podcast.pk).update(
+                episode_count=F("episode_count") + len(new_urls)
+            )
+
+        self.update_result.episodes_added += len(new_episodes)
+
+        updated = []
+        changed = {}
+        for url, parsed in episodes:
+            episode = by_url[url]
+            updated.append(episode)
+
+            released = episode.released
+
+            # unchanged episodes are neither written nor are their URLs
+            # reconciled
             updater = EpisodeUpdater(episode, self.podcast)
-            updater.mark_outdated()
+            if updater.update_fields(parsed):
+                changed[episode.id] = episode
+
+            if episode.id in existing and episode.released != released:
+                self.released_changed = True
+
+        prefetch_related_objects(list(changed.values()), "urls")
+
+        claimed_urls = set(url_objs) | {u.url for u in new_urls}
+        missing_urls = []
+        next_order = {}
+
+        for url, parsed in episodes:
+            episode = by_url[url]
+            if episode.id not in changed:
+                continue
+
+            if episode.id not in next_order:
+                orders = [u.order for u in episode.urls.all()]
+                next_order[episode.id] = max([-1] + orders) + 1
+
+            for file_url in EpisodeUpdater.get_file_urls(parsed):
+                if file_url in claimed_urls:
+                    continue
+
+                missing_urls.append(
+                    URL(
+                        url=file_url,
+                        order=next_order[episode.id],
+                        scope=scope,
+                        content_object=episode,
+                    )
+                )
+                claimed_urls.add(file_url)
+                next_order[episode.id] += 1
+
+        logger.info("%d of %d episodes have changed", len(changed), len(by_url))
+        Episode.objects.bulk_update(
+            list(changed.values()), EpisodeUpdater.UPDATE_FIELDS, batch_size=100
+        )
+
+        # URLs that can not be added are skipped, as in add_missing_urls
+        URL.objects.bulk_create(missing_urls, ignore_conflicts=True)
+
+        return updated
 
     @transaction.atomic
     def order_episodes(self):
@@ -389,27 +684,78 @@ class MultiEpisodeUpdater(object):
         if not num_episodes:
             return 0
 
-        episodes = (
-            self.podcast.episode_set.all()
-            .extra(select={"has_released": "released IS NOT NULL"})
-            .order_by("-has_released", "-released", "pk")
-            .only("pk")
+        if not self._order_new_episodes(num_episodes):
+            self._reorder_all_episodes(num_episodes)
+
+        self.max_episode_order = num_episodes - 1
+
+    def _order_new_episodes(self, num_episodes):
+        """Assigns ``order`` to new episodes that are newer than all others
+
+        This is the common case of new episodes being published at the top of
+        the feed. The existing episodes keep their order, so only the new ones
+        need to be written. Returns False if the fast path can not be used."""
+
+        max_order = self.podcast.max_episode_order
+        if max_order is None or self.released_changed:
+            return False
+
+        new_episodes = list(
+            self.podcast.episode_set.filter(order__isnull=True)
+            .order_by("released", "-pk")
+            .only("pk", "released", "order")
         )
 
-        for n, episode in enumerate(episodes.iterator(), 1):
-            # assign ``order`` from higher (most recent) to 0 (oldest)
-            # None means "unknown"
-            new_order = num_episodes - n
+        # some episodes have been removed or were not ordered before
+        if max_order + 1 + len(new_episodes) != num_episodes:
+            return False
 
-            # optimize for new episodes that are newer than all existing
-            if episode.order == new_order:
-                continue
+        if not new_episodes:
+            return True
 
-            logger.info("Updating order from {} to {}".format(episode.order, new_order))
-            episode.order = new_order
-            episode.save()
+        if any(episode.released is None for episode in new_episodes):
+            return False
 
-        self.max_episode_order = num_episodes - 1
+        latest = (
+            self.podcast.episode_set.filter(order=max_order)
+            .values_list("released", flat=True)
+            .first()
+        )
+        if latest is None or new_episodes[0].released <= latest:
+            return False
+
+        for n, episode in enumerate(new_episodes, max_order + 1):
+            episode.order = n
+
+        logger.info("Ordering %d new episodes", len(new_episodes))
+        Episode.objects.bulk_update(new_episodes, ["order"])
+        return True
+
+    def _reorder_all_episodes(self, num_episodes):
+        """Re-assigns ``order`` to all episodes in a single UPDATE
+
+        ``order`` is assigned from higher (most recent) to 0 (oldest); only the
+        rows for which the order changes are written."""
+
+        REORDER = """
+            UPDATE {table} AS e
+            SET "order" = o.new_order
+            FROM (
+                SELECT id,
+                       %s - ROW_NUMBER() OVER (
+                           ORDER BY released IS NOT NULL DESC, released DESC, id
+                       ) AS new_order
+                FROM {table}
+                WHERE podcast_id = %s
+            ) AS o
+            WHERE e.id = o.id AND e."order" IS DISTINCT FROM o.new_order
+        """.format(
+            table=Episode._meta.db_table
+        )
+
+        with connection.cursor() as cursor:
+            cursor.execute(REORDER, [num_episodes, self.podcast.pk])
+            logger.info("Updated order of %d episodes", cursor.rowcount)
 
     def get_episode_url(self, parsed_episode):
         """returns the URL of a parsed episode"""
@@ -468,6 +814,27 @@ class MultiEpisodeUpdater(object):
 class EpisodeUpdater(object):
     """Updates an individual episode"""
 
+    # the fields that are set by update_fields()
+    UPDATE_FIELDS = [
+        "guid",
+        "description",
+        "subtitle",
+        "content",
+        "link",
+        "released",
+        "author",
+        "duration",
+        "filesize",
+        "language",
+        "mimetypes",
+        "flattr_url",
+        "license",
+        "title",
+        "last_update",
+        "modified",
+        "feed_hash",
+    ]
+
     def __init__(self, episode, podcast):
         self.episode = episode
         self.podcast = podcast
@@ -476,8 +843,27 @@ class EpisodeUpdater(object):
     def update_episode(self, parsed_episode):
         """updates "episode" with the data from "parsed_episode" """
 
-        # TODO: check if there have been any changes, to
-        # avoid unnecessary updates
+        if not self.update_fields(parsed_episode):
+            logger.debug("Episode %s has not changed", self.episode)
+            return
+
+        self.episode.save()
+
+        parsed_urls = self.get_file_urls(parsed_episode)
+        self.episode.add_missing_urls(parsed_urls)
+
+    def update_fields(self, parsed_episode):
+        """sets the fields of "episode" without saving it
+
+        Returns False (and leaves the episode untouched) if the episode has not
+        changed since it has last been updated from the feed."""
+
+        feed_hash = self.get_feed_hash(parsed_episode)
+        if self.episode.feed_hash == feed_hash:
+            return False
+
+        self.episode.feed_hash = feed_hash
+
         self.episode.guid = to_maxlength(
             Episode, "guid", parsed_episode.get("guid") or self.episode.guid
         )
@@ -537,15 +923,28 @@ class EpisodeUpdater(object):
             or file_basename_no_extension(self.episode.url),
         )
 
-        self.episode.last_update = datetime.utcnow()
-        self.episode.save()
+        now = datetime.utcnow()
+        self.episode.last_update = now
 
-        parsed_urls = list(
+        # bulk_update() does not update auto_now fields on its own
+        self.episode.modified = now
+
+        return True
+
+    def get_feed_hash(self, parsed_episode):
+        """returns a hash over everything that update_fields depends on"""
+        data = [parsed_episode, self.podcast.language]
+        data = json.dumps(data, sort_keys=True, default=str)
+        return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def get_file_urls(parsed_episode):
+        """returns the URLs of all files of a parsed episode"""
+        return list(
             chain.from_iterable(
                 f.get("urls", []) for f in parsed_episode.get("files", [])
             )
         )
-        self.episode.add_missing_urls(parsed_urls)
 
     def mark_outdated(self):
         """marks the episode outdated if its not already"""
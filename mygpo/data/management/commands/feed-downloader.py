@@ -2,6 +2,8 @@ from itertools import islice
 import traceback
 from optparse import make_option
 
+from django.conf import settings
+
 from mygpo.maintenance.management.podcastcmd import PodcastCommand
 from mygpo.data.feeddownloader import update_podcasts
 
@@ -26,6 +28,24 @@ class Command(PodcastCommand):
             help="Don't update anything, just list podcasts ",
         ),
 
+        parser.add_argument(
+            "--workers",
+            action="store",
+            dest="workers",
+            type=int,
+            default=settings.FEED_UPDATE_WORKERS,
+            help="Number of feeds that are updated concurrently",
+        ),
+
+        parser.add_argument(
+            "--per-host",
+            action="store",
+            dest="per_host",
+            type=int,
+            default=settings.FEED_UPDATE_PER_HOST,
+            help="Number of concurrent updates of feeds on the same host",
+        ),
+
     def handle(self, *args, **options):
 
         queue = self.get_podcasts(*args, **options)
@@ -41,5 +61,11 @@ class Command(PodcastCommand):
         else:
             logger.info("Updating podcasts...")
 
-            for podcast in update_podcasts(queue):
+            podcasts = update_podcasts(
+                queue,
+                max_workers=options.get("workers"),
+                per_host=options.get("per_host"),
+            )
+
+            for podcast in podcasts:
                 logger.info("Updated podcast %s", podcast)
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from mygpo.data.similarity import update_related_podcasts
+
+
+class Command(BaseCommand):
+    """Recalculates the related podcasts of all podcasts"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--max-related",
+            type=int,
+            dest="num",
+            default=20,
+            help="Number of related podcasts per podcast",
+        )
+
+        parser.add_argument(
+            "--min-subscribers",
+            type=int,
+            dest="min_subscribers",
+            default=2,
+            help="Ignore podcasts with fewer subscribers",
+        )
+
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            dest="batch_size",
+            default=1000,
+            help="Number of podcasts that are processed at once",
+        )
+
+    def handle(self, *args, **options):
+        num_podcasts = update_related_podcasts(
+            num=options["num"],
+            min_subscribers=options["min_subscribers"],
+            batch_size=options["batch_size"],
+        )
+        self.stdout.write("Updated related podcasts of %d podcasts" % num_podcasts)
@@ -0,0 +1,35 @@
+from django.db import migrations
+
+
+def forward(apps, schema_editor):
+    """Schedules the calculation of related podcasts from the subscriptions"""
+    IntervalSchedule = apps.get_model("django_celery_beat", "IntervalSchedule")
+    PeriodicTask = apps.get_model("django_celery_beat", "PeriodicTask")
+
+    schedule = IntervalSchedule.objects.filter(every=1, period="days").first()
+    if schedule is None:
+        schedule = IntervalSchedule.objects.create(every=1, period="days")
+
+    # an existing entry might have been changed in the admin
+    PeriodicTask.objects.get_or_create(
+        name="update-related-podcasts",
+        defaults={
+            "task": "mygpo.data.tasks.update_all_related_podcasts",
+            "interval": schedule,
+        },
+    )
+
+
+def backward(apps, schema_editor):
+    PeriodicTask = apps.get_model("django_celery_beat", "PeriodicTask")
+    PeriodicTask.objects.filter(name="update-related-podcasts").delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("data", "0003_podcastupdateresult_podcast_url"),
+        ("django_celery_beat", "0016_alter_crontabschedule_timezone"),
+    ]
+
+    operations = [migrations.RunPython(code=forward, reverse_code=backward)]
@@ -0,0 +1,117 @@
+""" Schedules feed updates by priority
+
+Podcasts are due for an update at their next_update_at. Of the due podcasts,
+the ones with the highest priority are scheduled in batches which are spread
+evenly over the scheduling interval. """
+
+import heapq
+import math
+from datetime import timedelta
+
+from django.conf import settings
+
+from mygpo.podcasts.models import Podcast, MIN_UPDATE_INTERVAL
+from mygpo.pubsub.models import HubSubscription
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# polling interval of podcasts with an active hub subscription
+PUBSUB_POLL_INTERVAL = timedelta(days=1)
+
+
+def update_priority(now, next_update_at, subscribers, interval):
+    """The priority of a podcast update
+
+    Podcasts with more subscribers are preferred. The longer an update is
+    overdue in relation to the update interval (in hours) of the podcast, the
+    more urgent it gets. Podcasts that have never been updated are treated as
+    being overdue by one interval.
+
+    >>> from datetime import datetime
+    >>> now = datetime(2020, 1, 2)
+    >>> daily = update_priority(now, datetime(2020, 1, 1), 100, 24)
+    >>> weekly = update_priority(now, datetime(2020, 1, 1), 100, 24 * 7)
+    >>> daily > weekly
+    True
+    >>> update_priority(now, datetime(2020, 1, 1), 1000, 24) > daily
+    True
+    """
+    interval = max(interval, MIN_UPDATE_INTERVAL)
+
+    if next_update_at is None:
+        overdue = interval
+    else:
+        overdue = (now - next_update_at).total_seconds() / 3600
+
+    urgency = max(0, 1 + overdue / interval)
+    return math.log2(2 + subscribers) * urgency
+
+
+def select_updates(now, until, max_updates):
+    """Returns the ids of the most important podcasts due until ``until``
+
+    Podcasts that are updated on notifications from their hub are only
+    polled once per PUBSUB_POLL_INTERVAL while their subscription is active."""
+
+    pushed = HubSubscription.objects.filter(
+        mode=HubSubscription.SUBSCRIBE, verified=True, lease_expires__gt=now
+    ).values("podcast")
+
+    podcasts = (
+        Podcast.objects.all()
+        .due_for_update(until)
+        .exclude(pk__in=pushed, last_update__gt=now - PUBSUB_POLL_INTERVAL)
+        .order_by()
+        .values_list(
+            "id",
+            "next_update_at",
+            "subscribers",
+            "update_interval",
+            "update_interval_factor",
+        )
+    )
+
+    prioritized = (
+        (update_priority(now, next_update_at, subscribers, interval * factor), pk)
+        for pk, next_update_at, subscribers, interval, factor in podcasts.iterator()
+    )
+
+    return [pk for _priority, pk in heapq.nlargest(max_updates, prioritized)]
+
+
+def schedule_updates(now, interval, send):
+    """Schedules the most important podcast updates due within ``interval``
+
+    The updates are sent in batches of FEED_UPDATE_WORKERS podcasts, the most
+    important first, with their start times spread over the interval.
+    ``send(urls, countdown)`` is called for each batch. Returns the number of
+    scheduled podcasts."""
+
+    hours = interval.total_seconds() / 3600
+    max_updates = int(settings.FEED_UPDATES_PER_HOUR * hours)
+    podcast_ids = select_updates(now, now + interval, max_updates)
+
+    batch_size = max(settings.FEED_UPDATE_WORKERS, 1)
+    batches = [
+        podcast_ids[n : n + batch_size] for n in range(0, len(podcast_ids), batch_size)
+    ]
+
+    for n, batch in enumerate(batches):
+        countdown = interval.total_seconds() * n / len(batches)
+
+        podcasts = Podcast.objects.filter(pk__in=batch).prefetch_related("urls")
+        urls = [podcast.url for podcast in podcasts if podcast.url]
+        send(urls, countdown)
+
+        # don't schedule the podcasts again before the update has been done;
+        # if it fails, they are retried after another interval
+        start = now + timedelta(seconds=countdown)
+        Podcast.objects.filter(pk__in=batch).update(next_update_at=start + interval)
+
+    logger.info(
+        "Scheduled %d podcasts in %d batches for update", len(podcast_ids), len(batches)
+    )
+    return len(podcast_ids)
@@ -0,0 +1,139 @@
+""" Calculates related podcasts based on co-subscriptions
+
+The subscriptions are loaded into a sparse user × podcast matrix, from which
+the cosine similarity between all podcasts is calculated in batches. """
+
+import numpy as np
+from scipy import sparse
+
+from django.db import transaction
+
+from mygpo.podcasts.models import Podcast
+from mygpo.subscriptions.models import Subscription
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def subscription_matrix(min_subscribers=2):
+    """Returns the subscription matrix and the podcast id of each column
+
+    The matrix has one row per user and one column per podcast; an entry is
+    1 if the user subscribes to the podcast on any client. Podcasts with less
+    than ``min_subscribers`` subscribers are left out."""
+
+    subscriptions = (
+        Subscription.objects.order_by()
+        .values_list("user_id", "podcast_id")
+        .distinct()
+        .iterator()
+    )
+
+    user_index, podcast_index = {}, {}
+    rows, cols = [], []
+    for user_id, podcast_id in subscriptions:
+        rows.append(user_index.setdefault(user_id, len(user_index)))
+        cols.append(podcast_index.setdefault(podcast_id, len(podcast_index)))
+
+    data = np.ones(len(rows), dtype=np.float32)
+    matrix = sparse.csr_matrix(
+        (data, (rows, cols)), shape=(len(user_index), len(podcast_index))
+    )
+
+    podcast_ids = np.array(list(podcast_index), dtype=object)
+
+    subscribers = np.asarray(matrix.sum(axis=0)).ravel()
+    keep = np.flatnonzero(subscribers >= min_subscribers)
+    return matrix[:, keep].tocsc(), podcast_ids[keep]
+
+
+def similar_podcasts(matrix, num=20, batch_size=1000):
+    """Yields the ``num`` most similar columns for each column of ``matrix``
+
+    Yields (column, [(other column, similarity), ...]) with the cosine
+    similarity of the columns, most similar first."""
+
+    # normalizing the columns turns the dot products into cosine similarities
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    norms[norms == 0] = 1
+    normalized = (matrix @ sparse.diags(1 / norms)).tocsc()
+    transposed = normalized.T.tocsr()
+
+    num_columns = matrix.shape[1]
+    for start in range(0, num_columns, batch_size):
+        end = min(start + batch_size, num_columns)
+
+        # similarities between all columns and the columns of the batch
+        similarities = (transposed @ normalized[:, start:end]).tocsc()
+
+        for n in range(end - start):
+            column = start + n
+            col = slice(similarities.indptr[n], similarities.indptr[n + 1])
+            others, values = similarities.indices[col], similarities.data[col]
+
+            mask = others != column
+            others, values = others[mask], values[mask]
+
+            top = np.argsort(-values, kind="stable")[:num]
+            yield column, list(zip(others[top], values[top]))
+
+
+def update_related_podcasts(num=20, min_subscribers=2, batch_size=1000):
+    """Recalculates the related podcasts of all subscribed podcasts
+
+    Returns the number of podcasts that were updated."""
+
+    matrix, podcast_ids = subscription_matrix(min_subscribers)
+    logger.info(
+        "Subscription matrix: {users} users, {podcasts} podcasts".format(
+            users=matrix.shape[0], podcasts=matrix.shape[1]
+        )
+    )
+
+    # each podcast gets its own most similar podcasts; adding the reverse
+    # relations as well would give popular podcasts unbounded lists
+    related = {}
+    for column, similar in similar_podcasts(matrix, num, batch_size):
+        related[column] = [other for other, similarity in similar]
+
+    Related = Podcast.related_podcasts.through
+
+    for start in range(0, len(podcast_ids), batch_size):
+        columns = range(start, min(start + batch_size, len(podcast_ids)))
+
+        with transaction.atomic():
+            Related.objects.filter(
+                from_podcast__in=[podcast_ids[c] for c in columns]
+            ).delete()
+
+            Related.objects.bulk_create(
+                [
+                    Related(
+                        from_podcast_id=podcast_ids[column],
+                        to_podcast_id=podcast_ids[other],
+                    )
+                    for column in columns
+                    for other in related.get(column, [])
+                ],
+                ignore_conflicts=True,
+            )
+
+        logger.info(
+            "Updated related podcasts of {num} / {total} podcasts".format(
+                num=columns.stop, total=len(podcast_ids)
+            )
+        )
+
+    # podcasts that are no longer in the matrix keep no outdated relations
+    handled = set(podcast_ids)
+    outdated = Related.objects.order_by().values_list("from_podcast", flat=True)
+    outdated = [pid for pid in outdated.distinct() if pid not in handled]
+    for start in range(0, len(outdated), batch_size):
+        Related.objects.filter(
+            from_podcast__in=outdated[start : start + batch_size]
+        ).delete()
+
+    logger.info("Removed related podcasts of {num} podcasts".format(num=len(outdated)))
+
+    return len(podcast_ids)
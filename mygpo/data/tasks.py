@@ -1,12 +1,11 @@
-from operator import itemgetter
+import math
 from datetime import datetime, timedelta
 
-from django.db import IntegrityError
+from django.conf import settings
 
 from celery import shared_task
 from django_db_geventpool.utils import close_connection
 
-from mygpo.data.podcast import calc_similar_podcasts
 from mygpo.celery import celery
 from mygpo.podcasts.models import Podcast
 
@@ -17,32 +16,26 @@ logger = get_task_logger(__name__)
 
 @shared_task
 @close_connection
-def update_podcasts(podcast_urls):
+def update_podcasts(podcast_urls, max_workers=None):
     """Task to update a podcast"""
     from mygpo.data.feeddownloader import update_podcasts as update
 
-    podcasts = update(podcast_urls)
+    if max_workers is None:
+        max_workers = min(len(podcast_urls), settings.FEED_UPDATE_WORKERS)
+
+    podcasts = update(podcast_urls, max_workers=max_workers)
     podcasts = filter(None, podcasts)
     return [podcast.pk for podcast in podcasts]
 
 
-@shared_task
+@shared_task(run_every=timedelta(days=1))
 @close_connection
-def update_related_podcasts(podcast_pk, max_related=20):
-    get_podcast = itemgetter(0)
-
-    podcast = Podcast.objects.get(pk=podcast_pk)
+def update_all_related_podcasts(max_related=20):
+    """Recalculates the related podcasts of all podcasts"""
+    from mygpo.data.similarity import update_related_podcasts
 
-    related = calc_similar_podcasts(podcast)[:max_related]
-    related = map(get_podcast, related)
-
-    for p in related:
-        try:
-            podcast.related_podcasts.add(p)
-        except IntegrityError:
-            logger.warning(
-                "Integrity error while adding related podcast", exc_info=True
-            )
+    num_podcasts = update_related_podcasts(num=max_related)
+    logger.info("Updated related podcasts of %d podcasts", num_podcasts)
 
 
 # interval in which podcast updates are scheduled
@@ -52,21 +45,22 @@ UPDATE_INTERVAL = timedelta(hours=1)
 @shared_task
 @close_connection
 def schedule_updates(interval=UPDATE_INTERVAL):
-    """Schedules podcast updates that are due within ``interval``"""
+    """Schedules the most important podcast updates due within ``interval``"""
+    from mygpo.data import scheduler
+
+    if not isinstance(interval, timedelta):
+        interval = timedelta(seconds=interval)
+
     now = datetime.utcnow()
+    scheduler.schedule_updates(now, interval, _send_update)
 
-    # max number of updates to schedule (one every 10s)
-    max_updates = UPDATE_INTERVAL.total_seconds() / 10
-
-    # fetch podcasts for which an update is due within the next hour
-    podcasts = (
-        Podcast.objects.all()
-        .next_update_between(now, now + interval)
-        .prefetch_related("urls")
-        .only("pk")[:max_updates]
-    )
 
-    _schedule_updates(podcasts)
+def _send_update(urls, countdown):
+    # update_podcasts.delay() seems to block other task execution,
+    # therefore celery.send_task() is used instead
+    celery.send_task(
+        "mygpo.data.tasks.update_podcasts", args=[urls], countdown=countdown
+    )
 
 
 @shared_task
@@ -74,20 +68,21 @@ def schedule_updates(interval=UPDATE_INTERVAL):
 def schedule_updates_longest_no_update():
     """Schedule podcasts for update that have not been updated for longest"""
 
-    # max number of updates to schedule (one every 20s)
-    max_updates = UPDATE_INTERVAL.total_seconds() / 10
+    # max number of updates to schedule (one every 10s)
+    max_updates = int(UPDATE_INTERVAL.total_seconds() / 10)
 
-    podcasts = Podcast.objects.order_by("last_update")[:max_updates]
-    _schedule_updates(podcasts)
+    podcasts = Podcast.objects.order_by("last_update").prefetch_related("urls")
+    _schedule_updates(podcasts[:max_updates])
 
 
 def _schedule_updates(podcasts):
-    """Schedule updates for podcasts"""
+    """Schedule updates for podcasts, in batches spread over UPDATE_INTERVAL"""
     logger.info("Scheduling %d podcasts for update", len(podcasts))
 
-    # queue all those podcast updates
-    for podcast in podcasts:
-        # update_podcasts.delay() seems to block other task execution,
-        # therefore celery.send_task() is used instead
-        urls = [podcast.url]
-        celery.send_task("mygpo.data.tasks.update_podcasts", args=[urls])
+    urls = [podcast.url for podcast in podcasts if podcast.url]
+    batch_size = max(settings.FEED_UPDATE_WORKERS, 1)
+    num_batches = math.ceil(len(urls) / batch_size)
+
+    for n in range(num_batches):
+        countdown = UPDATE_INTERVAL.total_seconds() * n / num_batches
+        _send_update(urls[n * batch_size : (n + 1) * batch_size], countdown)
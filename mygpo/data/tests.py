@@ -1,16 +1,32 @@
 import re
 import json
+import uuid
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
 
 from . import flickr
 
 import responses
 
 import unittest
+from unittest import mock
 from unittest.mock import Mock
-from datetime import datetime
-from mygpo.data.feeddownloader import EpisodeUpdater
+from datetime import datetime, timedelta
+import threading
+import time
+from mygpo.data.feeddownloader import (
+    EpisodeUpdater,
+    MultiEpisodeUpdater,
+    PodcastUpdater,
+    update_podcasts,
+)
+from mygpo.podcasts.models import Podcast, Episode
+from mygpo.users.models import Client
+from mygpo.subscriptions.models import Subscription
+from mygpo.data.similarity import update_related_podcasts
+from mygpo.data import scheduler
+from mygpo.pubsub.models import HubSubscription
 import os
 
 class TestEpisodeUpdater(unittest.TestCase):
@@ -136,6 +152,233 @@ def write_coverage_to_file(filename, method_name, branch_coverage):
         file.write(f"Total coverage = {coverage_level}%\n")
 
 
+class ConcurrentUpdateTests(unittest.TestCase):
+    """Test updating multiple podcasts concurrently"""
+
+    def setUp(self):
+        self.lock = threading.Lock()
+        self.running = {}
+        self.max_running = {}
+
+    def _fake_update(self, url):
+        host = url.split("/")[2]
+
+        with self.lock:
+            self.running[host] = self.running.get(host, 0) + 1
+            self.max_running[host] = max(
+                self.max_running.get(host, 0), self.running[host]
+            )
+
+        time.sleep(0.01)
+
+        with self.lock:
+            self.running[host] -= 1
+
+        return url
+
+    @mock.patch("mygpo.data.feeddownloader.PodcastUpdater")
+    def test_update_concurrently(self, mock_podcast_updater):
+        """All podcasts are updated, respecting the per-host limit"""
+        mock_podcast_updater.side_effect = lambda url: Mock(
+            update_podcast=lambda: self._fake_update(url)
+        )
+
+        urls = [
+            "http://{host}.example.com/feed{n}.xml".format(host=host, n=n)
+            for host in ("a", "b", "c")
+            for n in range(5)
+        ]
+
+        updated = list(update_podcasts(urls + [""], max_workers=6, per_host=2))
+
+        self.assertEqual(sorted(filter(None, updated)), sorted(urls))
+        self.assertEqual(len(updated), len(urls) + 1)
+        for host, max_running in self.max_running.items():
+            self.assertLessEqual(max_running, 2, host)
+
+
+def parsed_episode(n, *urls):
+    return {
+        "title": "Episode {}".format(n),
+        "released": 1609459200 + n * 3600,
+        "files": [{"filesize": 1024, "mimetype": "audio/mpeg", "urls": list(urls)}],
+    }
+
+
+class MultiEpisodeUpdaterTests(TestCase):
+    """Test updating the episodes of a podcast"""
+
+    def setUp(self):
+        url = "http://example.com/multi-episode.rss"
+        self.podcast = Podcast.objects.get_or_create_for_url(url).object
+
+    def update(self, parsed_episodes):
+        result = Mock(episodes_added=0)
+        updater = MultiEpisodeUpdater(self.podcast, result)
+        updater.update_episodes(parsed_episodes)
+        return updater, result
+
+    def test_bulk_update(self):
+        """New episodes are created, existing ones are updated"""
+        parsed = [
+            parsed_episode(
+                n,
+                "http://example.com/{}.mp3".format(n),
+                "http://mirror.example.com/{}.mp3".format(n),
+            )
+            for n in range(10)
+        ]
+
+        updater, result = self.update(parsed)
+        self.assertEqual(result.episodes_added, 10)
+        self.assertEqual(len(updater.updated_episodes), 10)
+
+        podcast = Podcast.objects.get(pk=self.podcast.pk)
+        self.assertEqual(podcast.episode_count, 10)
+
+        episode = Episode.objects.get(
+            podcast=self.podcast, urls__url="http://example.com/3.mp3"
+        )
+        self.assertEqual(episode.title, "Episode 3")
+        self.assertEqual(
+            [u.url for u in episode.urls.all()],
+            ["http://example.com/3.mp3", "http://mirror.example.com/3.mp3"],
+        )
+
+        # one more episode, and a changed title
+        parsed.append(parsed_episode(10, "http://example.com/10.mp3"))
+        parsed[3]["title"] = "New Title"
+
+        updater, result = self.update(parsed)
+        self.assertEqual(result.episodes_added, 1)
+
+        episode.refresh_from_db()
+        self.assertEqual(episode.title, "New Title")
+        self.assertEqual(Episode.objects.filter(podcast=self.podcast).count(), 11)
+
+    def test_unchanged_episodes(self):
+        """Episodes are only written if they have changed in the feed"""
+        parsed = [
+            parsed_episode(n, "http://example.com/{}.mp3".format(n)) for n in range(3)
+        ]
+        self.update(parsed)
+
+        url = "http://example.com/1.mp3"
+        episode = Episode.objects.get(podcast=self.podcast, urls__url=url)
+        last_update = episode.last_update
+
+        self.update(parsed)
+        episode.refresh_from_db()
+        self.assertEqual(episode.last_update, last_update)
+
+        parsed[1]["title"] = "Changed"
+        self.update(parsed)
+        episode.refresh_from_db()
+        self.assertEqual(episode.title, "Changed")
+        self.assertGreater(episode.last_update, last_update)
+
+    def order_episodes(self, parsed):
+        updater, result = self.update(parsed)
+        self.podcast.refresh_from_db()
+        updater.order_episodes()
+        self.podcast.max_episode_order = updater.max_episode_order
+        self.podcast.save()
+
+        episodes = Episode.objects.filter(podcast=self.podcast).order_by("-order")
+        return [(e.title, e.order) for e in episodes]
+
+    def test_order_episodes(self):
+        """Episodes are ordered by their release timestamp"""
+        parsed = [
+            parsed_episode(n, "http://example.com/{}.mp3".format(n)) for n in (3, 1, 2)
+        ]
+
+        self.assertEqual(
+            self.order_episodes(parsed),
+            [("Episode 3", 2), ("Episode 2", 1), ("Episode 1", 0)],
+        )
+
+        # a new episode at the top
+        parsed.append(parsed_episode(4, "http://example.com/4.mp3"))
+        self.assertEqual(
+            self.order_episodes(parsed),
+            [("Episode 4", 3), ("Episode 3", 2), ("Episode 2", 1), ("Episode 1", 0)],
+        )
+
+        # an older episode, and one without release timestamp
+        parsed.append(parsed_episode(0, "http://example.com/0.mp3"))
+        no_release = parsed_episode(5, "http://example.com/5.mp3")
+        no_release["released"] = None
+        parsed.append(no_release)
+        self.assertEqual(
+            self.order_episodes(parsed),
+            [
+                ("Episode 4", 5),
+                ("Episode 3", 4),
+                ("Episode 2", 3),
+                ("Episode 1", 2),
+                ("Episode 0", 1),
+                ("Episode 5", 0),
+            ],
+        )
+
+    def test_shared_file_url(self):
+        """A URL can only belong to one episode"""
+        parsed = [
+            parsed_episode(1, "http://example.com/1.mp3", "http://example.com/x.mp3"),
+            parsed_episode(2, "http://example.com/2.mp3", "http://example.com/x.mp3"),
+        ]
+
+        updater, result = self.update(parsed)
+        self.assertEqual(result.episodes_added, 2)
+
+        episode = Episode.objects.get(urls__url="http://example.com/x.mp3")
+        self.assertEqual(episode.title, "Episode 1")
+
+
+FEEDSERVICE_URL = re.compile(r"http://feeds.gpodder.net/parse\?.*")
+
+
+class ConditionalFetchTests(TestCase):
+    """Test that unchanged feeds are not processed again"""
+
+    def test_not_modified(self):
+        url = "http://example.com/conditional.rss"
+        parsed = {
+            "title": "Conditional Podcast",
+            "content_types": ["audio"],
+            "episodes": [parsed_episode(1, "http://example.com/1.mp3")],
+        }
+
+        with responses.RequestsMock() as rsps:
+            rsps.add(
+                responses.GET,
+                FEEDSERVICE_URL,
+                status=200,
+                body=json.dumps([parsed]),
+                headers={"ETag": '"abc"', "Last-Modified": "Mon, 01 Mar 2021"},
+            )
+            podcast = PodcastUpdater(url).update_podcast()
+
+        self.assertEqual(podcast.http_etag, '"abc"')
+        self.assertEqual(podcast.http_last_modified, "Mon, 01 Mar 2021")
+        last_update = podcast.last_update
+        factor = podcast.update_interval_factor
+
+        with responses.RequestsMock() as rsps:
+            rsps.add(responses.GET, FEEDSERVICE_URL, status=304)
+            podcast = PodcastUpdater(url).update_podcast()
+            request = rsps.calls[0].request
+
+        self.assertEqual(request.headers["If-None-Match"], '"abc"')
+        self.assertEqual(request.headers["If-Modified-Since"], "Mon, 01 Mar 2021")
+
+        podcast.refresh_from_db()
+        self.assertEqual(podcast.title, "Conditional Podcast")
+        self.assertGreater(podcast.last_update, last_update)
+        self.assertGreater(podcast.update_interval_factor, factor)
+
+
 MEDIUM_URL = "https://farm6.staticflickr.com/5001/1246644888_36863b0856.jpg"
 
 API_RESPONSE = {
@@ -192,3 +435,136 @@ class FlickrTests(TestCase):
             )
 
         self.assertEqual(disp_photo, MEDIUM_URL)
+
+
+class RelatedPodcastsTests(TestCase):
+    """Test calculating related podcasts from co-subscriptions"""
+
+    def test_update_related_podcasts(self):
+        User = get_user_model()
+        now = datetime.utcnow()
+        podcasts = [
+            Podcast.objects.create(id=uuid.uuid1(), title="Related %d" % n)
+            for n in range(4)
+        ]
+        p1, p2, p3, p4 = podcasts
+
+        # an outdated relation is removed
+        p1.related_podcasts.add(p4)
+
+        # as well as the relations of podcasts without subscribers
+        p5 = Podcast.objects.create(id=uuid.uuid1(), title="Unsubscribed")
+        p5.related_podcasts.add(p1)
+
+        subscriptions = [(p1, p2), (p1, p2), (p3, p4), (p2, p3, p4)]
+        for n, subscribed in enumerate(subscriptions):
+            user = User.objects.create(
+                username="related-%d" % n, email="related-%d@example.com" % n
+            )
+            client = Client.objects.create(user=user, uid="dev", id=uuid.uuid1())
+            for podcast in subscribed:
+                Subscription.objects.create(
+                    user=user,
+                    client=client,
+                    podcast=podcast,
+                    ref_url=podcast.url or "http://example.com/",
+                    created=now,
+                    modified=now,
+                )
+
+        self.assertEqual(update_related_podcasts(num=1), 4)
+
+        self.assertEqual(set(p1.related_podcasts.all()), {p2})
+        self.assertEqual(set(p2.related_podcasts.all()), {p1})
+        self.assertEqual(set(p3.related_podcasts.all()), {p4})
+        self.assertEqual(set(p4.related_podcasts.all()), {p3})
+
+        self.assertEqual(set(p5.related_podcasts.all()), set())
+
+        # p2 is related to p3 and p4, but less similar than to p1
+        self.assertEqual(update_related_podcasts(num=2), 4)
+        self.assertIn(p1, p2.related_podcasts.all())
+        self.assertEqual(p2.related_podcasts.count(), 2)
+        self.assertEqual(set(p3.related_podcasts.all()), {p2, p4})
+
+        # the lists are not extended by the podcasts that picked p2
+        self.assertEqual(update_related_podcasts(num=1), 4)
+        self.assertEqual(set(p2.related_podcasts.all()), {p1})
+        self.assertEqual(set(p3.related_podcasts.all()), {p4})
+
+
+class SchedulerTests(TestCase):
+    """Test scheduling podcast updates by priority"""
+
+    def _create_podcast(self, url, hours_ago, interval, subscribers):
+        podcast = Podcast.objects.create(
+            id=uuid.uuid1(),
+            last_update=self.now - timedelta(hours=hours_ago),
+            update_interval=interval,
+            subscribers=subscribers,
+        )
+        podcast.urls.create(url=url, order=0)
+        return podcast
+
+    def setUp(self):
+        self.now = datetime.utcnow()
+
+        # a popular daily show and a less popular weekly show, both overdue
+        self.daily = self._create_podcast("http://example.com/daily.rss", 25, 24, 5000)
+        self.weekly = self._create_podcast(
+            "http://example.com/weekly.rss", 24 * 7 + 1, 24 * 7, 1000
+        )
+
+        # not due within the next hour
+        self.later = self._create_podcast("http://example.com/later.rss", 1, 24, 5000)
+
+    def test_select_updates(self):
+        until = self.now + timedelta(hours=1)
+        self.assertEqual(
+            [self.daily.pk, self.weekly.pk],
+            scheduler.select_updates(self.now, until, 2),
+        )
+
+        due = Podcast.objects.all().due_for_update(until)
+        self.assertFalse(due.filter(pk=self.later.pk).exists())
+
+    def test_pubsub_podcasts_relaxed(self):
+        """Podcasts with an active hub subscription are polled less often"""
+        frequent = self._create_podcast("http://example.com/hub.rss", 6, 5, 10000)
+
+        until = self.now + timedelta(hours=1)
+        self.assertEqual([frequent.pk], scheduler.select_updates(self.now, until, 1))
+
+        HubSubscription.objects.create(
+            podcast=frequent,
+            topic_url="http://example.com/hub.rss",
+            hub_url="http://hub.example.com/",
+            mode=HubSubscription.SUBSCRIBE,
+            verified=True,
+            lease_expires=self.now + timedelta(days=1),
+        )
+
+        self.assertEqual([self.daily.pk], scheduler.select_updates(self.now, until, 1))
+
+    @override_settings(FEED_UPDATES_PER_HOUR=2, FEED_UPDATE_WORKERS=1)
+    def test_schedule_updates(self):
+        sent = []
+        interval = timedelta(hours=1)
+        num = scheduler.schedule_updates(
+            self.now, interval, lambda urls, countdown: sent.append((urls, countdown))
+        )
+
+        self.assertEqual(2, num)
+        self.assertEqual(
+            [
+                (["http://example.com/daily.rss"], 0),
+                (["http://example.com/weekly.rss"], 1800),
+            ],
+            sent,
+        )
+
+        # scheduled podcasts are not due again until after their update
+        self.daily.refresh_from_db()
+        self.assertEqual(self.now + interval, self.daily.next_update_at)
+        due = Podcast.objects.all().due_for_update(self.now + interval / 2)
+        self.assertFalse(due.filter(pk__in=[self.daily.pk, self.weekly.pk]).exists())
@@ -0,0 +1,44 @@
+from functools import partial
+
+from django.apps import AppConfig, apps
+from django.conf import settings
+from django.db import transaction
+
+from mygpo.subscriptions.signals import subscription_changed, subscriptions_changed
+
+
+def update_subscribers_on_subscription(sender, **kwargs):
+    """update the subscriber count of a podcast after a subscription change"""
+    from mygpo.directory.tasks import update_subscribers
+
+    podcast = kwargs["instance"]
+    transaction.on_commit(partial(update_subscribers.delay, [podcast.pk]))
+
+
+def update_subscribers_on_subscriptions(sender, **kwargs):
+    """update the subscriber counts after a bulk subscription change"""
+    from mygpo.directory.tasks import update_subscribers
+
+    changes = kwargs["subscribed"] + kwargs["unsubscribed"]
+    podcast_ids = list(set(podcast.pk for client, podcast in changes))
+    transaction.on_commit(partial(update_subscribers.delay, podcast_ids))
+
+
+class DirectoryConfig(AppConfig):
+    name = "mygpo.directory"
+    verbose_name = "Directory"
+
+    def ready(self):
+        Podcast = apps.get_model("podcasts.Podcast")
+        subscription_changed.connect(
+            update_subscribers_on_subscription,
+            sender=Podcast,
+            dispatch_uid="update_subscribers-subscription",
+        )
+
+        User = apps.get_model(settings.AUTH_USER_MODEL)
+        subscriptions_changed.connect(
+            update_subscribers_on_subscriptions,
+            sender=User,
+            dispatch_uid="update_subscribers-subscriptions",
+        )
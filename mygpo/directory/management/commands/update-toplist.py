@@ -1,14 +1,10 @@
-from optparse import make_option
-
 from django.core.management.base import BaseCommand
 
-from mygpo.podcasts.models import Podcast
-from mygpo.utils import progress
-from mygpo.directory.tasks import update_podcast_subscribers
+from mygpo.directory.tasks import update_subscriber_counts, update_subscribers
 
 
 class Command(BaseCommand):
-    """For each podcast a task is scheduled to update its subscriber count"""
+    """Updates the subscriber counts of all podcasts"""
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -19,15 +15,23 @@ class Command(BaseCommand):
             help="Don't show any output",
         ),
 
+        parser.add_argument(
+            "--background",
+            action="store_true",
+            dest="background",
+            default=False,
+            help="Schedule the update as a background task",
+        ),
+
     def handle(self, *args, **options):
 
         silent = options.get("silent")
 
-        podcasts = Podcast.objects.all()
-        total = podcasts.count()
+        if options.get("background"):
+            update_subscribers.delay()
+            return
 
-        for n, podcast in enumerate(podcasts):
-            update_podcast_subscribers.delay(podcast.get_id())
+        num_changed = update_subscriber_counts()
 
-            if not silent:
-                progress(n, total)
+        if not silent:
+            self.stdout.write("Updated subscribers of %d podcasts" % num_changed)
@@ -0,0 +1,35 @@
+from django.db import migrations
+
+
+def forward(apps, schema_editor):
+    """Schedules the refresh of the cached toplists before they expire"""
+    IntervalSchedule = apps.get_model("django_celery_beat", "IntervalSchedule")
+    PeriodicTask = apps.get_model("django_celery_beat", "PeriodicTask")
+
+    schedule = IntervalSchedule.objects.filter(every=1, period="hours").first()
+    if schedule is None:
+        schedule = IntervalSchedule.objects.create(every=1, period="hours")
+
+    # an existing entry might have been changed in the admin
+    PeriodicTask.objects.get_or_create(
+        name="update-toplists",
+        defaults={
+            "task": "mygpo.directory.tasks.update_toplists",
+            "interval": schedule,
+        },
+    )
+
+
+def backward(apps, schema_editor):
+    PeriodicTask = apps.get_model("django_celery_beat", "PeriodicTask")
+    PeriodicTask.objects.filter(name="update-toplists").delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("directory", "0001_initial"),
+        ("django_celery_beat", "0016_alter_crontabschedule_timezone"),
+    ]
+
+    operations = [migrations.RunPython(code=forward, reverse_code=backward)]
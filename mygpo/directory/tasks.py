@@ -1,9 +1,17 @@
+from datetime import datetime, timedelta
+
+from django.db.models import Count
 from django_db_geventpool.utils import close_connection
 from celery import shared_task
 
 from mygpo.podcasts.models import Podcast
 from mygpo.subscriptions.models import Subscription
 from mygpo.celery import celery
+from mygpo.search.autocomplete import subscribers_changed
+
+from celery.utils.log import get_task_logger
+
+logger = get_task_logger(__name__)
 
 
 @shared_task(max_retries=5)
@@ -12,17 +20,76 @@ def update_podcast_subscribers(podcast_id):
     """Updates the subscriber count of a podcast"""
 
     try:
-        podcast = Podcast.objects.get(id=podcast_id)
-
-        # calculate current number of subscribers
-        podcast.subscribers = (
-            Subscription.objects.filter(podcast=podcast)
-            .order_by("user")
-            .distinct("user")
-            .count()
-        )
-        podcast.save()
+        update_subscriber_counts([podcast_id])
 
     # TODO: which exceptions?
     except Exception as ex:
         raise update_podcast_subscribers.retry(exc=ex)
+
+
+@shared_task(max_retries=5)
+@close_connection
+def update_subscribers(podcast_ids=None):
+    """Updates the subscriber counts of the given or of all podcasts"""
+
+    try:
+        num_changed = update_subscriber_counts(podcast_ids)
+        logger.info("Updated subscriber counts of %d podcasts", num_changed)
+
+    except Exception as ex:
+        raise update_subscribers.retry(exc=ex)
+
+
+@shared_task(run_every=timedelta(hours=1))
+@close_connection
+def update_toplists():
+    """Refreshes the cached toplists of all languages"""
+    from mygpo.directory.toplist import update_toplists as update
+
+    languages = update()
+    logger.info("Updated toplists for %d languages", len(languages))
+
+
+def update_subscriber_counts(podcast_ids=None, chunk_size=1000):
+    """Recalculates the subscriber counts of podcasts
+
+    The subscribers of all podcasts (or those in ``podcast_ids``) are counted
+    in a single query; only the counts that have changed are written.
+    Returns the number of changed podcasts."""
+
+    subscriptions = Subscription.objects.order_by()
+    podcasts = Podcast.objects.order_by()
+
+    if podcast_ids is not None:
+        subscriptions = subscriptions.filter(podcast__in=podcast_ids)
+        podcasts = podcasts.filter(id__in=podcast_ids)
+
+    counts = dict(
+        subscriptions.values("podcast")
+        .annotate(subscribers=Count("user", distinct=True))
+        .values_list("podcast", "subscribers")
+    )
+
+    # podcasts that are not in counts have no subscribers anymore
+    current = dict(podcasts.exclude(subscribers=0).values_list("id", "subscribers"))
+
+    # modified is set, so that the changes are picked up by the autocomplete
+    # index, which is updated with recently modified podcasts
+    now = datetime.utcnow()
+    changed = [
+        Podcast(id=podcast_id, subscribers=subscribers, modified=now)
+        for podcast_id, subscribers in counts.items()
+        if current.get(podcast_id, 0) != subscribers
+    ] + [
+        Podcast(id=podcast_id, subscribers=0, modified=now)
+        for podcast_id in current.keys() - counts.keys()
+    ]
+
+    Podcast.objects.bulk_update(
+        changed, ["subscribers", "modified"], batch_size=chunk_size
+    )
+
+    if changed:
+        subscribers_changed()
+
+    return len(changed)
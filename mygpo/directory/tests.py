@@ -6,6 +6,7 @@ from datetime import datetime
 from django.test import RequestFactory
 from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.core.cache import cache
 from mygpo.data.feeddownloader import NoEpisodesException
 
 from mygpo.podcasts.models import Podcast
@@ -17,6 +18,7 @@ class ToplistTests(unittest.TestCase):
 
     def test_toplist_languages(self):
         """Test the all_languages method of the toplists"""
+        cache.delete("toplist-languages")
         languages = ["de", "de_AT", "en"]
         for lang in languages:
             Podcast.objects.create(
@@ -108,3 +110,79 @@ class MissingPodcastTests(TestCase):
         )
 
         self.assertNotContains(response, "Add Podcast")
+
+
+class SubscriberCountTests(TestCase):
+    """Test recalculating the subscriber counts of podcasts"""
+
+    def test_update_subscriber_counts(self):
+        from mygpo.directory.tasks import update_subscriber_counts
+        from mygpo.subscriptions.models import Subscription
+        from mygpo.users.models import Client
+
+        now = datetime.utcnow()
+        p1, p2, p3 = [
+            Podcast.objects.create(id=uuid.uuid1(), subscribers=n) for n in (0, 5, 1)
+        ]
+
+        User = get_user_model()
+        for n in range(2):
+            user = User.objects.create(
+                username="subscribers-%d" % n, email="subscribers-%d@example.com" % n
+            )
+
+            # multiple subscriptions of the same user are counted once
+            for uid in ("dev1", "dev2"):
+                client = Client.objects.create(user=user, uid=uid, id=uuid.uuid1())
+                Subscription.objects.create(
+                    user=user,
+                    client=client,
+                    podcast=p1,
+                    ref_url="http://example.com/",
+                    created=now,
+                    modified=now,
+                )
+
+        with self.assertNumQueries(3):
+            self.assertEqual(update_subscriber_counts(), 3)
+
+        for podcast, subscribers in ((p1, 2), (p2, 0), (p3, 0)):
+            podcast.refresh_from_db()
+            self.assertEqual(podcast.subscribers, subscribers)
+
+        # nothing is written if the counts are up to date
+        with self.assertNumQueries(2):
+            self.assertEqual(update_subscriber_counts([p1.pk, p2.pk]), 0)
+
+
+class ToplistSnapshotTests(TestCase):
+    """Test the cached toplist snapshots"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_update_toplists(self):
+        from mygpo.directory.toplist import update_toplists, podcast_toplist
+
+        p1 = Podcast.objects.create(id=uuid.uuid1(), language="de", subscribers=2)
+        p2 = Podcast.objects.create(id=uuid.uuid1(), language="en", subscribers=1)
+
+        self.assertEqual(update_toplists(), {"de": "Deutsch", "en": "English"})
+
+        # snapshots are served from the cache, only the podcasts are loaded
+        with self.assertNumQueries(3):
+            self.assertEqual(podcast_toplist(), [p1, p2])
+        with self.assertNumQueries(3):
+            self.assertEqual(podcast_toplist("en"), [p2])
+        with self.assertNumQueries(0):
+            self.assertEqual(ToplistView().all_languages()["de"], "Deutsch")
+
+        # the snapshots only contain the ordered ids
+        self.assertEqual(cache.get("toplist-podcasts-"), [p1.pk, p2.pk])
+
+        # changes become visible when the snapshots are updated
+        p2.subscribers = 3
+        p2.save()
+        self.assertEqual(podcast_toplist(), [p1, p2])
+        update_toplists()
+        self.assertEqual(podcast_toplist(), [p2, p1])
@@ -0,0 +1,117 @@
+""" Snapshots of the podcast and episode toplists
+
+The toplists are calculated by the update_toplists task and stored in the
+cache, so that they can be shared between requests. A toplist that is not
+in the cache is calculated on first access. Only the ordered ids are cached,
+which keeps the entries small; the podcasts and episodes are loaded with a
+fixed number of queries when the toplist is accessed. """
+
+from django.core.cache import cache
+
+from mygpo.podcasts.models import Podcast, Episode
+from mygpo.web.utils import get_language_names, sanitize_language_codes
+
+
+# number of entries in each toplist
+TOPLIST_SIZE = 100
+
+# snapshots expire if they are not refreshed in time
+TOPLIST_TIMEOUT = 60 * 60 * 3
+
+
+def podcast_toplist(language=None):
+    """The most subscribed podcasts (in the given language)"""
+    key = _cache_key("podcasts", language)
+    toplist = cache.get(key)
+
+    if toplist is None:
+        toplist = _podcast_toplist(language)
+        cache.set(key, toplist, TOPLIST_TIMEOUT)
+
+    podcasts = Podcast.objects.all().prefetch_related("slugs", "urls")
+    return _in_order(podcasts, toplist)
+
+
+def episode_toplist(language=None):
+    """The most listened-to episodes (in the given language)"""
+    key = _cache_key("episodes", language)
+    toplist = cache.get(key)
+
+    if toplist is None:
+        toplist = _episode_toplist(language)
+        cache.set(key, toplist, TOPLIST_TIMEOUT)
+
+    episodes = (
+        Episode.objects.all()
+        .select_related("podcast")
+        .prefetch_related("slugs", "podcast__slugs")
+    )
+    return _in_order(episodes, toplist)
+
+
+def toplist_languages():
+    """The names of all languages for which there are toplists
+
+    Returns a dict mapping 2-letter language codes to their names."""
+    languages = cache.get("toplist-languages")
+
+    if languages is None:
+        languages = _toplist_languages()
+        cache.set("toplist-languages", languages, TOPLIST_TIMEOUT)
+
+    return languages
+
+
+def update_toplists():
+    """Calculates the toplists of all languages and stores them in the cache"""
+    languages = _toplist_languages()
+
+    for language in [None] + list(languages):
+        cache.set(
+            _cache_key("podcasts", language),
+            _podcast_toplist(language),
+            TOPLIST_TIMEOUT,
+        )
+        cache.set(
+            _cache_key("episodes", language),
+            _episode_toplist(language),
+            TOPLIST_TIMEOUT,
+        )
+
+    cache.set("toplist-languages", languages, TOPLIST_TIMEOUT)
+    return languages
+
+
+def _cache_key(kind, language):
+    return "toplist-{kind}-{language}".format(kind=kind, language=language or "")
+
+
+def _podcast_toplist(language):
+    toplist = Podcast.objects.all().toplist(language)
+    return list(toplist.values_list("id", flat=True)[:TOPLIST_SIZE])
+
+
+def _episode_toplist(language):
+    toplist = Episode.objects.all().toplist(language)
+    return list(toplist.values_list("id", flat=True)[:TOPLIST_SIZE])
+
+
+def _in_order(queryset, ids):
+    """The objects with the given ids, in the order of the ids"""
+    objects = queryset.in_bulk(ids)
+    return [objects[pk] for pk in ids if pk in objects]
+
+
+def _toplist_languages():
+    """Returns all 2-letter language codes that are used by podcasts.
+
+    It filters obviously invalid strings, but does not check if any
+    of these codes is contained in ISO 639."""
+
+    query = Podcast.objects.exclude(language__isnull=True)
+    query = query.distinct("language").values("language")
+
+    langs = [o["language"] for o in query]
+    langs = sorted(sanitize_language_codes(langs))
+
+    return get_language_names(langs)
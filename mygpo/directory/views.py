@@ -18,14 +18,13 @@ from django.contrib import messages
 from django.utils.translation import gettext as _
 from django.contrib.auth import get_user_model
 
-from mygpo.podcasts.models import Podcast, Episode
+from mygpo.podcasts.models import Podcast
 from mygpo.directory.search import search_podcasts
+from mygpo.directory.toplist import podcast_toplist, episode_toplist, toplist_languages
 from mygpo.web.utils import (
     process_lang_params,
-    get_language_names,
     get_page_list,
     get_podcast_link_target,
-    sanitize_language_codes,
 )
 from mygpo.directory.tags import Topics
 from mygpo.categories.models import Category
@@ -48,18 +47,8 @@ class ToplistView(TemplateView):
         return super(ToplistView, self).dispatch(*args, **kwargs)
 
     def all_languages(self):
-        """Returns all 2-letter language codes that are used by podcasts.
-
-        It filters obviously invalid strings, but does not check if any
-        of these codes is contained in ISO 639."""
-
-        query = Podcast.objects.exclude(language__isnull=True)
-        query = query.distinct("language").values("language")
-
-        langs = [o["language"] for o in query]
-        langs = sorted(sanitize_language_codes(langs))
-
-        return get_language_names(langs)
+        """Returns all 2-letter language codes that are used by podcasts."""
+        return toplist_languages()
 
     def language(self):
         """Currently selected language"""
@@ -78,11 +67,7 @@ class PodcastToplistView(ToplistView):
     def get_context_data(self, num=100):
         context = super(PodcastToplistView, self).get_context_data()
 
-        entries = (
-            Podcast.objects.all()
-            .prefetch_related("slugs")
-            .toplist(self.language())[:num]
-        )
+        entries = podcast_toplist(self.language())[:num]
         context["entries"] = entries
 
         context["max_subscribers"] = max([0] + [p.subscriber_count() for p in entries])
@@ -98,12 +83,7 @@ class EpisodeToplistView(ToplistView):
     def get_context_data(self, num=100):
         context = super(EpisodeToplistView, self).get_context_data()
 
-        entries = (
-            Episode.objects.all()
-            .select_related("podcast")
-            .prefetch_related("slugs", "podcast__slugs")
-            .toplist(self.language())[:num]
-        )
+        entries = episode_toplist(self.language())[:num]
         context["entries"] = entries
 
         # Determine maximum listener amount (or 0 if no entries exist)
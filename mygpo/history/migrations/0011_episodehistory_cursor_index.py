@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("history", "0010_episode_history_index")]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name="episodehistoryentry",
+            index_together=set(
+                [
+                    ("user", "action", "episode"),
+                    ("user", "timestamp"),
+                    ("user", "timestamp", "id"),
+                    ("user", "client", "episode", "action", "timestamp"),
+                    ("episode", "timestamp"),
+                    ("user", "episode", "timestamp"),
+                ]
+            ),
+        )
+    ]
@@ -116,6 +116,8 @@ class EpisodeHistoryEntry(models.Model):
             ["user", "action", "episode"],
             ["user", "episode", "timestamp"],
             ["user", "timestamp"],
+            # keyset pagination in the episode actions API
+            ["user", "timestamp", "id"],
             ["episode", "timestamp"],
         ]
 
@@ -213,3 +215,58 @@ class EpisodeHistoryEntry(models.Model):
                 )
             )
             return None
+
+    @classmethod
+    def create_entries(cls, user, entries):
+        """Saves the (unsaved) entries of the user in bulk
+
+        As in create_entry, entries that already exist or that fail validation
+        are skipped. Duplicates are detected with a single query. Returns the
+        list of created entries."""
+
+        def _key(entry):
+            return (
+                entry.episode_id,
+                entry.client_id,
+                entry.action,
+                entry.started,
+                entry.stopped,
+            )
+
+        episode_ids = {entry.episode_id for entry in entries}
+        existing = cls.objects.filter(user=user, episode__in=episode_ids)
+        existing = set(
+            existing.values_list("episode", "client", "action", "started", "stopped")
+        )
+
+        new_entries = []
+        for entry in entries:
+            entry.user = user
+
+            if entry.timestamp is None:
+                entry.timestamp = datetime.utcnow()
+
+            key = _key(entry)
+            if key in existing:
+                logger.warning(
+                    "Trying to save duplicate {cls} for {user} "
+                    "/ {episode}".format(cls=cls, user=user, episode=entry.episode)
+                )
+                continue
+
+            try:
+                # the related objects have already been looked up
+                entry.full_clean(exclude=["user", "episode", "client"])
+
+            except ValidationError as e:
+                logger.warning(
+                    "Validation of {cls} failed for {user}: {err}".format(
+                        cls=cls, user=user, err=e
+                    )
+                )
+                continue
+
+            existing.add(key)
+            new_entries.append(entry)
+
+        return cls.objects.bulk_create(new_entries, batch_size=1000)
@@ -0,0 +1,83 @@
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from mygpo.podcasts.models import Podcast, PodcastGroup, Episode, URL, Slug
+
+
+# sets the canonical value of a chunk of objects to their first URL / slug
+UPDATE_SQL = """
+UPDATE {table} AS obj
+SET {column} = first.value
+FROM (
+    SELECT DISTINCT ON (object_id) object_id, {field} AS value
+    FROM {entry_table}
+    WHERE content_type_id = %s AND object_id = ANY(%s)
+    ORDER BY object_id, "order"
+) AS first
+WHERE obj.id = first.object_id
+  AND obj.{column} IS DISTINCT FROM first.value
+"""
+
+
+class Command(BaseCommand):
+    """Stores the canonical URLs and slugs of podcasts and episodes
+
+    Fills the canonical_url and canonical_slug columns from the first URL and
+    slug of each object, eg after the columns have been added."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            dest="chunk_size",
+            default=10000,
+            help="Number of objects that are updated at once",
+        )
+
+    def handle(self, *args, **options):
+        tasks = [
+            (Podcast, URL, "url", "canonical_url"),
+            (Podcast, Slug, "slug", "canonical_slug"),
+            (PodcastGroup, Slug, "slug", "canonical_slug"),
+            (Episode, URL, "url", "canonical_url"),
+            (Episode, Slug, "slug", "canonical_slug"),
+        ]
+
+        for model, entry_model, field, column in tasks:
+            updated = update_canonical(
+                model, entry_model, field, column, options["chunk_size"]
+            )
+            self.stdout.write(
+                "Updated {column} of {num} {model} objects".format(
+                    column=column, num=updated, model=model.__name__
+                )
+            )
+
+
+def update_canonical(model, entry_model, field, column, chunk_size):
+    """Updates the canonical values of all objects, in chunks of ids"""
+
+    sql = UPDATE_SQL.format(
+        table=model._meta.db_table,
+        column=column,
+        field=field,
+        entry_table=entry_model._meta.db_table,
+    )
+    content_type = ContentType.objects.get_for_model(model)
+
+    updated, last_id = 0, None
+    while True:
+        ids = model.objects.order_by("id")
+        if last_id is not None:
+            ids = ids.filter(id__gt=last_id)
+        ids = list(ids.values_list("id", flat=True)[:chunk_size])
+
+        if not ids:
+            return updated
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(sql, [content_type.pk, ids])
+            updated += cursor.rowcount
+
+        last_id = ids[-1]
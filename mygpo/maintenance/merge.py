@@ -16,11 +16,13 @@ from mygpo.podcasts.models import (
     MergedUUID,
     Podcast,
     Episode,
+    SlugsMixin,
+    UrlsMixin,
 )
 from mygpo import utils
 from mygpo.history.models import HistoryEntry, EpisodeHistoryEntry
 from mygpo.publisher.models import PublishedPodcast
-from mygpo.subscriptions.models import Subscription
+from mygpo.subscriptions.models import Subscription, SubscriptionChange
 
 import logging
 
@@ -232,6 +234,14 @@ def merge_model_objects(primary_object, alias_objects=[], keep_old=False):
             before_delete(alias_object, primary_object)
             alias_object.delete()
     primary_object.save()
+
+    # URLs and slugs might have been moved from the alias objects
+    if isinstance(primary_object, UrlsMixin):
+        primary_object.update_canonical_url()
+
+    if isinstance(primary_object, SlugsMixin):
+        primary_object.update_canonical_slug()
+
     return primary_object
 
 
@@ -269,6 +279,20 @@ def reassigned(obj, new):
     elif isinstance(obj, Subscription):
         pass
 
+    elif isinstance(obj, SubscriptionChange):
+        # a client has only one change per podcast; the latest one is kept
+        existing = (
+            SubscriptionChange.objects.filter(client_id=obj.client_id, podcast=new)
+            .exclude(pk=obj.pk)
+            .first()
+        )
+        if existing is not None:
+            if existing.timestamp > obj.timestamp:
+                obj.subscribed = existing.subscribed
+                obj.timestamp = existing.timestamp
+            obj.created = min(obj.created, existing.created)
+            existing.delete()
+
     elif isinstance(obj, EpisodeHistoryEntry):
         pass
 
@@ -9,6 +9,8 @@ from django.contrib.auth import get_user_model
 
 from mygpo.podcasts.models import Podcast, Episode
 from mygpo.history.models import EpisodeHistoryEntry
+from mygpo.subscriptions.models import SubscriptionChange
+from mygpo.users.models import Client
 from mygpo.maintenance.merge import PodcastMerger
 
 
@@ -99,6 +101,28 @@ class MergeTests(TransactionTestCase):
         self.assertIn(action1, history)
         self.assertIn(action2, history)
 
+    def test_merge_subscription_changes(self):
+        client = Client.objects.create(user=self.user, uid="dev1", id=uuid.uuid1())
+
+        # both podcasts have a change on the same client; the later one is kept
+        SubscriptionChange.objects.log(
+            self.user, client, self.podcast1, False, datetime(2020, 1, 1)
+        )
+        SubscriptionChange.objects.log(
+            self.user, client, self.podcast2, True, datetime(2020, 1, 2)
+        )
+
+        groups = [(0, [self.episode1.id, self.episode2.id])]
+        counter = Counter()
+
+        pm = PodcastMerger([self.podcast1, self.podcast2], counter, groups)
+        pm.merge()
+
+        change = SubscriptionChange.objects.get(client=client)
+        self.assertEqual(change.podcast, self.podcast1)
+        self.assertTrue(change.subscribed)
+        self.assertEqual(change.timestamp, datetime(2020, 1, 2))
+
     def tearDown(self):
         self.episode1.delete()
         self.podcast1.delete()
@@ -0,0 +1,14 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("podcasts", "0045_auto_20191230_2330")]
+
+    operations = [
+        migrations.AddField(
+            model_name="episode",
+            name="feed_hash",
+            field=models.CharField(blank=True, max_length=40, null=True),
+        )
+    ]
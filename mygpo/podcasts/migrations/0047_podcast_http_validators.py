@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("podcasts", "0046_episode_feed_hash")]
+
+    operations = [
+        migrations.AddField(
+            model_name="podcast",
+            name="http_etag",
+            field=models.CharField(blank=True, max_length=1000, null=True),
+        ),
+        migrations.AddField(
+            model_name="podcast",
+            name="http_last_modified",
+            field=models.CharField(blank=True, max_length=50, null=True),
+        ),
+    ]
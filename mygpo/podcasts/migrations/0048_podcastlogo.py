@@ -0,0 +1,35 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("podcasts", "0047_podcast_http_validators")]
+
+    operations = [
+        migrations.CreateModel(
+            name="PodcastLogo",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("url_hash", models.CharField(max_length=40, unique=True)),
+                ("url", models.URLField(max_length=1000)),
+                ("content_hash", models.CharField(max_length=40)),
+                (
+                    "http_etag",
+                    models.CharField(blank=True, max_length=1000, null=True),
+                ),
+                (
+                    "http_last_modified",
+                    models.CharField(blank=True, max_length=50, null=True),
+                ),
+                ("modified", models.DateTimeField(auto_now=True)),
+            ],
+        )
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations, models
+
+
+def forward(apps, schema_editor):
+    """Calculates the next update of all podcasts, see Podcast.next_update"""
+
+    # interval arithmetic is specific to PostgreSQL
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    schema_editor.execute(
+        "UPDATE podcasts_podcast "
+        "SET next_update_at = last_update + "
+        "  LEAST(update_interval * update_interval_factor, 720) * INTERVAL '1 hour' "
+        "WHERE last_update IS NOT NULL;"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("podcasts", "0048_podcastlogo")]
+
+    operations = [
+        migrations.AddField(
+            model_name="podcast",
+            name="next_update_at",
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(code=forward, reverse_code=migrations.RunPython.noop),
+    ]
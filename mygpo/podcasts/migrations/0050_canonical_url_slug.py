@@ -0,0 +1,34 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("podcasts", "0049_podcast_next_update_at")]
+
+    operations = [
+        migrations.AddField(
+            model_name="podcast",
+            name="canonical_url",
+            field=models.URLField(blank=True, max_length=2048, null=True),
+        ),
+        migrations.AddField(
+            model_name="podcast",
+            name="canonical_slug",
+            field=models.SlugField(blank=True, max_length=150, null=True),
+        ),
+        migrations.AddField(
+            model_name="episode",
+            name="canonical_url",
+            field=models.URLField(blank=True, max_length=2048, null=True),
+        ),
+        migrations.AddField(
+            model_name="episode",
+            name="canonical_slug",
+            field=models.SlugField(blank=True, max_length=150, null=True),
+        ),
+        migrations.AddField(
+            model_name="podcastgroup",
+            name="canonical_slug",
+            field=models.SlugField(blank=True, max_length=150, null=True),
+        ),
+    ]
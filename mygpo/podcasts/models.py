@@ -6,7 +6,8 @@ from datetime import timedelta
 from django.core.cache import cache
 from django.conf import settings
 from django.db import models, transaction, IntegrityError, DataError
-from django.db.models import F
+from django.db.models import F, Q
+from django.db.models.expressions import RawSQL
 from django.utils.translation import gettext as _
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericRelation, GenericForeignKey
@@ -219,15 +220,21 @@ class SlugsMixin(models.Model):
 
     slugs = GenericRelation(Slug, related_query_name="slugs")
 
+    # copy of the canonical slug, maintained by the methods below
+    canonical_slug = models.SlugField(max_length=150, null=True, blank=True)
+
     class Meta:
         abstract = True
 
     @property
     def slug(self):
-        """The main slug of the podcast
+        """The main slug of the podcast"""
 
-        TODO: should be retrieved from a (materialized) view"""
+        if self.canonical_slug is not None:
+            return self.canonical_slug
 
+        # objects that don't have a canonical slug yet (eg because the slugs
+        # have been created directly) fall back to their Slug objects.
         # We could also use self.slugs.first() here, but this would result in a
         # different query and would render a .prefetch_related('slugs') useless
         # The assumption is that we will never have loads of slugs, so
@@ -237,6 +244,13 @@ class SlugsMixin(models.Model):
         logger.debug("Found slugs %r, picking %r", slugs, slug)
         return slug
 
+    def update_canonical_slug(self):
+        """Stores the first of the object's slugs as its canonical slug"""
+        slug = self.slugs.order_by("order").values_list("slug", flat=True).first()
+        type(self).objects.filter(pk=self.pk).update(canonical_slug=slug)
+        self.canonical_slug = slug
+
+    @transaction.atomic
     def add_slug(self, slug):
         """Adds a (non-cannonical) slug"""
 
@@ -258,6 +272,9 @@ class SlugsMixin(models.Model):
             scope=self.scope, slug=slug, content_object=self, order=next_order
         )
 
+        if next_order == 0:
+            self.update_canonical_slug()
+
     def set_slug(self, slug):
         """Sets the canonical slug"""
 
@@ -268,6 +285,7 @@ class SlugsMixin(models.Model):
         slugs.insert(0, slug)
         self.set_slugs(slugs)
 
+    @transaction.atomic
     def remove_slug(self, slug):
         """Removes a slug"""
         Slug.objects.filter(
@@ -276,6 +294,10 @@ class SlugsMixin(models.Model):
             object_id=self.id,
         ).delete()
 
+        if slug == self.canonical_slug:
+            self.update_canonical_slug()
+
+    @transaction.atomic
     def set_slugs(self, slugs):
         """Update the object's slugs to the given list
 
@@ -285,6 +307,7 @@ class SlugsMixin(models.Model):
         slugs = [utils.to_maxlength(Slug, "slug", slug) for slug in slugs]
         existing = {s.slug: s for s in self.slugs.all()}
         utils.set_ordered_entries(self, slugs, existing, Slug, "slug", "content_object")
+        self.update_canonical_slug()
 
 
 class PodcastGroup(UUIDModel, TitleModel, SlugsMixin):
@@ -332,25 +355,20 @@ class PodcastQuerySet(MergedUUIDQuerySet):
 
     def order_by_next_update(self):
         """Sort podcasts by next scheduled update"""
-        NEXTUPDATE = (
-            "last_update + (update_interval * "
-            "update_interval_factor || ' hours')::INTERVAL"
-        )
-        q = self.extra(select={"_next_update": NEXTUPDATE})
-        return q.order_by("_next_update")
+        return self.exclude(next_update_at__isnull=True).order_by("next_update_at")
 
     @property
     def next_update(self):
         interval = timedelta(hours=self.update_interval) * self.update_interval_factor
         return self.last_update + interval
 
-    def next_update_between(self, start, end):
-        NEXTUPDATE_BETWEEN = (
-            "(last_update + (update_interval * "
-            " update_interval_factor || "
-            "' hours')::INTERVAL) BETWEEN %s AND %s"
+    def due_for_update(self, until):
+        """Podcasts that are due for an update until the given time
+
+        Podcasts that have never been updated are always due."""
+        return self.filter(
+            Q(next_update_at__lte=until) | Q(next_update_at__isnull=True)
         )
-        return self.extra(where=[NEXTUPDATE_BETWEEN], params=[start, end])
 
     def toplist(self, language=None):
         toplist = self
@@ -399,7 +417,7 @@ class PodcastManager(GenericManager):
             # episode did not exist, try to create it
             try:
                 with transaction.atomic():
-                    podcast = Podcast.objects.create(**defaults)
+                    podcast = Podcast.objects.create(canonical_url=url, **defaults)
                     url = URL.objects.create(
                         url=url, order=0, scope="", content_object=podcast
                     )
@@ -410,6 +428,28 @@ class PodcastManager(GenericManager):
                 podcast = Podcast.objects.get(urls__url=url, urls__scope="")
                 return GetCreateResult(podcast, False)
 
+    def get_or_create_for_urls(self, urls):
+        """Returns a dict that maps each of the URLs to its podcast
+
+        Existing podcasts are looked up with a fixed number of queries; only
+        podcasts that do not exist yet are created one by one."""
+
+        urls = set(filter(None, urls))
+        maxlength_urls = {url: utils.to_maxlength(URL, "url", url) for url in urls}
+
+        url_objs = URL.objects.filter(scope="", url__in=maxlength_urls.values())
+        object_ids = dict(url_objs.values_list("url", "object_id"))
+        podcasts = self.in_bulk(object_ids.values())
+
+        result = {}
+        for url, maxlength_url in maxlength_urls.items():
+            podcast = podcasts.get(object_ids.get(maxlength_url))
+            if podcast is None:
+                podcast = self.get_or_create_for_url(url).object
+            result[url] = podcast
+
+        return result
+
 
 class URL(OrderedModel, ScopedModel):
     """Podcasts and Episodes can have multiple URLs
@@ -444,19 +484,34 @@ class UrlsMixin(models.Model):
 
     urls = GenericRelation(URL, related_query_name="urls")
 
+    # copy of the canonical URL, maintained by the methods below
+    canonical_url = models.URLField(max_length=2048, null=True, blank=True)
+
     class Meta:
         abstract = True
 
     @property
     def url(self):
         """The main URL of the model"""
-        # We could also use self.urls.first() here, but this would result in a
+
+        if self.canonical_url is not None:
+            return self.canonical_url
+
+        # objects that don't have a canonical URL yet fall back to their URL
+        # objects. We could also use self.urls.first() here, but this would result in a
         # different query and would render a .prefetch_related('urls') useless
         # The assumption is that we will never have loads of URLS, so
         # fetching all won't hurt
         urls = list(self.urls.all())
         return urls[0].url if urls else None
 
+    def update_canonical_url(self):
+        """Stores the first of the object's URLs as its canonical URL"""
+        url = self.urls.order_by("order").values_list("url", flat=True).first()
+        type(self).objects.filter(pk=self.pk).update(canonical_url=url)
+        self.canonical_url = url
+
+    @transaction.atomic
     def add_missing_urls(self, new_urls):
         """Adds missing URLS from new_urls
 
@@ -465,20 +520,26 @@ class UrlsMixin(models.Model):
         next_order = max([-1] + [u.order for u in existing_urls]) + 1
         existing_urls = [u.url for u in existing_urls]
 
+        had_urls = next_order > 0
+
         for url in new_urls:
             if url in existing_urls:
                 continue
 
             try:
-                URL.objects.create(
-                    url=url, order=next_order, scope=self.scope, content_object=self
-                )
+                with transaction.atomic():
+                    URL.objects.create(
+                        url=url, order=next_order, scope=self.scope, content_object=self
+                    )
                 next_order += 1
             except (IntegrityError, DataError) as ie:
                 err = str(ie)
                 logger.warning("Could not add URL: {0}".format(err))
                 continue
 
+        if not had_urls and next_order > 0:
+            self.update_canonical_url()
+
     def set_url(self, url):
         """Sets the canonical URL"""
 
@@ -489,6 +550,7 @@ class UrlsMixin(models.Model):
         urls.insert(0, url)
         self.set_urls(urls)
 
+    @transaction.atomic
     def set_urls(self, urls):
         """Update the object's URLS to the given list
 
@@ -498,6 +560,7 @@ class UrlsMixin(models.Model):
         urls = [utils.to_maxlength(URL, "url", url) for url in urls]
         existing = {u.url: u for u in self.urls.all()}
         utils.set_ordered_entries(self, urls, existing, URL, "url", "content_object")
+        self.update_canonical_url()
 
 
 class MergedUUID(models.Model):
@@ -584,11 +647,23 @@ class Podcast(
     # search vector for full-text search
     search_vector = SearchVectorField(null=True)
 
+    # HTTP validators (ETag / Last-Modified) of the last feed fetch; they are
+    # sent with the next fetch so that unchanged feeds can be skipped
+    http_etag = models.CharField(max_length=1000, null=True, blank=True)
+    http_last_modified = models.CharField(max_length=50, null=True, blank=True)
+
+    # time of the next scheduled update, see next_update
+    next_update_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
     objects = PodcastManager()
 
     class Meta:
         index_together = [("last_update",)]
 
+    def save(self, *args, **kwargs):
+        self.next_update_at = self.next_update
+        super(Podcast, self).save(*args, **kwargs)
+
     def subscriber_count(self):
         # TODO: implement
         return self.subscribers
@@ -706,6 +781,7 @@ class Podcast(
             return None
 
         interval = timedelta(hours=self.update_interval) * self.update_interval_factor
+        interval = min(interval, timedelta(hours=MAX_UPDATE_INTERVAL))
         return self.last_update + interval
 
 
@@ -719,6 +795,30 @@ class EpisodeQuerySet(MergedUUIDQuerySet):
 
         return toplist.order_by("-listeners")
 
+    def latest_per_podcast(self, podcast_ids, released_after, num):
+        """The latest num episodes of each podcast, released after a date
+
+        All podcasts are handled in one query: a LATERAL join selects the
+        latest episodes of each podcast through the (podcast, order,
+        released) index, instead of querying the podcasts one by one."""
+
+        LATEST = """
+            SELECT e.id
+            FROM unnest(%s::uuid[]) AS p(id)
+            CROSS JOIN LATERAL (
+                SELECT id
+                FROM {table}
+                WHERE podcast_id = p.id AND released > %s
+                ORDER BY "order" DESC, released DESC
+                LIMIT %s
+            ) AS e
+        """.format(
+            table=self.model._meta.db_table
+        )
+
+        params = [list(podcast_ids), released_after, num]
+        return self.filter(id__in=RawSQL(LATEST, params))
+
 
 class EpisodeManager(GenericManager):
     """Custom queries for Episodes"""
@@ -748,7 +848,10 @@ class EpisodeManager(GenericManager):
 
                 with transaction.atomic():
                     episode = Episode.objects.create(
-                        podcast=podcast, id=uuid.uuid1(), **defaults
+                        podcast=podcast,
+                        id=uuid.uuid1(),
+                        canonical_url=url.url,
+                        **defaults,
                     )
 
                     url.content_object = episode
@@ -762,7 +865,7 @@ class EpisodeManager(GenericManager):
             try:
                 with transaction.atomic():
                     episode = Episode.objects.create(
-                        podcast=podcast, id=uuid.uuid1(), **defaults
+                        podcast=podcast, id=uuid.uuid1(), canonical_url=url, **defaults
                     )
 
                     url = URL.objects.create(
@@ -785,6 +888,41 @@ class EpisodeManager(GenericManager):
                 )
                 return GetCreateResult(episode, False)
 
+    def get_or_create_for_urls(self, podcast_urls):
+        """Returns a dict that maps (podcast, url) pairs to their episodes
+
+        podcast_urls is an iterable of (podcast, url) pairs. Existing episodes
+        are looked up with a fixed number of queries; only episodes that do
+        not exist yet are created, using get_or_create_for_url."""
+
+        podcast_urls = {
+            (podcast, url): utils.to_maxlength(URL, "url", url)
+            for podcast, url in podcast_urls
+            if url
+        }
+
+        scopes = {podcast.as_scope for podcast, url in podcast_urls}
+        url_objs = URL.objects.filter(
+            scope__in=scopes, url__in=set(podcast_urls.values())
+        )
+        object_ids = {
+            (scope, url): object_id
+            for scope, url, object_id in url_objs.values_list(
+                "scope", "url", "object_id"
+            )
+        }
+        episodes = self.in_bulk(object_ids.values())
+
+        result = {}
+        for (podcast, url), maxlength_url in podcast_urls.items():
+            object_id = object_ids.get((podcast.as_scope, maxlength_url))
+            episode = episodes.get(object_id)
+            if episode is None:
+                episode = self.get_or_create_for_url(podcast, url).object
+            result[(podcast, url)] = episode
+
+        return result
+
 
 class Episode(
     UUIDModel,
@@ -816,6 +954,10 @@ class Episode(
     podcast = models.ForeignKey(Podcast, on_delete=models.PROTECT)
     listeners = models.PositiveIntegerField(null=True, db_index=True)
 
+    # hash of the feed data from which the episode has last been updated;
+    # updates are skipped if the episode has not changed in the feed
+    feed_hash = models.CharField(max_length=40, null=True, blank=True)
+
     objects = EpisodeManager()
 
     class Meta:
@@ -895,3 +1037,23 @@ class Tag(models.Model):
             # a tag can only be assigned once from one source to one item
             ("tag", "source", "user", "content_type", "object_id"),
         )
+
+
+class PodcastLogo(models.Model):
+    """The downloaded logo of a logo URL
+
+    Logos are stored under the hash of their contents, so that podcasts with
+    the same artwork share one file (see mygpo.web.logo)."""
+
+    # sha1 of the URL, as used in the URLs of thumbnails
+    url_hash = models.CharField(max_length=40, unique=True)
+    url = models.URLField(max_length=1000)
+
+    # sha1 of the downloaded file
+    content_hash = models.CharField(max_length=40)
+
+    # validators to be sent with the next download
+    http_etag = models.CharField(max_length=1000, null=True, blank=True)
+    http_last_modified = models.CharField(max_length=50, null=True, blank=True)
+
+    modified = models.DateTimeField(auto_now=True)
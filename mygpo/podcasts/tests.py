@@ -1,7 +1,9 @@
+import io
 import unittest
 import uuid
 from datetime import datetime, timedelta
 
+from django.core.management import call_command
 from django.test import TestCase
 
 from mygpo.podcasts.models import Podcast, Episode
@@ -59,6 +61,35 @@ class PodcastTests(unittest.TestCase):
         self.assertEqual(real_count, NUM_EPISODES)
 
 
+class LatestEpisodesTests(TestCase):
+    """Test selecting the latest episodes of many podcasts"""
+
+    def test_latest_per_podcast(self):
+        since = datetime(2020, 1, 1)
+        podcasts = [create_podcast(), create_podcast(), create_podcast()]
+        for n, podcast in enumerate(podcasts):
+            for m in range(n * 3):
+                Episode.objects.create(
+                    id=uuid.uuid1(),
+                    podcast=podcast,
+                    order=m,
+                    released=since + timedelta(days=m),
+                )
+
+        episodes = Episode.objects.all().latest_per_podcast(
+            [p.id for p in podcasts[1:]], since, 2
+        )
+
+        # the same episodes as when querying the podcasts one by one
+        expected = []
+        for podcast in podcasts[1:]:
+            eps = Episode.objects.filter(podcast=podcast, released__gt=since)
+            expected.extend(eps[:2])
+
+        self.assertEqual(sorted(e.id for e in episodes), sorted(e.id for e in expected))
+        self.assertEqual(len(expected), 4)
+
+
 class PodcastGroupTests(unittest.TestCase):
     """Test grouping of podcasts"""
 
@@ -102,22 +133,66 @@ class SlugTests(TestCase):
         # alert when something changes
         podcast = create_podcast()
 
-        with self.assertNumQueries(8):
+        with self.assertNumQueries(11):
             # set the canonical slug
             podcast.set_slug("podcast-1")
             self.assertEqual(podcast.slug, "podcast-1")
 
-        with self.assertNumQueries(9):
+        with self.assertNumQueries(12):
             # set a new list of slugs
             podcast.set_slugs(["podcast-2", "podcast-1"])
             self.assertEqual(podcast.slug, "podcast-2")
 
-        with self.assertNumQueries(2):
+        with self.assertNumQueries(5):
             # remove the canonical slug
             podcast.remove_slug("podcast-2")
             self.assertEqual(podcast.slug, "podcast-1")
 
-        with self.assertNumQueries(3):
+        with self.assertNumQueries(4):
             # add a non-canonical slug
             podcast.add_slug("podcast-3")
             self.assertEqual(podcast.slug, "podcast-1")
+
+
+class CanonicalUrlTests(TestCase):
+    """Test the stored canonical URLs and slugs"""
+
+    def test_canonical_url(self):
+        podcast = Podcast.objects.get_or_create_for_url(
+            "http://example.com/canonical.rss"
+        ).object
+
+        podcast = Podcast.objects.get(pk=podcast.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(podcast.url, "http://example.com/canonical.rss")
+
+        podcast.set_url("http://example.com/new.rss")
+        podcast = Podcast.objects.get(pk=podcast.pk)
+        self.assertEqual(podcast.canonical_url, "http://example.com/new.rss")
+
+        podcast.set_slugs(["canonical-2", "canonical-1"])
+        podcast.remove_slug("canonical-2")
+        podcast = Podcast.objects.get(pk=podcast.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(podcast.slug, "canonical-1")
+
+    def test_backfill(self):
+        """Objects without canonical values are updated by the command"""
+        podcast = create_podcast()
+        episode = Episode.objects.create(id=uuid.uuid1(), podcast=podcast)
+
+        # URLs and slugs that are created directly are not copied
+        podcast.urls.create(url="http://example.com/backfill.rss", order=0)
+        podcast.slugs.create(slug="backfill", order=0)
+        episode.urls.create(url="http://example.com/backfill.mp3", order=0)
+        self.assertEqual(podcast.url, "http://example.com/backfill.rss")
+
+        call_command("update-canonical-urls", stdout=io.StringIO())
+
+        podcast = Podcast.objects.get(pk=podcast.pk)
+        self.assertEqual(podcast.canonical_url, "http://example.com/backfill.rss")
+        self.assertEqual(podcast.canonical_slug, "backfill")
+
+        episode = Episode.objects.get(pk=episode.pk)
+        self.assertEqual(episode.canonical_url, "http://example.com/backfill.mp3")
+        self.assertIsNone(episode.canonical_slug)
@@ -8,7 +8,7 @@ class HubSubscriptionAdmin(admin.ModelAdmin):
     """Admin page for pubsubhubbub subscriptions"""
 
     # configuration for the list view
-    list_display = ("podcast", "hub_url", "mode", "verified")
+    list_display = ("podcast", "hub_url", "mode", "verified", "lease_expires")
 
     # fetch the related objects for the fields in list_display
     list_select_related = ("podcast",)
@@ -0,0 +1,35 @@
+from django.db import migrations
+
+
+def forward(apps, schema_editor):
+    """Schedules the renewal of hub subscriptions before their leases expire"""
+    IntervalSchedule = apps.get_model("django_celery_beat", "IntervalSchedule")
+    PeriodicTask = apps.get_model("django_celery_beat", "PeriodicTask")
+
+    schedule = IntervalSchedule.objects.filter(every=6, period="hours").first()
+    if schedule is None:
+        schedule = IntervalSchedule.objects.create(every=6, period="hours")
+
+    # an existing entry might have been changed in the admin
+    PeriodicTask.objects.get_or_create(
+        name="renew-hub-subscriptions",
+        defaults={
+            "task": "mygpo.pubsub.tasks.renew_subscriptions",
+            "interval": schedule,
+        },
+    )
+
+
+def backward(apps, schema_editor):
+    PeriodicTask = apps.get_model("django_celery_beat", "PeriodicTask")
+    PeriodicTask.objects.filter(name="renew-hub-subscriptions").delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pubsub", "0003_hubsubscription_lease_expires"),
+        ("django_celery_beat", "0016_alter_crontabschedule_timezone"),
+    ]
+
+    operations = [migrations.RunPython(code=forward, reverse_code=backward)]
@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from django.db import models
 
 from mygpo.podcasts.models import Podcast
@@ -39,3 +41,17 @@ class HubSubscription(UpdateInfoModel):
 
     # indicates whether the last mode change has already been verified
     verified = models.BooleanField(default=False)
+
+    # when the subscription expires at the hub, if it has been verified with
+    # a lease; it has to be renewed before (see renew_subscriptions)
+    lease_expires = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    @property
+    def active(self):
+        """Whether the hub currently sends notifications for the topic"""
+        return (
+            self.mode == self.SUBSCRIBE
+            and self.verified
+            and self.lease_expires is not None
+            and self.lease_expires > datetime.utcnow()
+        )
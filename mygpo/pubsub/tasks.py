@@ -0,0 +1,18 @@
+from datetime import timedelta
+
+from celery import shared_task
+from django_db_geventpool.utils import close_connection
+
+from mygpo.pubsub import utils
+
+from celery.utils.log import get_task_logger
+
+logger = get_task_logger(__name__)
+
+
+@shared_task(run_every=timedelta(hours=6))
+@close_connection
+def renew_subscriptions():
+    """Renews the hub subscriptions whose leases are about to expire"""
+    renewed = utils.renew_subscriptions()
+    logger.info("Renewed %d hub subscriptions", renewed)
@@ -0,0 +1,91 @@
+import uuid
+from datetime import datetime, timedelta
+from unittest import mock
+
+import responses
+
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+
+from mygpo.podcasts.models import Podcast
+from mygpo.pubsub.models import HubSubscription
+from mygpo.pubsub.utils import renew_subscriptions
+
+
+class HubSubscriptionTests(TestCase):
+    """Test PubSubHubbub subscriptions"""
+
+    HUB_URL = "http://hub.example.com/"
+
+    def setUp(self):
+        self.podcast = Podcast.objects.create(id=uuid.uuid1(), title="Pushed")
+        self.topic = "http://example.com/{}.rss".format(uuid.uuid1().hex)
+        self.subscription = HubSubscription.objects.create(
+            podcast=self.podcast,
+            topic_url=self.topic,
+            hub_url=self.HUB_URL,
+            verify_token="token",
+            mode=HubSubscription.SUBSCRIBE,
+        )
+        self.client = Client()
+        self.url = reverse("pubsub-subscribe")
+
+    def test_verify_lease(self):
+        response = self.client.get(
+            self.url,
+            {
+                "hub.mode": "subscribe",
+                "hub.topic": self.topic,
+                "hub.challenge": "challenge",
+                "hub.lease_seconds": "86400",
+                "hub.verify_token": "token",
+            },
+        )
+        self.assertEqual(b"challenge", response.content)
+
+        self.subscription.refresh_from_db()
+        self.assertTrue(self.subscription.active)
+        self.assertAlmostEqual(
+            datetime.utcnow() + timedelta(days=1),
+            self.subscription.lease_expires,
+            delta=timedelta(minutes=1),
+        )
+
+    def test_notifications_coalesced(self):
+        self.subscription.verified = True
+        self.subscription.save()
+
+        with mock.patch("mygpo.data.tasks.update_podcasts.apply_async") as update:
+            for n in range(3):
+                response = self.client.post(
+                    "{}?url={}".format(self.url, self.topic), content_type="text/xml"
+                )
+                self.assertEqual(200, response.status_code)
+
+        update.assert_called_once()
+        self.assertEqual([[self.topic]], update.call_args[0][0])
+
+    @override_settings(DEFAULT_BASE_URL="http://mygpo.example.com")
+    def test_renew_subscriptions(self):
+        now = datetime.utcnow()
+        self.subscription.verified = True
+        self.subscription.lease_expires = now + timedelta(hours=2)
+        self.subscription.save()
+
+        # not expiring soon
+        HubSubscription.objects.create(
+            podcast=self.podcast,
+            topic_url=self.topic + "?other",
+            hub_url=self.HUB_URL,
+            verify_token="token",
+            mode=HubSubscription.SUBSCRIBE,
+            verified=True,
+            lease_expires=now + timedelta(days=5),
+        )
+
+        with responses.RequestsMock() as rsps:
+            rsps.add(responses.POST, self.HUB_URL, status=202)
+            self.assertEqual(1, renew_subscriptions())
+
+            self.assertEqual(1, len(rsps.calls))
+            self.assertIn("hub.mode=subscribe", rsps.calls[0].request.body)
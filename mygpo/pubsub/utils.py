@@ -4,20 +4,32 @@
 #
 #
 
-import urllib.request, urllib.parse, urllib.error
-import urllib.request, urllib.error, urllib.parse
+import urllib.parse
 import logging
+from datetime import datetime, timedelta
 
+import requests
+
+from django.conf import settings
 from django.urls import reverse
 
-from mygpo.utils import random_token
+from mygpo.utils import random_token, get_http_session
 from mygpo.pubsub.models import HubSubscription, SubscriptionError
 
 logger = logging.getLogger(__name__)
 
 
-def subscribe(podcast, feedurl, huburl, base_url, mode="subscribe"):
-    """Subscribe to the feed at a Hub"""
+# subscriptions are renewed when their lease expires within this time
+RENEW_BEFORE = timedelta(days=1)
+
+# maximum number of subscriptions that are renewed per run
+MAX_RENEWALS = 500
+
+
+def subscribe(podcast, feedurl, huburl, base_url, mode="subscribe", renew=False):
+    """Subscribe to the feed at a Hub
+
+    An existing, verified subscription is only sent again if renew is set."""
 
     logger.info("subscribing for {feed} at {hub}".format(feed=feedurl, hub=huburl))
     verify = "sync"
@@ -33,7 +45,7 @@ def subscribe(podcast, feedurl, huburl, base_url, mode="subscribe"):
     )
 
     if subscription.mode == mode:
-        if subscription.verified:
+        if subscription.verified and not renew:
             logger.info("subscription already exists")
             return
 
@@ -45,6 +57,7 @@ def subscribe(podcast, feedurl, huburl, base_url, mode="subscribe"):
         )
 
     subscription.topic_url = feedurl
+    subscription.hub_url = huburl
     subscription.mode = mode
     subscription.save()
 
@@ -56,33 +69,64 @@ def subscribe(podcast, feedurl, huburl, base_url, mode="subscribe"):
         "hub.verify_token": subscription.verify_token,
     }
 
-    data = urllib.parse.urlencode(list(data.items()))
     logger.debug("sending request: %s" % repr(data))
 
-    resp = None
-
     try:
-        resp = urllib.request.urlopen(huburl, data)
+        session = get_http_session()
+        resp = session.post(huburl, data=data, timeout=30)
 
-    except urllib.error.HTTPError as e:
-        if e.code != 204:  # we actually expect a 204 return code
-            msg = "Could not send subscription to Hub: HTTP Error %d: %s" % (
-                e.code,
-                e.reason,
-            )
-            logger.warning(msg)
-            raise SubscriptionError(msg)
-
-    except Exception as e:
+    except requests.exceptions.RequestException as e:
         msg = "Could not send subscription to Hub: %s" % repr(e)
         logger.warning(msg)
         raise SubscriptionError(msg)
 
-    if resp:
-        status = resp.code
-        if status != 204:
-            logger.warning("received incorrect status %d" % status)
-            raise SubscriptionError("Subscription has not been accepted by " "the Hub")
+    # 204 if the subscription has been verified, 202 if it is verified later
+    if resp.status_code not in (202, 204):
+        msg = "Could not send subscription to Hub: HTTP Error %d: %s" % (
+            resp.status_code,
+            resp.reason,
+        )
+        logger.warning(msg)
+        raise SubscriptionError(msg)
+
+
+def renew_subscriptions(max_renewals=MAX_RENEWALS):
+    """Renews the hub subscriptions whose leases are about to expire
+
+    The subscriptions are renewed hub by hub, so that connections to a hub
+    can be re-used. Returns the number of renewed subscriptions."""
+
+    if not settings.DEFAULT_BASE_URL:
+        logger.warning("Not renewing hub subscriptions, DEFAULT_BASE_URL is not set")
+        return 0
+
+    expiring = (
+        HubSubscription.objects.filter(
+            mode=HubSubscription.SUBSCRIBE,
+            verified=True,
+            lease_expires__lt=datetime.utcnow() + RENEW_BEFORE,
+        )
+        .exclude(hub_url="")
+        .order_by("lease_expires")
+        .select_related("podcast")[:max_renewals]
+    )
+
+    renewed = 0
+    for subscription in sorted(expiring, key=lambda s: s.hub_url):
+        try:
+            subscribe(
+                subscription.podcast,
+                subscription.topic_url,
+                subscription.hub_url,
+                settings.DEFAULT_BASE_URL,
+                renew=True,
+            )
+            renewed += 1
+
+        except SubscriptionError as se:
+            logger.warning("renewing %s failed: %s", subscription.topic_url, se)
+
+    return renewed
 
 
 def callback_url(feedurl, base_url):
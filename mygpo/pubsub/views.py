@@ -5,6 +5,7 @@
 #
 
 import logging
+from datetime import datetime, timedelta
 
 from django.http import HttpResponseNotFound, HttpResponse
 from django.views import View
@@ -67,6 +68,7 @@ class SubscribeView(View):
             return HttpResponseNotFound()
 
         subscription.verified = True
+        subscription.lease_expires = get_lease_expires(mode, lease_seconds)
         subscription.save()
 
         logger.info("subscription confirmed")
@@ -101,3 +103,23 @@ class SubscribeView(View):
         subscription_updated.send(sender=feed_url)
 
         return HttpResponse(status=200)
+
+
+def get_lease_expires(mode, lease_seconds):
+    """Returns when a verified subscription expires
+
+    >>> get_lease_expires("subscribe", None) is None
+    True
+    >>> get_lease_expires("unsubscribe", "3600") is None
+    True
+    """
+    if mode != HubSubscription.SUBSCRIBE or not lease_seconds:
+        return None
+
+    try:
+        lease_seconds = int(lease_seconds)
+    except ValueError:
+        logger.warning("invalid lease_seconds: %s", lease_seconds)
+        return None
+
+    return datetime.utcnow() + timedelta(seconds=lease_seconds)
@@ -0,0 +1,247 @@
+""" In-memory prefix index of podcast titles for autocompletion
+
+Each process keeps its own index. It is built when a web worker starts (see
+warm_index) or on first use, and updated with the podcasts that have been
+modified since, whenever the search index or the subscriber counts have been
+updated (see update_search_index and update_subscriber_counts). """
+
+import bisect
+import heapq
+import threading
+
+from django.core.cache import cache
+from django.db import connection
+
+from mygpo.podcasts.models import Podcast
+from mygpo.search.index import GENERATION_KEY, normalize_query
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# only podcasts with at least this many subscribers are indexed
+MIN_SUBSCRIBERS = 1
+
+# a title can be found by the prefixes of its first MAX_WORDS words
+MAX_WORDS = 3
+
+# indexed length of each title
+MAX_KEY_LENGTH = 40
+
+# number of results that are kept for each queried prefix
+MAX_RESULTS = 20
+
+# maximum number of prefixes for which the results are kept
+MAX_CACHED_PREFIXES = 10000
+
+# cache key that is incremented when subscriber counts have changed
+SUBSCRIBERS_KEY = "autocomplete-subscribers-version"
+
+
+class PrefixIndex(object):
+    """Podcast titles, sorted for prefix lookups
+
+    >>> index = PrefixIndex()
+    >>> index.update([(1, "The Daily Show", 5), (2, "Daily Tech News", 10)])
+    >>> index.search("dai")
+    [2, 1]
+    >>> index.search("the d")
+    [1]
+    """
+
+    def __init__(self):
+        # sorted list of (key, -subscribers, podcast id)
+        self._entries = []
+
+        # podcast id -> its entries
+        self._podcasts = {}
+
+        # prefix -> ids of the MAX_RESULTS most subscribed matching podcasts
+        self._results = {}
+
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._podcasts)
+
+    def update(self, podcasts):
+        """Adds or updates (podcast id, title, subscribers) tuples"""
+        with self._lock:
+            new_entries = []
+            for podcast_id, title, subscribers in podcasts:
+                self._remove(podcast_id)
+
+                if not title or subscribers < MIN_SUBSCRIBERS:
+                    continue
+
+                entries = [
+                    (key, -subscribers, podcast_id) for key in _title_keys(title)
+                ]
+                self._podcasts[podcast_id] = entries
+                new_entries.extend(entries)
+
+            # sorting once is faster than inserting many entries one by one
+            if len(new_entries) > len(self._entries) // 10:
+                self._entries.extend(new_entries)
+                self._entries.sort()
+                self._results.clear()
+
+            else:
+                for entry in new_entries:
+                    bisect.insort(self._entries, entry)
+                    self._invalidate(entry[0])
+
+    def remove(self, podcast_id):
+        """Removes a podcast from the index"""
+        with self._lock:
+            self._remove(podcast_id)
+
+    def _remove(self, podcast_id):
+        for entry in self._podcasts.pop(podcast_id, []):
+            n = bisect.bisect_left(self._entries, entry)
+            if n < len(self._entries) and self._entries[n] == entry:
+                del self._entries[n]
+                self._invalidate(entry[0])
+
+    def _invalidate(self, key):
+        """Drops the kept results of all prefixes of key"""
+        for n in range(1, len(key) + 1):
+            self._results.pop(key[:n], None)
+
+    def search(self, prefix, num=10):
+        """Returns the ids of the most subscribed podcasts matching prefix"""
+        prefix = normalize_query(prefix)[:MAX_KEY_LENGTH]
+        if not prefix:
+            return []
+
+        with self._lock:
+            if num > MAX_RESULTS:
+                return self._rank(prefix, num)
+
+            results = self._results.get(prefix)
+            if results is None:
+                results = self._rank(prefix, MAX_RESULTS)
+
+                if len(self._results) >= MAX_CACHED_PREFIXES:
+                    self._results.clear()
+                self._results[prefix] = results
+
+            return results[:num]
+
+    def _rank(self, prefix, num):
+        """Ranks all podcasts matching prefix by their subscribers"""
+        start = bisect.bisect_left(self._entries, (prefix,))
+        matches = []
+        for n in range(start, len(self._entries)):
+            key, neg_subscribers, podcast_id = self._entries[n]
+            if not key.startswith(prefix):
+                break
+            matches.append((neg_subscribers, podcast_id))
+
+        # a podcast matches with at most MAX_WORDS entries
+        results = []
+        for neg_subscribers, podcast_id in heapq.nsmallest(num * MAX_WORDS, matches):
+            if podcast_id not in results:
+                results.append(podcast_id)
+
+            if len(results) == num:
+                break
+
+        return results
+
+
+def _title_keys(title):
+    """The keys under which a title is indexed
+
+    >>> _title_keys("The  Daily Show")
+    ['the daily show', 'daily show', 'show']
+    """
+    words = normalize_query(title).split()
+    num_keys = min(len(words), MAX_WORDS)
+    return [" ".join(words[n:])[:MAX_KEY_LENGTH] for n in range(num_keys)]
+
+
+_lock = threading.Lock()
+_state = {"index": PrefixIndex(), "version": None, "modified": None}
+
+
+def autocomplete(prefix, num=10):
+    """Returns the ids of the most subscribed podcasts with a matching title"""
+    # while the index is being updated, the current one is used
+    _sync_index(wait=False)
+    return _state["index"].search(prefix, num)
+
+
+def warm_index():
+    """Builds the index of this process in the background"""
+    thread = threading.Thread(target=_warm_index, name="autocomplete", daemon=True)
+    thread.start()
+    return thread
+
+
+def _warm_index():
+    try:
+        _sync_index()
+    finally:
+        # the thread has its own database connection
+        connection.close()
+
+
+def subscribers_changed():
+    """Lets the indexes of all processes pick up new subscriber counts"""
+    try:
+        cache.incr(SUBSCRIBERS_KEY)
+    except ValueError:
+        # the key does not exist (yet)
+        cache.set(SUBSCRIBERS_KEY, 1, None)
+
+
+def _sync_index(wait=True):
+    """Brings the index of this process up to date"""
+    version = (cache.get(GENERATION_KEY, 0), cache.get(SUBSCRIBERS_KEY, 0))
+
+    if version == _state["version"]:
+        return
+
+    if not _lock.acquire(blocking=wait):
+        return
+
+    try:
+        if version == _state["version"]:
+            return
+
+        podcasts = Podcast.objects.order_by()
+        if _state["modified"] is not None:
+            podcasts = podcasts.filter(modified__gte=_state["modified"])
+        else:
+            podcasts = podcasts.filter(subscribers__gte=MIN_SUBSCRIBERS)
+
+        values = podcasts.values_list("id", "title", "subscribers", "modified")
+
+        changed = []
+        modified = _state["modified"]
+        for podcast_id, title, subscribers, podcast_modified in values.iterator():
+            changed.append((podcast_id, title, subscribers))
+            modified = max(podcast_modified, modified or podcast_modified)
+
+        if _state["modified"] is None:
+            # a new index is built without blocking searches on the current one
+            index = PrefixIndex()
+            index.update(changed)
+            _state["index"] = index
+
+        else:
+            _state["index"].update(changed)
+
+        _state["modified"] = modified
+        _state["version"] = version
+
+        logger.info(
+            "Updated autocomplete index with %d podcasts, %d indexed",
+            len(changed),
+            len(_state["index"]),
+        )
+
+    finally:
+        _lock.release()
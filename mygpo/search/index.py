@@ -3,12 +3,18 @@
 Uses django.contrib.postgres.search for searching. See docs at
 https://docs.djangoproject.com/en/1.11/ref/contrib/postgres/search/
 
+The ids of the results are cached per normalized query. The cached results
+are invalidated whenever the search index is updated.
 """
 
+import hashlib
+import unicodedata
+
 from django.conf import settings
 
 from mygpo.podcasts.models import Podcast
 
+from django.core.cache import cache
 from django.db.models import F, FloatField, ExpressionWrapper
 from django.contrib.postgres.search import SearchQuery, SearchRank
 from django.conf import settings
@@ -20,6 +26,12 @@ logger = logging.getLogger(__name__)
 
 SEARCH_CUTOFF = settings.SEARCH_CUTOFF
 
+# maximum number of results for a query
+MAX_RESULTS = 100
+
+# cache key of the current generation of the search index
+GENERATION_KEY = "search-index-generation"
+
 
 def search_podcasts(query):
     """Search for podcasts according to 'query'"""
@@ -27,21 +39,17 @@ def search_podcasts(query):
         logger.debug('Found no podcasts for "{query}". Query is too short', query=query)
         return Podcast.objects.none()
 
-    logger.debug('Searching for "{query}" podcasts"', query=query)
+    query = normalize_query(query)
+    key = _cache_key(query)
+    podcast_ids = cache.get(key)
 
-    query = SearchQuery(query)
+    if podcast_ids is None:
+        podcast_ids = _search_podcast_ids(query)
+        cache.set(key, podcast_ids, settings.SEARCH_CACHE_TIMEOUT)
 
-    results = (
-        Podcast.objects.annotate(rank=SearchRank(F("search_vector"), query))
-        .annotate(
-            order=ExpressionWrapper(
-                F("rank") * F("subscribers"), output_field=FloatField()
-            )
-        )
-        .filter(rank__gte=SEARCH_CUTOFF)
-        .order_by("-order")[:100]
-        .prefetch_related("slugs")
-    )
+    podcasts = Podcast.objects.filter(id__in=podcast_ids).prefetch_related("slugs")
+    podcasts = {podcast.id: podcast for podcast in podcasts}
+    results = [podcasts[pid] for pid in podcast_ids if pid in podcasts]
 
     logger.debug(
         'Found {count} podcasts for "{query}"', count=len(results), query=query
@@ -50,5 +58,48 @@ def search_podcasts(query):
     return results
 
 
+def _search_podcast_ids(query):
+    """Returns the ids of the best matching podcasts"""
+
+    logger.debug('Searching for "{query}" podcasts"', query=query)
+
+    query = SearchQuery(query)
+
+    results = Podcast.objects.annotate(
+        rank=SearchRank(F("search_vector"), query)
+    ).annotate(
+        order=ExpressionWrapper(F("rank") * F("subscribers"), output_field=FloatField())
+    )
+
+    results = results.filter(rank__gte=SEARCH_CUTOFF).order_by("-order")
+
+    return list(results.values_list("id", flat=True)[:MAX_RESULTS])
+
+
+def normalize_query(query):
+    """Normalizes a search query so that equivalent queries share results
+
+    >>> normalize_query("  The   Tricky\\tPODCAST ")
+    'the tricky podcast'
+    """
+    query = unicodedata.normalize("NFKC", query)
+    return " ".join(query.lower().split())
+
+
+def invalidate_search_results():
+    """Invalidates all cached search results"""
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        # the key does not exist (yet)
+        cache.set(GENERATION_KEY, 1, None)
+
+
+def _cache_key(query):
+    generation = cache.get(GENERATION_KEY, 0)
+    digest = hashlib.md5(query.encode("utf-8")).hexdigest()
+    return "search-{generation}-{digest}".format(generation=generation, digest=digest)
+
+
 def is_query_too_short(query):
     return len(query.replace(" ", "")) <= settings.QUERY_LENGTH_CUTOFF
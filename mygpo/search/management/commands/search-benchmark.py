@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from mygpo.search.index import search_podcasts, invalidate_search_results
+
+
+class Command(BaseCommand):
+    """Compares the latency of cold and warm (cached) podcast searches"""
+
+    def add_arguments(self, parser):
+        parser.add_argument("queries", nargs="+", help="Search queries")
+
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            dest="repeat",
+            default=10,
+            help="Number of warm searches per query",
+        )
+
+    def handle(self, *args, **options):
+        repeat = options["repeat"]
+
+        for query in options["queries"]:
+            # start without cached results
+            invalidate_search_results()
+            cold = self._measure(query)
+
+            warm = min(self._measure(query) for _ in range(repeat))
+
+            self.stdout.write(
+                "{query!r}: cold {cold:.1f} ms, warm {warm:.1f} ms".format(
+                    query=query, cold=cold * 1000, warm=warm * 1000
+                )
+            )
+
+    def _measure(self, query):
+        start = time.perf_counter()
+        list(search_podcasts(query))
+        return time.perf_counter() - start
@@ -1,16 +1,21 @@
 import functools
 import operator
-from datetime import timedelta
+import time
+from datetime import datetime, timedelta
 
 from celery import shared_task
 from django_db_geventpool.utils import close_connection
 
+from django.core.cache import cache
 from django.db import transaction
+from django.db.models import F, Q, TextField
+from django.db.models.functions import Cast
 from django.contrib.postgres.search import SearchVector
 
 from mygpo.podcasts.models import Podcast
 
 from . import INDEX_FIELDS
+from .index import invalidate_search_results
 
 from celery.utils.log import get_task_logger
 
@@ -20,36 +25,118 @@ logger = get_task_logger(__name__)
 # interval in which podcast updates are scheduled
 UPDATE_INTERVAL = timedelta(hours=1)
 
-# Maximum number of podcasts to update in one job run
-MAX_INDEX = 1000
+# Number of podcasts that are indexed in one statement
+CHUNK_SIZE = 500
+
+# Maximum number of chunks to index in one job run; if more podcasts are
+# outdated, another run is scheduled right away
+MAX_CHUNKS = 20
+
+# cache key for the indexing statistics of the last run
+INDEX_STATS_KEY = "search-index-stats"
 
 
 @shared_task(run_every=UPDATE_INTERVAL)
 @close_connection
-def update_search_index(run_every=UPDATE_INTERVAL):
-    """Schedules podcast updates that are due within ``interval``"""
+def update_search_index(chunk_size=CHUNK_SIZE, max_chunks=MAX_CHUNKS):
+    """Updates the search index of outdated podcasts
+
+    Podcasts are indexed in chunks until either no outdated podcasts are
+    left, or ``max_chunks`` chunks have been indexed. In the latter case the
+    task schedules itself to continue with the remaining podcasts."""
 
     logger.info("Updating search index")
 
-    # We avoid an UPDATE, because it cannot be LIMITed, the thus might
-    # be to expensive in a single statement.
-    # We could use select_for_update(), but there is no need for consistency
-    # between multiple podcasts.
-    to_update = Podcast.objects.filter(search_index_uptodate=False).only("pk")[
-        :MAX_INDEX
-    ]
+    start = time.monotonic()
+    vectors = _get_search_vectors()
+
+    indexed = 0
+    changed = 0
+    for _ in range(max_chunks):
+        num, num_changed = _update_chunk(vectors, chunk_size)
+        indexed += num
+        changed += num_changed
+
+        if num < chunk_size:
+            break
+
+    duration = time.monotonic() - start
+    backlog = get_index_backlog()
+
+    cache.set(
+        INDEX_STATS_KEY,
+        {
+            "timestamp": datetime.utcnow(),
+            "indexed": indexed,
+            "changed": changed,
+            "duration": duration,
+            "rate": indexed / duration if duration else None,
+            "backlog": backlog,
+        },
+        # kept until the next run
+        timeout=None,
+    )
+
+    logger.info(
+        "Indexed {indexed} podcasts in {duration:.1f}s, "
+        "{backlog} remaining".format(
+            indexed=indexed, duration=duration, backlog=backlog
+        )
+    )
+
+    if changed:
+        # the cached search results might be outdated now; otherwise they
+        # expire after SEARCH_CACHE_TIMEOUT
+        invalidate_search_results()
 
-    count = to_update.count()
-    logger.info("Updating search index for {} podcasts".format(count))
+    if indexed and backlog:
+        update_search_index.delay(chunk_size, max_chunks)
 
-    vectors = _get_search_vectors()
 
-    for podcast in to_update:
-        Podcast.objects.filter(pk=podcast.pk).update(
-            search_vector=vectors, search_index_uptodate=True
+def _update_chunk(vectors, chunk_size):
+    """Indexes up to ``chunk_size`` outdated podcasts in one statement
+
+    Returns the number of indexed podcasts, and the number of those whose
+    search vector has changed."""
+
+    with transaction.atomic():
+        # podcasts that are being indexed by another job are skipped
+        to_update = (
+            Podcast.objects.filter(search_index_uptodate=False)
+            .select_for_update(skip_locked=True)
+            .order_by()
+            .values_list("pk", flat=True)[:chunk_size]
         )
+        to_update = list(to_update)
+        chunk = Podcast.objects.filter(pk__in=to_update)
+
+        # search vectors are compared in their (normalized) text form
+        changed = chunk.annotate(
+            old_vector=Cast("search_vector", TextField()),
+            new_vector=Cast(vectors, TextField()),
+        ).filter(Q(search_vector__isnull=True) | ~Q(old_vector=F("new_vector")))
+        num_changed = changed.update(search_vector=vectors, search_index_uptodate=True)
+
+        num_unchanged = chunk.filter(search_index_uptodate=False).update(
+            search_index_uptodate=True
+        )
+
+        return num_changed + num_unchanged, num_changed
+
+
+def get_index_backlog():
+    """Returns the number of podcasts with an outdated search index"""
+    return Podcast.objects.filter(search_index_uptodate=False).count()
+
+
+def get_index_stats():
+    """Returns statistics of the last search index update, or None
 
-    logger.info("Finished indexing podcasts")
+    The dict contains the number of ``indexed`` podcasts, the number of those
+    whose search vector has ``changed``, the ``duration`` in seconds, the
+    indexing ``rate`` in podcasts per second, and the ``backlog`` of outdated
+    podcasts after the run."""
+    return cache.get(INDEX_STATS_KEY)
 
 
 def _get_search_vectors():
@@ -1,12 +1,16 @@
 import uuid
+import unittest
+from unittest.mock import patch
 
 from mygpo.podcasts.models import Podcast
 from django.contrib.postgres.search import SearchVector
+from django.core.cache import cache
 from django.test import TransactionTestCase
 from django.test.utils import override_settings
 
-from .index import search_podcasts
-from .tasks import update_search_index
+from .autocomplete import PrefixIndex
+from .index import GENERATION_KEY, search_podcasts
+from .tasks import update_search_index, get_index_backlog, get_index_stats
 
 
 class SearchTests(TransactionTestCase):
@@ -54,3 +58,99 @@ class SearchTests(TransactionTestCase):
 
         results = search_podcasts("The Tricky")
         self.assertEqual(results[0].id, podcast.id)
+
+    def test_update_search_index_chunks(self):
+        """Outdated podcasts are indexed in chunks until none are left"""
+
+        # index podcasts left behind by other tests
+        update_search_index()
+
+        for n in range(5):
+            Podcast.objects.create(id=uuid.uuid1(), title="Chunked Podcast %d" % n)
+
+        self.assertEqual(get_index_backlog(), 5)
+
+        with patch.object(update_search_index, "delay") as delay:
+            update_search_index(chunk_size=2, max_chunks=2)
+
+        # the remaining podcast is indexed by another run
+        self.assertEqual(get_index_backlog(), 1)
+        delay.assert_called_once_with(2, 2)
+        self.assertEqual(get_index_stats()["indexed"], 4)
+
+        update_search_index(chunk_size=2, max_chunks=2)
+        self.assertEqual(get_index_backlog(), 0)
+        self.assertEqual(len(search_podcasts("chunked")), 5)
+
+    def test_cached_search_results(self):
+        """Search results are cached until the index is updated"""
+
+        podcast = Podcast.objects.create(
+            id=uuid.uuid1(), title="Cached Podcast", subscribers=1
+        )
+        update_search_index()
+
+        self.assertEqual(search_podcasts("Cached Podcast"), [podcast])
+
+        # the ids of the results are served from the cache
+        with self.assertNumQueries(2):
+            self.assertEqual(search_podcasts("  cached   PODCAST"), [podcast])
+
+        other = Podcast.objects.create(
+            id=uuid.uuid1(), title="Another Cached Podcast", subscribers=2
+        )
+        self.assertEqual(search_podcasts("cached podcast"), [podcast])
+
+        # updating the index invalidates the cached results
+        update_search_index()
+        self.assertEqual(search_podcasts("cached podcast"), [other, podcast])
+
+    def test_unchanged_search_vectors(self):
+        """Re-indexing unchanged podcasts keeps the cached search results"""
+
+        podcast = Podcast.objects.create(id=uuid.uuid1(), title="Unchanged Podcast")
+        update_search_index()
+        self.assertEqual(get_index_stats()["changed"], 1)
+
+        generation = cache.get(GENERATION_KEY)
+
+        Podcast.objects.filter(pk=podcast.pk).update(search_index_uptodate=False)
+        update_search_index()
+
+        self.assertEqual(get_index_backlog(), 0)
+        self.assertEqual(get_index_stats()["indexed"], 1)
+        self.assertEqual(get_index_stats()["changed"], 0)
+        self.assertEqual(cache.get(GENERATION_KEY), generation)
+
+        Podcast.objects.filter(pk=podcast.pk).update(
+            title="Changed Podcast", search_index_uptodate=False
+        )
+        update_search_index()
+
+        self.assertEqual(get_index_stats()["changed"], 1)
+        self.assertNotEqual(cache.get(GENERATION_KEY), generation)
+
+
+class PrefixIndexTests(unittest.TestCase):
+    """Tests the ranking of the autocomplete index"""
+
+    def test_rank_all_matches(self):
+        """The most subscribed podcasts are found among many matches"""
+        index = PrefixIndex()
+        index.update(
+            [(n, "Alpha %05d" % n, n % 100 + 1) for n in range(30000)]
+            + [(30000, "Alpha Zulu", 1000)]
+        )
+        self.assertEqual(index.search("a", 2), [30000, 99])
+
+    def test_update_results(self):
+        """The kept results of a prefix are updated with the podcasts"""
+        index = PrefixIndex()
+        index.update([(1, "Daily Show", 5), (2, "Daily News", 10)])
+        self.assertEqual(index.search("da"), [2, 1])
+
+        index.update([(1, "Daily Show", 20)])
+        self.assertEqual(index.search("da"), [1, 2])
+
+        index.remove(2)
+        self.assertEqual(index.search("da"), [1])
@@ -110,6 +110,9 @@ MEDIA_ROOT = os.getenv(
 
 MEDIA_URL = "/media/"
 
+# sizes in which thumbnails of podcast logos are created
+LOGO_SIZES = [int(s) for s in os.getenv("LOGO_SIZES", "32,64,128,256").split(",")]
+
 
 TEMPLATES = [
     {
@@ -377,6 +380,16 @@ SUPPORT_URL = os.getenv("SUPPORT_URL", "")
 
 FEEDSERVICE_URL = os.getenv("FEEDSERVICE_URL", "http://feeds.gpodder.net/")
 
+# number of feeds that are updated concurrently by one feed-downloader run
+# or update_podcasts task
+FEED_UPDATE_WORKERS = int(os.getenv("FEED_UPDATE_WORKERS", 10))
+
+# maximum number of concurrent feed updates for feeds on the same host
+FEED_UPDATE_PER_HOST = int(os.getenv("FEED_UPDATE_PER_HOST", 2))
+
+# maximum number of feed updates that are scheduled per hour
+FEED_UPDATES_PER_HOUR = int(os.getenv("FEED_UPDATES_PER_HOUR", 360))
+
 
 # time for how long an activation is valid; after that, an unactivated user
 # will be deleted
@@ -410,6 +423,9 @@ SEARCH_CUTOFF = float(os.getenv("SEARCH_CUTOFF", 0.3))
 # responses
 QUERY_LENGTH_CUTOFF = int(os.getenv("QUERY_LENGTH_CUTOFF", 3))
 
+# Number of seconds for which search results are cached
+SEARCH_CACHE_TIMEOUT = int(os.getenv("SEARCH_CACHE_TIMEOUT", 60 * 60))
+
 ### Sentry
 
 try:
@@ -1,5 +1,8 @@
 import collections
+from functools import partial
 
+from django.core.cache import cache
+from django.db import transaction
 
 import logging
 
@@ -10,6 +13,10 @@ logger = logging.getLogger(__name__)
 # (non-__init__) module
 
 
+# the cached subscriptions of a user are invalidated whenever they change
+SUBSCRIPTIONS_TIMEOUT = 60 * 60 * 24
+
+
 def get_subscribe_targets(podcast, user):
     """Clients / SyncGroup on which the podcast can be subscribed
 
@@ -39,36 +46,73 @@ def get_subscribed_podcasts(user, only_public=False):
     """Returns all subscribed podcasts for the user
 
     The attribute "url" contains the URL that was used when subscribing to
-    the podcast"""
+    the podcast. The subscriptions are cached, only the podcasts are queried
+    on each call."""
+
+    # django.core.exceptions.AppRegistryNotReady: Apps aren't loaded yet.
+    from mygpo.subscriptions.models import SubscribedPodcast
+    from mygpo.podcasts.models import Podcast
+
+    key = _subscriptions_cache_key(user.pk)
+    subscriptions = cache.get(key)
+
+    if subscriptions is None:
+        subscriptions = _get_subscriptions(user)
+        cache.set(key, subscriptions, SUBSCRIPTIONS_TIMEOUT)
+
+    podcasts = Podcast.objects.in_bulk(
+        [podcast_id for podcast_id, _, _ in subscriptions]
+    )
+
+    # the subscriptions of merged podcasts have been moved to other podcasts
+    if len(podcasts) < len(subscriptions):
+        subscriptions = _get_subscriptions(user)
+        cache.set(key, subscriptions, SUBSCRIPTIONS_TIMEOUT)
+        podcasts = Podcast.objects.in_bulk(
+            [podcast_id for podcast_id, _, _ in subscriptions]
+        )
+
+    return [
+        SubscribedPodcast(podcasts[podcast_id], public, ref_url)
+        for podcast_id, ref_url, public in subscriptions
+        # check if we want to include this podcast
+        if podcast_id in podcasts and (public or not only_public)
+    ]
+
+
+def _get_subscriptions(user):
+    """The (podcast id, ref_url, public) of each podcast the user subscribed"""
 
     # django.core.exceptions.AppRegistryNotReady: Apps aren't loaded yet.
-    from mygpo.subscriptions.models import Subscription, SubscribedPodcast
+    from mygpo.subscriptions.models import Subscription
+    from mygpo.usersettings.models import UserSettings
 
     subscriptions = (
         Subscription.objects.filter(user=user)
         .order_by("podcast")
         .distinct("podcast")
-        .select_related("podcast")
+        .values_list("podcast", "ref_url")
     )
 
-    # django.core.exceptions.AppRegistryNotReady: Apps aren't loaded yet.
-    from mygpo.usersettings.models import UserSettings
+    private = UserSettings.objects.get_private_podcast_ids(user)
 
-    private = UserSettings.objects.get_private_podcasts(user)
+    return [
+        (podcast_id, ref_url, podcast_id not in private)
+        for podcast_id, ref_url in subscriptions
+    ]
 
-    podcasts = []
-    for subscription in subscriptions:
-        podcast = subscription.podcast
-        public = subscription.podcast not in private
 
-        # check if we want to include this podcast
-        if only_public and not public:
-            continue
+def invalidate_subscribed_podcasts(user_id):
+    """Removes the cached subscriptions of the user"""
+    key = _subscriptions_cache_key(user_id)
+    cache.delete(key)
 
-        subpodcast = SubscribedPodcast(podcast, public, subscription.ref_url)
-        podcasts.append(subpodcast)
+    # the subscriptions might be cached again before the change is committed
+    transaction.on_commit(partial(cache.delete, key))
 
-    return podcasts
+
+def _subscriptions_cache_key(user_id):
+    return "subscribed-podcasts-{user_id}".format(user_id=user_id)
 
 
 def get_subscription_history(
@@ -112,6 +156,29 @@ def get_subscription_history(
     return history
 
 
+def get_subscription_changes(user, client, since=None, until=None):
+    """Returns the podcasts that were subscribed / unsubscribed on the client
+
+    Unlike subscription_diff(get_subscription_history(...)) this does not
+    replay the history, but looks up the latest change of each podcast."""
+
+    # django.core.exceptions.AppRegistryNotReady: Apps aren't loaded yet.
+    from mygpo.subscriptions.models import SubscriptionChange
+
+    changes = SubscriptionChange.objects.changed(client, since, until)
+    changes = changes.filter(user=user).order_by("timestamp")
+    changes = changes.select_related("podcast")
+
+    subscribe, unsubscribe = [], []
+    for change in changes:
+        if change.subscribed:
+            subscribe.append(change.podcast)
+        else:
+            unsubscribe.append(change.podcast)
+
+    return subscribe, unsubscribe
+
+
 def get_subscription_change_history(history):
     """Actions that added/removed podcasts from the subscription list
 
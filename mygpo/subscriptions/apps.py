@@ -0,0 +1,56 @@
+from django.apps import AppConfig, apps
+from django.conf import settings
+from django.db.models.signals import post_save, post_delete
+
+from mygpo.subscriptions.signals import subscription_changed, subscriptions_changed
+
+
+def invalidate_on_subscription(sender, **kwargs):
+    """drop the cached subscriptions of a user after they change"""
+    from mygpo.subscriptions import invalidate_subscribed_podcasts
+
+    invalidate_subscribed_podcasts(kwargs["user"].pk)
+
+
+def invalidate_on_instance(sender, **kwargs):
+    """drop the cached subscriptions of the user of a changed instance"""
+    from mygpo.subscriptions import invalidate_subscribed_podcasts
+
+    invalidate_subscribed_podcasts(kwargs["instance"].user_id)
+
+
+class SubscriptionsConfig(AppConfig):
+    name = "mygpo.subscriptions"
+    verbose_name = "Subscriptions"
+
+    def ready(self):
+        Podcast = apps.get_model("podcasts.Podcast")
+        subscription_changed.connect(
+            invalidate_on_subscription,
+            sender=Podcast,
+            dispatch_uid="invalidate_subscriptions-subscription",
+        )
+
+        User = apps.get_model(settings.AUTH_USER_MODEL)
+        subscriptions_changed.connect(
+            invalidate_on_subscription,
+            sender=User,
+            dispatch_uid="invalidate_subscriptions-subscriptions",
+        )
+
+        # subscriptions are also deleted along with their client
+        Subscription = apps.get_model("subscriptions.Subscription")
+        post_delete.connect(
+            invalidate_on_instance,
+            sender=Subscription,
+            dispatch_uid="invalidate_subscriptions-delete",
+        )
+
+        # the subscriptions contain the privacy settings of the podcasts
+        UserSettings = apps.get_model("usersettings.UserSettings")
+        for signal in (post_save, post_delete):
+            signal.connect(
+                invalidate_on_instance,
+                sender=UserSettings,
+                dispatch_uid="invalidate_subscriptions-settings",
+            )
@@ -0,0 +1,80 @@
+from django.db import models, migrations
+import django.db.models.deletion
+from django.conf import settings
+
+
+def forward(apps, schema_editor):
+    """Populates the latest subscription changes from the history"""
+
+    # DISTINCT ON is specific to PostgreSQL
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    schema_editor.execute(
+        "INSERT INTO subscriptions_subscriptionchange "
+        "(user_id, client_id, podcast_id, subscribed, created, timestamp) "
+        "SELECT DISTINCT ON (client_id, podcast_id) "
+        "  user_id, client_id, podcast_id, action = 'subscribe', "
+        "  MIN(timestamp) OVER (PARTITION BY client_id, podcast_id), timestamp "
+        "FROM history_historyentry "
+        "WHERE client_id IS NOT NULL "
+        "  AND action IN ('subscribe', 'unsubscribe') "
+        "ORDER BY client_id, podcast_id, timestamp DESC, id DESC;"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("history", "0011_episodehistory_cursor_index"),
+        ("podcasts", "0047_podcast_http_validators"),
+        ("users", "0016_alter_userprofile_twitter"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("subscriptions", "0004_subscription_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SubscriptionChange",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        verbose_name="ID",
+                        serialize=False,
+                        auto_created=True,
+                        primary_key=True,
+                    ),
+                ),
+                ("subscribed", models.BooleanField()),
+                ("created", models.DateTimeField()),
+                ("timestamp", models.DateTimeField()),
+                (
+                    "client",
+                    models.ForeignKey(
+                        to="users.Client",
+                        on_delete=django.db.models.deletion.CASCADE,
+                    ),
+                ),
+                (
+                    "podcast",
+                    models.ForeignKey(
+                        to="podcasts.Podcast",
+                        on_delete=django.db.models.deletion.CASCADE,
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        to=settings.AUTH_USER_MODEL,
+                        on_delete=django.db.models.deletion.CASCADE,
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("client", "podcast")},
+                "index_together": {("client", "timestamp")},
+            },
+        ),
+        migrations.RunPython(code=forward, reverse_code=migrations.RunPython.noop),
+    ]
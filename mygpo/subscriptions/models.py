@@ -44,6 +44,112 @@ class Subscription(DeleteableModel):
         )
 
 
+class SubscriptionChangeManager(models.Manager):
+    """Manager for the SubscriptionChange model"""
+
+    def log(self, user, client, podcast, subscribed, timestamp):
+        """Records a subscription change of the podcast on the client"""
+        self.log_many(user, [(client, podcast, subscribed)], timestamp)
+
+    def log_many(self, user, changes, timestamp):
+        """Records (client, podcast, subscribed) changes of the user"""
+        changes = {
+            (client.pk, podcast.pk): subscribed
+            for client, podcast, subscribed in changes
+        }
+        if not changes:
+            return
+
+        clients = set(client for client, podcast in changes)
+        podcasts = set(podcast for client, podcast in changes)
+        existing = self.filter(client__in=clients, podcast__in=podcasts)
+
+        updated = []
+        for change in existing:
+            key = (change.client_id, change.podcast_id)
+            if key not in changes:
+                continue
+
+            change.subscribed = changes.pop(key)
+            change.timestamp = timestamp
+            updated.append(change)
+
+        self.bulk_update(updated, ["subscribed", "timestamp"])
+
+        self.bulk_create(
+            [
+                SubscriptionChange(
+                    user=user,
+                    client_id=client,
+                    podcast_id=podcast,
+                    subscribed=subscribed,
+                    created=timestamp,
+                    timestamp=timestamp,
+                )
+                for (client, podcast), subscribed in changes.items()
+            ]
+        )
+
+    def changed(self, client, since=None, until=None):
+        """The latest changes of the client in the interval (since, until]
+
+        Changes that were undone within the interval might be included, as
+        only the latest change of each podcast is known. Unsubscriptions of
+        podcasts that were first subscribed within the interval are
+        excluded."""
+        changes = self.filter(client=client)
+
+        if since:
+            changes = changes.filter(timestamp__gt=since).filter(
+                models.Q(subscribed=True) | models.Q(created__lte=since)
+            )
+        else:
+            changes = changes.filter(subscribed=True)
+
+        if until:
+            changes = changes.filter(timestamp__lte=until)
+
+        return changes
+
+
+class SubscriptionChange(models.Model):
+    """The latest subscription change of a podcast on a client
+
+    This is maintained together with the subscription history, so that the
+    changes of a client since some timestamp can be queried without replaying
+    the client's history."""
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+
+    client = models.ForeignKey(Client, on_delete=models.CASCADE)
+
+    podcast = models.ForeignKey(Podcast, on_delete=models.CASCADE)
+
+    # if the podcast is subscribed after the change
+    subscribed = models.BooleanField()
+
+    # the timestamp of the first change
+    created = models.DateTimeField()
+
+    # the timestamp of the latest change
+    timestamp = models.DateTimeField()
+
+    objects = SubscriptionChangeManager()
+
+    class Meta:
+        unique_together = [["client", "podcast"]]
+
+        index_together = [["client", "timestamp"]]
+
+    def __str__(self):
+        return "{user} {action} {podcast} on {client}".format(
+            user=self.user,
+            action="subscribed to" if self.subscribed else "unsubscribed from",
+            podcast=self.podcast,
+            client=self.client,
+        )
+
+
 SubscribedPodcast = collections.namedtuple(
     "SubscribedPodcast", "podcast public ref_url"
 )
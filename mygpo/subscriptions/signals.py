@@ -4,3 +4,9 @@ import django.dispatch
 # ``sender`` will equal the user. Additionally the parameters ``user`` and
 # ``subscribed`` will be provided
 subscription_changed = django.dispatch.Signal()
+
+# indicates that several subscriptions of a user were changed at once
+# ``sender`` will equal the user's class. Additionally the parameters ``user``,
+# ``subscribed`` and ``unsubscribed`` will be provided, the latter two being
+# lists of (client, podcast) pairs
+subscriptions_changed = django.dispatch.Signal()
@@ -1,11 +1,12 @@
 from datetime import datetime
+from itertools import chain
 
 from django.contrib.auth import get_user_model
 from django.db import transaction
 from celery import shared_task
 
-from mygpo.subscriptions.models import Subscription
-from mygpo.subscriptions.signals import subscription_changed
+from mygpo.subscriptions.models import Subscription, SubscriptionChange
+from mygpo.subscriptions.signals import subscription_changed, subscriptions_changed
 from mygpo.history.models import HistoryEntry
 from mygpo.podcasts.models import Podcast
 from mygpo.utils import to_maxlength
@@ -90,6 +91,124 @@ def unsubscribe_all(podcast_pk, user_pk):
     _fire_events(podcast, user, changed, False)
 
 
+def update_subscriptions(user, client, subscribe, unsubscribe):
+    """subscribes and unsubscribes multiple podcasts on one client
+
+    ``subscribe`` maps podcasts to the URLs used for subscribing,
+    ``unsubscribe`` is a list of podcasts. Takes synced devices into account.
+    The changes are written with a fixed number of queries and a single
+    subscriptions_changed signal is sent for all of them."""
+    now = datetime.utcnow()
+    clients = list(_affected_clients(client))
+
+    # fully execute the changes, before firing events
+    subscribed, unsubscribed = _perform_bulk_update(
+        user, clients, subscribe, unsubscribe, now
+    )
+
+    if subscribed or unsubscribed:
+        subscriptions_changed.send(
+            sender=user.__class__,
+            user=user,
+            subscribed=subscribed,
+            unsubscribed=unsubscribed,
+        )
+
+    return subscribed, unsubscribed
+
+
+@transaction.atomic
+def _perform_bulk_update(user, clients, subscribe, unsubscribe, timestamp):
+    """Subscribes and unsubscribes podcasts on multiple clients
+
+    Returns the (client, podcast) pairs for which a subscription was added
+    and removed, respectively."""
+
+    unsubscribe = [podcast for podcast in unsubscribe if podcast not in subscribe]
+    podcasts = {podcast.pk: podcast for podcast in chain(subscribe, unsubscribe)}
+    if not podcasts:
+        return [], []
+
+    existing = Subscription.objects.filter(
+        user=user, client__in=clients, podcast__in=podcasts.keys()
+    )
+    existing = dict(
+        ((client_id, podcast_id), pk)
+        for pk, client_id, podcast_id in existing.values_list(
+            "pk", "client_id", "podcast_id"
+        )
+    )
+
+    subscribed = [
+        (client, podcast)
+        for podcast in subscribe
+        for client in clients
+        if (client.pk, podcast.pk) not in existing
+    ]
+
+    Subscription.objects.bulk_create(
+        [
+            Subscription(
+                user=user,
+                client=client,
+                podcast=podcast,
+                ref_url=to_maxlength(
+                    Subscription, "ref_url", subscribe[podcast] or podcast.url
+                ),
+                created=timestamp,
+                modified=timestamp,
+            )
+            for client, podcast in subscribed
+        ]
+    )
+
+    unsubscribed = [
+        (client, podcast)
+        for podcast in unsubscribe
+        for client in clients
+        if (client.pk, podcast.pk) in existing
+    ]
+
+    Subscription.objects.filter(
+        pk__in=[existing[(c.pk, p.pk)] for c, p in unsubscribed]
+    ).delete()
+
+    HistoryEntry.objects.bulk_create(
+        [
+            HistoryEntry(
+                timestamp=timestamp,
+                podcast=podcast,
+                user=user,
+                client=client,
+                action=action,
+            )
+            for pairs, action in (
+                (subscribed, HistoryEntry.SUBSCRIBE),
+                (unsubscribed, HistoryEntry.UNSUBSCRIBE),
+            )
+            for client, podcast in pairs
+        ]
+    )
+
+    SubscriptionChange.objects.log_many(
+        user,
+        [(client, podcast, True) for client, podcast in subscribed]
+        + [(client, podcast, False) for client, podcast in unsubscribed],
+        timestamp,
+    )
+
+    logger.info(
+        "{user} subscribed to {num_subscribed} and unsubscribed from "
+        "{num_unsubscribed} podcasts".format(
+            user=user,
+            num_subscribed=len(subscribed),
+            num_unsubscribed=len(unsubscribed),
+        )
+    )
+
+    return subscribed, unsubscribed
+
+
 @transaction.atomic
 def _perform_subscribe(podcast, user, clients, timestamp, ref_url):
     """Subscribes to a podcast on multiple clients
@@ -126,6 +245,8 @@ def _perform_subscribe(podcast, user, clients, timestamp, ref_url):
             action=HistoryEntry.SUBSCRIBE,
         )
 
+        SubscriptionChange.objects.log(user, client, podcast, True, timestamp)
+
         yield client
 
 
@@ -161,6 +282,8 @@ def _perform_unsubscribe(podcast, user, clients, timestamp):
             action=HistoryEntry.UNSUBSCRIBE,
         )
 
+        SubscriptionChange.objects.log(user, client, podcast, False, timestamp)
+
         yield client
 
 
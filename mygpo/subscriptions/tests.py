@@ -7,6 +7,7 @@ from django.test import TestCase
 
 from mygpo.users.models import Client
 from mygpo.podcasts.models import Podcast
+from mygpo.history.models import HistoryEntry
 from . import models
 
 
@@ -51,3 +52,180 @@ class TestSubscribe(TestCase):
         self.podcast.delete()
         self.client.delete()
         self.user.delete()
+
+
+class TestSubscriptionChanges(TestCase):
+    """Test retrieving the subscription changes of a client"""
+
+    def setUp(self):
+        User = get_user_model()
+        self.user = User(username="subscription-changes", email="changes@example.com")
+        self.user.set_password("secret")
+        self.user.save()
+        self.client = Client.objects.create(user=self.user, uid="dev1", id=uuid.uuid1())
+
+        self.podcasts = [
+            Podcast.objects.get_or_create_for_url(
+                "http://www.example.com/podcast-{}.rss".format(n)
+            ).object
+            for n in range(3)
+        ]
+
+    def test_changes(self):
+        """Test that the changes match the replayed history"""
+        from mygpo.subscriptions import (
+            get_subscription_changes,
+            get_subscription_history,
+            subscription_diff,
+        )
+        from mygpo.subscriptions.tasks import _perform_subscribe, _perform_unsubscribe
+
+        p1, p2, p3 = self.podcasts
+        t = [datetime(2020, 1, 1, n) for n in range(5)]
+
+        def subscribe(podcast, timestamp):
+            list(
+                _perform_subscribe(
+                    podcast, self.user, [self.client], timestamp, podcast.url
+                )
+            )
+
+        def unsubscribe(podcast, timestamp):
+            list(_perform_unsubscribe(podcast, self.user, [self.client], timestamp))
+
+        subscribe(p1, t[1])
+        subscribe(p2, t[1])
+        unsubscribe(p2, t[2])
+        subscribe(p3, t[3])
+        unsubscribe(p3, t[4])
+
+        for since in [datetime(1970, 1, 1), t[1], t[2], t[3]]:
+            history = get_subscription_history(self.user, self.client, since)
+            expected = subscription_diff(history)
+            changes = get_subscription_changes(self.user, self.client, since)
+            self.assertEqual(changes, expected, since)
+
+        self.assertEqual(
+            get_subscription_changes(self.user, self.client, datetime(1970, 1, 1)),
+            ([p1], []),
+        )
+
+
+class TestUpdateSubscriptions(TestCase):
+    """Test subscribing and unsubscribing multiple podcasts at once"""
+
+    def setUp(self):
+        User = get_user_model()
+        self.user = User(username="bulk-subscribe", email="bulk@example.com")
+        self.user.set_password("secret")
+        self.user.save()
+        self.client = Client.objects.create(user=self.user, uid="dev1", id=uuid.uuid1())
+
+        self.podcasts = [
+            Podcast.objects.get_or_create_for_url(
+                "http://www.example.com/bulk-{}.rss".format(n)
+            ).object
+            for n in range(20)
+        ]
+
+    def test_update_subscriptions(self):
+        """Test that all changes are written and signalled at once"""
+        from mygpo.subscriptions.tasks import update_subscriptions
+        from mygpo.subscriptions.signals import subscriptions_changed
+
+        received = []
+
+        def receiver(sender, **kwargs):
+            received.append(kwargs)
+
+        subscriptions_changed.connect(receiver)
+        self.addCleanup(subscriptions_changed.disconnect, receiver)
+
+        subscribe = {podcast: podcast.url for podcast in self.podcasts}
+        with self.assertNumQueries(7):
+            update_subscriptions(self.user, self.client, subscribe, [])
+
+        self.assertEqual(set(self.client.get_subscribed_podcasts()), set(self.podcasts))
+        self.assertEqual(len(received), 1)
+        self.assertEqual(len(received[0]["subscribed"]), 20)
+
+        # existing subscriptions are skipped, removed ones are recorded
+        subscribed, unsubscribed = update_subscriptions(
+            self.user, self.client, {self.podcasts[0]: None}, self.podcasts[10:]
+        )
+        self.assertEqual(subscribed, [])
+        self.assertEqual(len(unsubscribed), 10)
+        self.assertEqual(
+            set(self.client.get_subscribed_podcasts()), set(self.podcasts[:10])
+        )
+
+        history = HistoryEntry.objects.filter(user=self.user, client=self.client)
+        self.assertEqual(history.count(), 30)
+
+        changes = models.SubscriptionChange.objects.changed(self.client)
+        self.assertEqual(changes.count(), 10)
+
+
+class TestSubscribedPodcasts(TestCase):
+    """Test the cached subscriptions of a user"""
+
+    def setUp(self):
+        User = get_user_model()
+        self.user = User(username="cached-subscriptions", email="cached@example.com")
+        self.user.set_password("secret")
+        self.user.save()
+        self.client = Client.objects.create(user=self.user, uid="dev1", id=uuid.uuid1())
+
+        self.podcasts = [
+            Podcast.objects.get_or_create_for_url(
+                "http://www.example.com/cached-{}.rss".format(n)
+            ).object
+            for n in range(3)
+        ]
+
+    def test_cached_subscriptions(self):
+        """Test that the cached subscriptions are invalidated on changes"""
+        from django.contrib.contenttypes.models import ContentType
+        from mygpo.subscriptions import get_subscribed_podcasts
+        from mygpo.subscriptions.tasks import update_subscriptions
+        from mygpo.usersettings.models import UserSettings
+        from mygpo.users.settings import PUBLIC_SUB_PODCAST
+
+        subscribe = {podcast: podcast.url for podcast in self.podcasts}
+        update_subscriptions(self.user, self.client, subscribe, [])
+        self.assertEqual(len(get_subscribed_podcasts(self.user)), 3)
+
+        # only the podcasts are queried
+        with self.assertNumQueries(1):
+            subscriptions = get_subscribed_podcasts(self.user)
+
+        self.assertEqual({s.podcast for s in subscriptions}, set(self.podcasts))
+        self.assertEqual(
+            {s.ref_url for s in subscriptions}, {p.url for p in self.podcasts}
+        )
+
+        update_subscriptions(self.user, self.client, {}, self.podcasts[:1])
+        self.assertEqual(len(get_subscribed_podcasts(self.user)), 2)
+
+        settings = UserSettings.objects.create(
+            user=self.user,
+            content_type=ContentType.objects.get_for_model(Podcast),
+            object_id=self.podcasts[1].pk,
+        )
+        settings.set_wksetting(PUBLIC_SUB_PODCAST, False)
+        settings.save()
+
+        public = get_subscribed_podcasts(self.user, only_public=True)
+        self.assertEqual([s.podcast for s in public], [self.podcasts[2]])
+
+    def test_delete_client(self):
+        """Test that deleting a client removes its cached subscriptions"""
+        from mygpo.subscriptions import get_subscribed_podcasts
+        from mygpo.subscriptions.tasks import update_subscriptions
+
+        subscribe = {podcast: podcast.url for podcast in self.podcasts}
+        update_subscriptions(self.user, self.client, subscribe, [])
+        self.assertEqual(len(get_subscribed_podcasts(self.user)), 3)
+
+        self.client.delete()
+        self.assertEqual(get_subscribed_podcasts(self.user), [])
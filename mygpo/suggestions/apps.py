@@ -1,7 +1,8 @@
 from django.apps import AppConfig, apps
+from django.conf import settings
 from django.db.models.signals import post_save
 
-from mygpo.subscriptions.signals import subscription_changed
+from mygpo.subscriptions.signals import subscription_changed, subscriptions_changed
 
 
 def update_suggestions_on_subscription(sender, **kwargs):
@@ -21,3 +22,6 @@ class SuggestionsConfig(AppConfig):
     def ready(self):
         Podcast = apps.get_model("podcasts.Podcast")
         subscription_changed.connect(update_suggestions_on_subscription, sender=Podcast)
+
+        User = apps.get_model(settings.AUTH_USER_MODEL)
+        subscriptions_changed.connect(update_suggestions_on_subscription, sender=User)
@@ -187,12 +187,12 @@ def privacy(request):
         .distinct("pk")
         .prefetch_related("slugs")
     )
-    private = UserSettings.objects.get_private_podcasts(user)
+    private = UserSettings.objects.get_private_podcast_ids(user)
 
     subscriptions = []
     for podcast in podcasts:
 
-        subscriptions.append((podcast, podcast in private))
+        subscriptions.append((podcast, podcast.id in private))
 
     return render(
         request,
@@ -0,0 +1,49 @@
+import json
+
+from django.db import migrations, models
+
+
+def set_private(apps, schema_editor):
+    """Stores the private flag of existing podcast settings"""
+
+    UserSettings = apps.get_model("usersettings", "UserSettings")
+    ContentType = apps.get_model("contenttypes", "ContentType")
+
+    content_type = ContentType.objects.filter(
+        app_label="podcasts", model="podcast"
+    ).first()
+    if content_type is None:
+        return
+
+    private = []
+    for setting in UserSettings.objects.filter(content_type=content_type).iterator():
+        try:
+            public = json.loads(setting.settings).get("public_subscription", True)
+        except ValueError:
+            public = None
+
+        if not public:
+            private.append(setting.pk)
+
+    UserSettings.objects.filter(pk__in=private).update(private=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("usersettings", "0004_django_uuidfield"),
+        ("contenttypes", "0002_remove_content_type_name"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="usersettings",
+            name="private",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterIndexTogether(
+            name="usersettings",
+            index_together={("user", "content_type", "private")},
+        ),
+        migrations.RunPython(set_private, migrations.RunPython.noop),
+    ]
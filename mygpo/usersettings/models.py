@@ -17,17 +17,24 @@ class UserSettingsManager(models.Manager):
     """Manager for PodcastConfig objects"""
 
     def get_private_podcasts(self, user):
-        """Returns the podcasts that the user has marked as private"""
-        settings = self.filter(
-            user=user, content_type=ContentType.objects.get_for_model(Podcast)
+        """Returns the podcasts that the user has marked as private
+
+        The result is a QuerySet, so that it can be used as a subquery."""
+        return Podcast.objects.filter(
+            id__in=self._private_podcast_settings(user).values("object_id")
         )
 
-        private = []
-        for setting in settings:
-            if not setting.get_wksetting(PUBLIC_SUB_PODCAST):
-                private.append(setting.content_object)
+    def get_private_podcast_ids(self, user):
+        """Returns the ids of the podcasts that the user has marked as private"""
+        settings = self._private_podcast_settings(user)
+        return set(settings.values_list("object_id", flat=True))
 
-        return private
+    def _private_podcast_settings(self, user):
+        return self.filter(
+            user=user,
+            content_type=ContentType.objects.get_for_model(Podcast),
+            private=True,
+        )
 
     def get_for_scope(self, user, scope):
         """Returns the settings object for the given user and scope obj
@@ -68,14 +75,29 @@ class UserSettings(models.Model):
 
     settings = models.TextField(null=False, default="{}")
 
+    # the subscription of the podcast is private; this is derived from the
+    # settings when saving, so that private podcasts can be queried
+    private = models.BooleanField(default=False)
+
     class Meta:
         unique_together = [["user", "content_type", "object_id"]]
 
+        index_together = [["user", "content_type", "private"]]
+
         verbose_name_plural = "User Settings"
         verbose_name = "User Settings"
 
     objects = UserSettingsManager()
 
+    def save(self, *args, **kwargs):
+        self.private = not self.get_wksetting(PUBLIC_SUB_PODCAST)
+
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "settings" in update_fields:
+            kwargs["update_fields"] = list(update_fields) + ["private"]
+
+        super().save(*args, **kwargs)
+
     def get_wksetting(self, setting):
         """returns the value of a well-known setting"""
         try:
@@ -11,6 +11,7 @@ from mygpo.api.advanced import settings as views
 from mygpo.usersettings.models import UserSettings
 from mygpo.podcasts.models import Podcast, Episode
 from mygpo.users.models import Client
+from mygpo.users.settings import PUBLIC_SUB_PODCAST
 
 
 class TestAPI(TestCase):
@@ -57,6 +58,40 @@ class TestAPI(TestCase):
         url = self.get_url(self.user.username, "device", {"device": self.uid})
         self._do_test_url(url)
 
+    def test_private_podcasts(self):
+        """Podcasts made private through the API can be queried"""
+        url = self.get_url(self.user.username, "podcast", {"podcast": self.podcast_url})
+        other = Podcast.objects.get_or_create_for_url(
+            "http://example.com/other-podcast.rss"
+        ).object
+
+        settings = {"set": {PUBLIC_SUB_PODCAST.name: False}}
+        resp = self.client.post(
+            url,
+            json.dumps(settings),
+            content_type="application/octet-stream",
+            **self.extra,
+        )
+        self.assertEqual(resp.status_code, 200, resp.content)
+
+        with self.assertNumQueries(1):
+            private = list(UserSettings.objects.get_private_podcasts(self.user))
+        self.assertEqual(private, [self.podcast])
+
+        public = Podcast.objects.exclude(
+            pk__in=UserSettings.objects.get_private_podcasts(self.user)
+        ).filter(pk__in=[self.podcast.pk, other.pk])
+        self.assertEqual(list(public), [other])
+
+        settings = {"remove": [PUBLIC_SUB_PODCAST.name]}
+        self.client.post(
+            url,
+            json.dumps(settings),
+            content_type="application/octet-stream",
+            **self.extra,
+        )
+        self.assertEqual(UserSettings.objects.get_private_podcast_ids(self.user), set())
+
     def _do_test_url(self, url):
         # set settings
         settings = {"set": {"a": "b", "c": "d"}}
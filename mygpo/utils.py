@@ -19,6 +19,9 @@ import urllib.request, urllib.error, urllib.parse
 import zlib
 import shlex
 
+import requests
+from requests.adapters import HTTPAdapter
+
 from django.db import transaction, IntegrityError
 from django.conf import settings
 from django.urls import reverse
@@ -328,6 +331,30 @@ def urlopen(url, headers=None, data=None):
     return opener.open(request)
 
 
+_http_session = None
+
+
+def get_http_session():
+    """Returns a requests Session that is shared for outgoing HTTP requests
+
+    The session keeps a pool of connections per host, so that subsequent
+    requests (also from different threads, eg in the concurrent feed updater)
+    can re-use established connections."""
+    global _http_session
+
+    if _http_session is None:
+        pool_size = max(settings.FEED_UPDATE_WORKERS, 10)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+
+        session = requests.Session()
+        session.headers.update({"User-Agent": settings.USER_AGENT})
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _http_session = session
+
+    return _http_session
+
+
 def username_password_from_url(url):
     r"""
     Returns a tuple (username,password) containing authentication
@@ -15,8 +15,10 @@ from django.utils.decorators import method_decorator
 from django.views.decorators.http import last_modified
 from django.contrib.staticfiles.storage import staticfiles_storage
 from django.core.files.storage import FileSystemStorage
+from django.core.cache import cache
 
-from mygpo.utils import file_hash
+from mygpo.podcasts.models import PodcastLogo
+from mygpo.utils import get_http_session, to_maxlength
 
 import logging
 
@@ -25,12 +27,28 @@ logger = logging.getLogger(__name__)
 # Use Django's File Storage API to access podcast logos. This could be swapped
 # out for another storage implementation (eg for storing to Amazon S3)
 # https://docs.djangoproject.com/en/1.11/ref/files/storage/
-LOGO_STORAGE = FileSystemStorage(location=settings.MEDIA_ROOT)
+# The location defaults to (and follows changes of) settings.MEDIA_ROOT
+LOGO_STORAGE = FileSystemStorage()
+
+# how long the sizes of the existing thumbnails of a logo are cached
+SIZES_TIMEOUT = 60 * 60 * 24 * 30
+
+# a logo is not scheduled for creating thumbnails again within this time
+PENDING_TIMEOUT = 60 * 10
 
 
 def _last_modified(request, size, prefix, filename):
 
-    target = os.path.join("logo", str(size), prefix, filename)
+    # the file that is served (see CoverArt.get)
+    filename = get_logo_filename(filename)
+    prefix = get_prefix(filename)
+    sizes = get_thumbnail_sizes(prefix, filename)
+
+    if sizes:
+        size = get_closest_size(int(size), sizes)
+        target = CoverArt.get_thumbnail_path(size, prefix, filename)
+    else:
+        target = CoverArt.get_original_path(prefix, filename)
 
     try:
         return LOGO_STORAGE.get_modified_time(target)
@@ -40,6 +58,12 @@ def _last_modified(request, size, prefix, filename):
 
 
 class CoverArt(View):
+    """Redirects to a thumbnail of a podcast logo
+
+    Thumbnails are created in the background (see create_thumbnails), so
+    requests are only ever redirected to files that already exist: to the
+    closest thumbnail size, or to the original while there are none."""
+
     def __init__(self):
         self.storage = LOGO_STORAGE
 
@@ -48,55 +72,26 @@ class CoverArt(View):
 
         size = int(size)
 
+        filename = get_logo_filename(filename)
         prefix = get_prefix(filename)
-        target = self.get_thumbnail_path(size, prefix, filename)
-        original = self.get_original_path(prefix, filename)
+        sizes = get_thumbnail_sizes(prefix, filename)
 
-        if self.storage.exists(target):
-            return self.send_file(target)
+        if sizes:
+            thumbnail_size = get_closest_size(size, sizes)
+            return self.send_file(
+                self.get_thumbnail_path(thumbnail_size, prefix, filename)
+            )
 
+        original = self.get_original_path(prefix, filename)
         if not self.storage.exists(original):
-            logger.warning("Original cover {} not found".format(original))
+            logger.warning("Cover {} not found".format(original))
             raise Http404("Cover Art not available" + original)
 
-        target_dir = self.get_dir(filename)
-        try:
-            fp = self.storage.open(original, "rb")
-            im = Image.open(fp)
-            if im.mode not in ("RGB", "RGBA"):
-                im = im.convert("RGBA")
-        except IOError as ioe:
-            logger.warning("Cover file {} cannot be opened: {}".format(original, ioe))
-            raise Http404("Cannot open cover file") from ioe
-
-        try:
-            im.thumbnail((size, size), Image.ANTIALIAS)
-            resized = im
-        except (struct.error, IOError, IndexError) as ex:
-            # raised when trying to read an interlaced PNG;
-            logger.warning("Could not create thumbnail: %s", str(ex))
-
-            # we use the original instead
-            return self.send_file(original)
-
-        sio = io.BytesIO()
-
-        try:
-            resized.save(
-                sio,
-                "JPEG" if im.mode == "RGB" else "PNG",
-                optimize=True,
-                progression=True,
-                quality=80,
-            )
-        except IOError as ex:
-            return self.send_file(original)
-        finally:
-            fp.close()
-
-        self.storage.save(target, sio)
+        # thumbnails have not been created yet
+        if sizes is None:
+            schedule_thumbnails(prefix, filename)
 
-        return self.send_file(target)
+        return self.send_file(original)
 
     @staticmethod
     def get_thumbnail_path(size, prefix, filename):
@@ -106,17 +101,6 @@ class CoverArt(View):
     def get_dir(filename):
         return os.path.dirname(filename)
 
-    @staticmethod
-    def remove_existing_thumbnails(prefix, filename):
-        dirs, _files = LOGO_STORAGE.listdir("logo")  # TODO: cache list of sizes
-        for size in dirs:
-            if size == "original":
-                continue
-
-            path = os.path.join("logo", size, prefix, filename)
-            logger.info("Removing {}".format(path))
-            LOGO_STORAGE.delete(path)
-
     @staticmethod
     def get_original_path(prefix, filename):
         return os.path.join("logo", "original", prefix, filename)
@@ -130,34 +114,55 @@ class CoverArt(View):
             return
 
         try:
-            image_sha1 = hashlib.sha1(cover_art_url.encode("utf-8")).hexdigest()
-            prefix = get_prefix(image_sha1)
-
-            filename = cls.get_original_path(prefix, image_sha1)
-            dirname = cls.get_dir(filename)
-
-            # get hash of existing file
-            if LOGO_STORAGE.exists(filename):
-                with LOGO_STORAGE.open(filename, "rb") as f:
-                    old_hash = file_hash(f).digest()
-            else:
-                old_hash = ""
-
-            logger.info("Logo {}, saving to {}".format(cover_art_url, filename))
-
-            # save new cover art
-            LOGO_STORAGE.delete(filename)
-            source = io.BytesIO(requests.get(cover_art_url).content)
-            LOGO_STORAGE.save(filename, source)
-
-            # get hash of new file
-            with LOGO_STORAGE.open(filename, "rb") as f:
-                new_hash = file_hash(f).digest()
+            url_hash = hashlib.sha1(cover_art_url.encode("utf-8")).hexdigest()
+            logo = PodcastLogo.objects.filter(url_hash=url_hash).first()
+
+            # conditional request, if the previous download is still stored
+            headers = {}
+            if logo is not None and LOGO_STORAGE.exists(
+                cls.get_original_path(get_prefix(logo.content_hash), logo.content_hash)
+            ):
+                if logo.http_etag:
+                    headers["If-None-Match"] = logo.http_etag
+
+                if logo.http_last_modified:
+                    headers["If-Modified-Since"] = logo.http_last_modified
+
+            session = get_http_session()
+            r = session.get(cover_art_url, headers=headers, timeout=30)
+
+            if r.status_code == 304 and headers:
+                logger.info("Logo {} has not been modified".format(cover_art_url))
+                return cover_art_url
+
+            r.raise_for_status()
+
+            content_hash = hashlib.sha1(r.content).hexdigest()
+            prefix = get_prefix(content_hash)
+            filename = cls.get_original_path(prefix, content_hash)
+
+            # the same logo might already be stored for another URL
+            if not LOGO_STORAGE.exists(filename):
+                logger.info("Logo {}, saving to {}".format(cover_art_url, filename))
+                LOGO_STORAGE.save(filename, io.BytesIO(r.content))
+
+            etag = r.headers.get("ETag")
+            modified = r.headers.get("Last-Modified")
+            PodcastLogo.objects.update_or_create(
+                url_hash=url_hash,
+                defaults={
+                    "url": cover_art_url,
+                    "content_hash": content_hash,
+                    "http_etag": to_maxlength(PodcastLogo, "http_etag", etag),
+                    "http_last_modified": to_maxlength(
+                        PodcastLogo, "http_last_modified", modified
+                    ),
+                },
+            )
+            cache.set(_content_key(url_hash), content_hash, SIZES_TIMEOUT)
 
-            # remove thumbnails if cover changed
-            if old_hash != new_hash:
-                logger.info("Removing thumbnails")
-                thumbnails = cls.remove_existing_thumbnails(prefix, filename)
+            if get_thumbnail_sizes(prefix, content_hash) is None:
+                schedule_thumbnails(prefix, content_hash)
 
             return cover_art_url
 
@@ -170,11 +175,156 @@ class CoverArt(View):
             logger.warning("Exception while updating podcast logo: %s", str(e))
 
 
+def get_logo_filename(url_hash):
+    """Returns the filename under which the logo of a URL is stored
+
+    Logos are stored under the hash of their content. Logos that have been
+    downloaded by an earlier version are stored under the hash of their URL."""
+
+    key = _content_key(url_hash)
+    content_hash = cache.get(key)
+
+    if content_hash is None:
+        logo = PodcastLogo.objects.filter(url_hash=url_hash).only("content_hash")
+        logo = logo.first()
+        content_hash = logo.content_hash if logo else ""
+        cache.set(key, content_hash, SIZES_TIMEOUT)
+
+    return content_hash or url_hash
+
+
+def create_thumbnails(prefix, filename):
+    """Creates thumbnails of a logo in all configured sizes
+
+    The original is decoded only once; each thumbnail is scaled down from the
+    next larger one. Returns the sizes that have been created, and stores them
+    in the index of thumbnail sizes."""
+
+    sizes = resize_logo(prefix, filename)
+    store_thumbnail_sizes(filename, sizes)
+    return sizes
+
+
+def resize_logo(prefix, filename):
+    """Writes the thumbnails of a logo and returns their sizes"""
+
+    original = CoverArt.get_original_path(prefix, filename)
+    sizes = sorted(settings.LOGO_SIZES, reverse=True)
+
+    try:
+        with LOGO_STORAGE.open(original, "rb") as fp:
+            im = Image.open(fp)
+
+            # JPEGs can be decoded at a reduced scale right away
+            im.draft("RGB", (sizes[0], sizes[0]))
+
+            if im.mode not in ("RGB", "RGBA"):
+                im = im.convert("RGBA")
+            else:
+                im.load()
+
+    except IOError as ioe:
+        logger.warning("Cover file {} cannot be opened: {}".format(original, ioe))
+        return []
+
+    img_format = "JPEG" if im.mode == "RGB" else "PNG"
+
+    created = []
+    for size in sizes:
+        try:
+            im.thumbnail((size, size), Image.LANCZOS)
+        except (struct.error, IOError, IndexError) as ex:
+            # raised when trying to read an interlaced PNG;
+            logger.warning("Could not create thumbnail: %s", str(ex))
+            break
+
+        sio = io.BytesIO()
+
+        try:
+            im.save(sio, img_format, optimize=True, progression=True, quality=80)
+        except IOError as ex:
+            logger.warning("Could not save thumbnail: %s", str(ex))
+            break
+
+        target = CoverArt.get_thumbnail_path(size, prefix, filename)
+        LOGO_STORAGE.delete(target)
+        LOGO_STORAGE.save(target, sio)
+        created.append(size)
+
+    return sorted(created)
+
+
+def schedule_thumbnails(prefix, filename):
+    """Creates the thumbnails of a logo in the background
+
+    A logo is only scheduled once within PENDING_TIMEOUT"""
+    from mygpo.web.tasks import generate_thumbnails
+
+    if not cache.add(_pending_key(filename), True, PENDING_TIMEOUT):
+        return
+
+    generate_thumbnails.delay(prefix, filename)
+
+
+def get_thumbnail_sizes(prefix, filename):
+    """Returns the sizes of the existing thumbnails of a logo
+
+    Returns None if no thumbnails have been created yet. Logos that are not
+    in the index yet (eg thumbnails created by an earlier version) are looked
+    up in the storage."""
+
+    sizes = cache.get(_sizes_key(filename))
+
+    if sizes is None:
+        sizes = [
+            size
+            for size in settings.LOGO_SIZES
+            if LOGO_STORAGE.exists(CoverArt.get_thumbnail_path(size, prefix, filename))
+        ]
+
+        if not sizes:
+            return None
+
+        cache.set(_sizes_key(filename), sizes, SIZES_TIMEOUT)
+
+    return sizes
+
+
+def store_thumbnail_sizes(filename, sizes):
+    """Stores the sizes of the thumbnails that have been created of a logo"""
+    cache.set(_sizes_key(filename), sizes, SIZES_TIMEOUT)
+    cache.delete(_pending_key(filename))
+
+
+def get_closest_size(size, sizes):
+    """Returns the smallest size that is not smaller than the requested one
+
+    >>> get_closest_size(50, [32, 64, 128])
+    64
+    >>> get_closest_size(256, [32, 64, 128])
+    128
+    """
+    larger = [s for s in sizes if s >= size]
+    return min(larger) if larger else max(sizes)
+
+
+def _sizes_key(filename):
+    return "logo-sizes-{}".format(filename)
+
+
+def _pending_key(filename):
+    return "logo-pending-{}".format(filename)
+
+
+def _content_key(url_hash):
+    return "logo-content-{}".format(url_hash)
+
+
 def get_prefix(filename):
     return filename[:3]
 
 
-def get_logo_url(podcast, size):
+def get_logo_url(podcast, size, reverse=reverse):
     """Return the logo URL for the podcast
 
     The logo either comes from the media storage (see CoverArt) or from the
@@ -0,0 +1,66 @@
+import os.path
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from mygpo.web.logo import (
+    LOGO_STORAGE,
+    get_thumbnail_sizes,
+    resize_logo,
+    store_thumbnail_sizes,
+)
+
+
+class Command(BaseCommand):
+    """Creates thumbnails of all podcast logos
+
+    The logos are resized on a pool of worker processes."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            dest="workers",
+            default=os.cpu_count(),
+            help="Number of worker processes",
+        )
+
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            dest="force",
+            default=False,
+            help="Also recreate existing thumbnails",
+        )
+
+    def handle(self, *args, **options):
+        logos = list(self.get_logos(options["force"]))
+        self.stdout.write("Creating thumbnails of %d logos" % len(logos))
+
+        prefixes = [prefix for prefix, filename in logos]
+        filenames = [filename for prefix, filename in logos]
+
+        with ProcessPoolExecutor(max_workers=options["workers"]) as executor:
+            results = executor.map(resize_logo, prefixes, filenames, chunksize=20)
+
+            for n, (filename, sizes) in enumerate(zip(filenames, results), 1):
+                store_thumbnail_sizes(filename, sizes)
+
+                if n % 1000 == 0:
+                    self.stdout.write("%d / %d" % (n, len(logos)))
+
+        self.stdout.write("Created thumbnails of %d logos" % len(logos))
+
+    @staticmethod
+    def get_logos(force):
+        """Yields (prefix, filename) of all original logos"""
+        prefixes, _files = LOGO_STORAGE.listdir(os.path.join("logo", "original"))
+
+        for prefix in prefixes:
+            _dirs, filenames = LOGO_STORAGE.listdir(
+                os.path.join("logo", "original", prefix)
+            )
+
+            for filename in filenames:
+                if force or get_thumbnail_sizes(prefix, filename) is None:
+                    yield prefix, filename
@@ -0,0 +1,14 @@
+from celery import shared_task
+
+from mygpo.web.logo import create_thumbnails
+
+from celery.utils.log import get_task_logger
+
+logger = get_task_logger(__name__)
+
+
+@shared_task
+def generate_thumbnails(prefix, filename):
+    """Creates the thumbnails of a podcast logo"""
+    sizes = create_thumbnails(prefix, filename)
+    logger.info("Created thumbnails of %s in sizes %s", filename, sizes)
@@ -9,15 +9,24 @@ import requests
 import responses
 
 from django.conf import settings
+from django.core.cache import cache
 from django.test import TestCase, Client, override_settings
 from django.urls import reverse
+from django.utils.http import http_date
 from django.core.files.storage import FileSystemStorage
 from django.contrib.auth import get_user_model
 from django.test import RequestFactory
 from django.contrib.auth.models import User
 
-from mygpo.podcasts.models import Podcast, Episode, Slug, Tag
-from mygpo.web.logo import CoverArt, get_logo_url
+from mygpo.podcasts.models import Podcast, PodcastLogo, Episode, Slug, Tag
+from mygpo.web.logo import (
+    LOGO_STORAGE,
+    CoverArt,
+    create_thumbnails,
+    get_logo_url,
+    get_thumbnail_sizes,
+    _sizes_key,
+)
 from mygpo.test import create_auth_string, anon_request
 from django.utils.safestring import mark_safe
 from django.templatetags.static import static
@@ -260,6 +269,9 @@ class PodcastLogoTests(TestCase):
 
             CoverArt.save_podcast_logo(self.URL)
 
+    def _logo_filename(self, url=None):
+        return PodcastLogo.objects.get(url=url or self.URL).content_hash
+
     def _fetch_cover(self, podcast, size=32):
         logo_url = get_logo_url(podcast, size)
 
@@ -332,12 +344,115 @@ class PodcastLogoTests(TestCase):
         _logo_storage = logo.LOGO_STORAGE
         logo.LOGO_STORAGE = ErrFileSystemStorage(location=settings.MEDIA_ROOT)
 
-        logo_url = get_logo_url(self.podcast, 32)
+        filename = self._logo_filename()
+        sizes = create_thumbnails(filename[:3], filename)
+        self.assertEqual([], sizes)
+
+        logo.LOGO_STORAGE = _logo_storage
+
+        # the original is served instead
+        response = self.client.get(get_logo_url(self.podcast, 32))
+        self.assertEqual(302, response.status_code)
+        self.assertIn("/logo/original/", response["Location"])
+
+    def test_create_thumbnails(self):
+        self._save_logo()
+        filename = self._logo_filename()
+        prefix = filename[:3]
+
+        # no thumbnails yet
+        self.assertIsNone(get_thumbnail_sizes(prefix, filename))
+
+        sizes = create_thumbnails(prefix, filename)
+        # the cached sizes would outlive the temporary media files
+        self.addCleanup(cache.delete, _sizes_key(filename))
+        self.assertEqual(sorted(settings.LOGO_SIZES), sizes)
 
+        with self.assertNumQueries(0):
+            response = self.client.get(get_logo_url(self.podcast, 64))
+        self.assertEqual(302, response.status_code)
+        self.assertIn("/logo/64/", response["Location"])
+
+        # other sizes are served from the next larger thumbnail
+        response = self.client.get(get_logo_url(self.podcast, 40))
+        self.assertIn("/logo/64/", response["Location"])
+
+        self._fetch_cover(self.podcast, 128)
+
+    def test_last_modified(self):
+        self._save_logo()
+        filename = self._logo_filename()
+        prefix = filename[:3]
+        logo_url = get_logo_url(self.podcast, 64)
+
+        # the original is served until there are thumbnails
+        original = CoverArt.get_original_path(prefix, filename)
         response = self.client.get(logo_url)
-        self.assertEqual(404, response.status_code)
+        self.assertIn("/logo/original/", response["Location"])
+        self.assertEqual(
+            http_date(LOGO_STORAGE.get_modified_time(original).timestamp()),
+            response["Last-Modified"],
+        )
 
-        logo.LOGO_STORAGE = _logo_storage
+        create_thumbnails(prefix, filename)
+        self.addCleanup(cache.delete, _sizes_key(filename))
+        thumbnail = CoverArt.get_thumbnail_path(64, prefix, filename)
+        last_modified = http_date(LOGO_STORAGE.get_modified_time(thumbnail).timestamp())
+
+        response = self.client.get(logo_url)
+        self.assertEqual(last_modified, response["Last-Modified"])
+
+        response = self.client.get(logo_url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(304, response.status_code)
+
+    def test_conditional_request(self):
+        with responses.RequestsMock() as rsps, open(IMG_PATH1, "rb") as body:
+            rsps.add(
+                responses.GET,
+                self.URL,
+                status=200,
+                body=body,
+                content_type="image/png",
+                headers={"ETag": '"abc"'},
+            )
+            rsps.add(responses.GET, self.URL, status=304)
+
+            self.assertEqual(self.URL, CoverArt.save_podcast_logo(self.URL))
+            self.assertEqual(self.URL, CoverArt.save_podcast_logo(self.URL))
+
+            self.assertEqual('"abc"', rsps.calls[1].request.headers["If-None-Match"])
+
+        self._fetch_cover(self.podcast)
+
+    def test_shared_logo(self):
+        """Logos with the same content are stored only once"""
+        other_url = "http://example.com/{}.png".format(uuid.uuid1().hex)
+
+        with responses.RequestsMock() as rsps, open(IMG_PATH1, "rb") as body:
+            content = body.read()
+            for url in (self.URL, other_url):
+                rsps.add(
+                    responses.GET,
+                    url,
+                    status=200,
+                    body=content,
+                    content_type="image/png",
+                )
+
+            CoverArt.save_podcast_logo(self.URL)
+            CoverArt.save_podcast_logo(other_url)
+
+        filename = self._logo_filename()
+        self.assertEqual(filename, self._logo_filename(other_url))
+
+        original = CoverArt.get_original_path(filename[:3], filename)
+        directory, files = LOGO_STORAGE.listdir(os.path.dirname(original))
+        self.assertEqual([filename], [f for f in files if f.startswith(filename)])
+
+    def test_http_error(self):
+        with responses.RequestsMock() as rsps:
+            rsps.add(responses.GET, self.URL, status=404)
+            self.assertIsNone(CoverArt.save_podcast_logo(self.URL))
 
     def test_new_logo(self):
         with responses.RequestsMock() as rsps, open(IMG_PATH1, "rb") as body1, open(
@@ -3,7 +3,6 @@ import re
 from django.urls import path
 from django.conf import settings
 from django.views.generic.base import TemplateView, RedirectView
-from django.views.static import serve
 
 from mygpo.web.logo import CoverArt
 
@@ -19,9 +18,8 @@ urlpatterns = [
     # files should be served by a reverse proxy in practice
     path(
         "%s<path:path>" % settings.MEDIA_URL.lstrip("/"),
-        serve,
+        views.media,
         name="media",
-        kwargs=dict(document_root=settings.MEDIA_ROOT),
     ),
     path("tags/", views.mytags, name="tags"),
     path(
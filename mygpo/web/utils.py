@@ -1,10 +1,13 @@
 import re
 import math
+import uuid
 import string
 import collections
 from datetime import datetime
+from urllib.parse import quote
 
 from django.utils.translation import ngettext
+from django.utils.http import RFC3986_SUBDELIMS
 from django.views.decorators.cache import never_cache
 from django.utils.html import strip_tags
 from django.urls import reverse
@@ -143,8 +146,74 @@ def maintenance(request, *args, **kwargs):
     return resp
 
 
-def get_podcast_link_target(podcast, view_name="podcast", add_args=[]):
-    """Returns the link-target for a Podcast, preferring slugs over Ids"""
+class CachedReverse(object):
+    """reverse() for linking to many objects of the same kind
+
+    Each view is reversed only once, with placeholders for its string and
+    UUID arguments. Further URLs of the view are built by substituting the
+    (quoted) arguments for the placeholders. Other arguments are part of the
+    cache key, so they are reversed once per value."""
+
+    def __init__(self):
+        self._templates = {}
+
+    def __call__(self, viewname, args=()):
+        key = (viewname,) + tuple(
+            type(arg) if isinstance(arg, (str, uuid.UUID)) else arg for arg in args
+        )
+
+        try:
+            template = self._templates.get(key)
+        except TypeError:
+            # unhashable arguments can not be cached
+            return reverse(viewname, args=args)
+
+        if template is None:
+            template = self._templates[key] = self._get_template(viewname, args)
+
+        if not template:
+            return reverse(viewname, args=args)
+
+        return template.format(*[self._quote(arg) for arg in args])
+
+    def _get_template(self, viewname, args):
+        """Returns a format string for the URLs of the view, or "" """
+        placeholders = [
+            self._placeholder(n, arg) if isinstance(arg, (str, uuid.UUID)) else arg
+            for n, arg in enumerate(args)
+        ]
+        url = reverse(viewname, args=placeholders)
+        template = url.replace("{", "{{").replace("}", "}}")
+
+        for n, placeholder in enumerate(placeholders):
+            if not isinstance(placeholder, (str, uuid.UUID)):
+                continue
+
+            placeholder = str(placeholder)
+            if template.count(placeholder) != 1:
+                return ""
+
+            template = template.replace(placeholder, "{%d}" % n)
+
+        return template
+
+    @staticmethod
+    def _placeholder(n, arg):
+        # the placeholders have to match the converter of the URL pattern
+        if isinstance(arg, uuid.UUID):
+            return uuid.UUID(int=n + 1)
+        return "_placeholder_%d_" % n
+
+    @staticmethod
+    def _quote(arg):
+        # quotes arguments in the same way as reverse()
+        return quote(str(arg), safe=RFC3986_SUBDELIMS + "/~:@")
+
+
+def get_podcast_link_target(podcast, view_name="podcast", add_args=[], reverse=reverse):
+    """Returns the link-target for a Podcast, preferring slugs over Ids
+
+    A CachedReverse can be passed as reverse when linking to many podcasts."""
 
     # we prefer slugs
     if podcast.slug:
@@ -166,7 +235,9 @@ def get_podcast_group_link_target(group, view_name, add_args=[]):
     return reverse(view_name, args=args + add_args)
 
 
-def get_episode_link_target(episode, podcast, view_name="episode", add_args=[]):
+def get_episode_link_target(
+    episode, podcast, view_name="episode", add_args=[], reverse=reverse
+):
     """Returns the link-target for an Episode, preferring slugs over Ids"""
 
     # prefer slugs
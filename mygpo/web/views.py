@@ -2,6 +2,7 @@ import sys
 from collections import defaultdict
 from datetime import datetime, timedelta
 
+from django.conf import settings
 from django.urls import reverse
 from django.http import HttpResponseRedirect
 from django.contrib import messages
@@ -10,6 +11,7 @@ from django.contrib.auth.decorators import login_required
 from django.shortcuts import render
 from django.contrib.sites.requests import RequestSite
 from django.views import View
+from django.views.static import serve
 from django.views.decorators.vary import vary_on_cookie
 from django.views.decorators.cache import never_cache, cache_control
 
@@ -152,3 +154,8 @@ def csrf_failure(request, reason=""):
             "post": request.POST,
         },
     )
+
+
+def media(request, path):
+    """Serves a file from MEDIA_ROOT"""
+    return serve(request, path, document_root=settings.MEDIA_ROOT)